@@ -0,0 +1,398 @@
+import asyncio
+import json
+import os
+import threading
+import time
+import uuid
+from dataclasses import dataclass, field, asdict
+from typing import Any, Dict, List, Optional, Tuple
+
+import httpx
+
+from .config import DATA_DIR, WATCH_INTERVAL_SEC, WEBHOOK_TIMEOUT_SEC
+from .okx import OkxClient
+
+ALERTS_PATH = os.path.join(DATA_DIR, "alerts.json")
+
+
+@dataclass
+class Alert:
+    inst_id: str
+    lo: float
+    hi: float
+    label: str = "level"          # entry_zone / stop_loss / take_profit1 / long_zone / short_zone / level
+    webhook: Optional[str] = None
+    once: bool = True             # 触发一次后失效
+    source: Optional[str] = None  # 如 "custom:15m/1H"（由评估结果生成时）
+    id: str = field(default_factory=lambda: uuid.uuid4().hex[:12])
+    created_at: float = field(default_factory=time.time)
+    triggered_at: Optional[float] = None
+    triggered_price: Optional[float] = None
+    hits: int = 0
+
+    @property
+    def active(self) -> bool:
+        return not (self.once and self.triggered_at is not None)
+
+
+# =========================
+# 区间索引：中心区间树。查询“价格走过的区间 [a, b] 与哪些告警区间相交”，
+# 复杂度 O(log n + k)，k 为命中数。树是静态的，增删不立即重建：
+# 新增的先放进 pending（查询时线性扫描），删除的记为墓碑（查询时跳过），
+# 两者累计超过 max(REBUILD_MIN, n/4) 时才整体重建，重建成本按次数摊销。
+# =========================
+REBUILD_MIN = 32
+
+
+class _Node:
+    __slots__ = ("center", "by_lo", "by_hi", "left", "right")
+
+    def __init__(self, items: List[Tuple[float, float, str]]):
+        los = sorted(lo for lo, _, _ in items)
+        self.center = los[len(los) // 2]
+        here = [it for it in items if it[0] <= self.center <= it[1]]
+        left = [it for it in items if it[1] < self.center]
+        right = [it for it in items if it[0] > self.center]
+        self.by_lo = sorted(here, key=lambda it: it[0])
+        self.by_hi = sorted(here, key=lambda it: it[1], reverse=True)
+        self.left = _Node(left) if left else None
+        self.right = _Node(right) if right else None
+
+
+class IntervalIndex:
+    def __init__(self):
+        self._items: Dict[str, Tuple[float, float, str]] = {}
+        self._root: Optional[_Node] = None
+        self._pending: Dict[str, Tuple[float, float, str]] = {}   # 建树之后新增的
+        self._dead: set = set()                                   # 树里已删除的 key
+        self.rebuilds = 0
+
+    def __len__(self):
+        return len(self._items)
+
+    def add(self, key: str, lo: float, hi: float):
+        self.remove(key)
+        item = (min(lo, hi), max(lo, hi), key)
+        self._items[key] = item
+        self._pending[key] = item
+
+    def remove(self, key: str):
+        if self._items.pop(key, None) is None:
+            return
+        if self._pending.pop(key, None) is None:
+            self._dead.add(key)
+
+    def _maybe_rebuild(self):
+        if len(self._pending) + len(self._dead) <= max(REBUILD_MIN, len(self._items) // 4):
+            return
+        self._root = _Node(list(self._items.values())) if self._items else None
+        self._pending.clear()
+        self._dead.clear()
+        self.rebuilds += 1
+
+    def query(self, a: float, b: float) -> List[str]:
+        self._maybe_rebuild()
+        out: List[str] = []
+        stack = [self._root] if self._root else []
+        while stack:
+            node = stack.pop()
+            if b < node.center:
+                for lo, _, key in node.by_lo:
+                    if lo > b:
+                        break
+                    out.append(key)
+                if node.left:
+                    stack.append(node.left)
+            elif a > node.center:
+                for _, hi, key in node.by_hi:
+                    if hi < a:
+                        break
+                    out.append(key)
+                if node.right:
+                    stack.append(node.right)
+            else:
+                out.extend(key for _, _, key in node.by_lo)
+                if node.left:
+                    stack.append(node.left)
+                if node.right:
+                    stack.append(node.right)
+        if self._dead:
+            out = [key for key in out if key not in self._dead]
+        out.extend(key for lo, hi, key in self._pending.values() if lo <= b and hi >= a)
+        return out
+
+
+def _inst_type(inst_id: str) -> str:
+    if inst_id.endswith("-SWAP"):
+        return "SWAP"
+    parts = inst_id.split("-")
+    if len(parts) == 3 and parts[2].isdigit():
+        return "FUTURES"
+    return "SPOT"
+
+
+def alerts_from_evaluation(result: Dict[str, Any], webhook: Optional[str] = None,
+                           source: Optional[str] = None) -> List[Alert]:
+    """把一次评估的关键价位（入场区 / 止损 / 止盈 / 关键区）转成告警。"""
+    inst_id = result.get("inst_id")
+    if not inst_id:
+        return []
+    out: List[Alert] = []
+
+    def _add(label: str, lo, hi=None):
+        if lo is None:
+            return
+        hi = lo if hi is None else hi
+        out.append(Alert(inst_id=inst_id, lo=float(lo), hi=float(hi), label=label, webhook=webhook, source=source))
+
+    ez = result.get("entry_zone") or [None, None]
+    if ez[0] is not None and ez[1] is not None:
+        _add("entry_zone", ez[0], ez[1])
+    _add("stop_loss", result.get("stop_loss"))
+    _add("take_profit1", result.get("take_profit1"))
+    zones = (result.get("signals") or {}).get("zones") or {}
+    for name in ("long_zone", "short_zone"):
+        z = zones.get(name)
+        if z:
+            _add(name, z[0], z[1])
+    return out
+
+
+class WatchEngine:
+    """
+    价格告警引擎：
+    - 每个 inst 一个区间索引；每个 tick 用 [上一价, 当前价] 查询，穿越或落入区间即触发
+    - tick 来源：后台轮询 /market/tickers（每个 instType 一次请求覆盖全部标的）、扫描器收盘价、手工注入
+    - 触发后 POST 到告警的 webhook，并推送给 /alerts/stream 的订阅者
+    - 告警持久化到 DATA_DIR/alerts.json
+    """
+    def __init__(self):
+        self.alerts: Dict[str, Alert] = {}
+        self._index: Dict[str, IntervalIndex] = {}
+        self.last_price: Dict[str, float] = {}
+        self._subscribers: List[asyncio.Queue] = []
+        self.running = False
+        self._task: asyncio.Task | None = None
+        self.interval_sec = WATCH_INTERVAL_SEC
+        self.ticks = 0
+        self.triggered = 0
+        self.webhook_ok = 0
+        self.webhook_failed = 0
+        self.last_match_us: Optional[float] = None
+        self._tasks: set = set()
+        self._save_pending = False
+        self._save_task: asyncio.Task | None = None
+        self._load()
+
+    # ---- 持久化 ----
+    def _load(self):
+        if not os.path.isfile(ALERTS_PATH):
+            return
+        try:
+            with open(ALERTS_PATH, "r", encoding="utf-8") as f:
+                for d in json.load(f):
+                    self._put(Alert(**d))
+        except (OSError, ValueError, TypeError):
+            pass
+
+    _write_lock = threading.Lock()
+
+    @classmethod
+    def _write(cls, items: List[Dict]):
+        with cls._write_lock:
+            cls._write_file(items)
+
+    @staticmethod
+    def _write_file(items: List[Dict]):
+        os.makedirs(DATA_DIR, exist_ok=True)
+        tmp = ALERTS_PATH + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(items, f, ensure_ascii=False)
+        os.replace(tmp, ALERTS_PATH)
+
+    def _save(self):
+        """
+        标记需要落盘。有事件循环时合并到下一轮循环写一次（同一批 tick 的多次触发只写一次），
+        序列化在循环里做（状态一致），写文件放到线程；无事件循环时直接写。
+        """
+        self._save_pending = True
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            self.flush()
+            return
+        if self._save_task is None or self._save_task.done():
+            self._save_task = self._spawn(loop, self._flush_async())
+
+    async def _flush_async(self):
+        while self._save_pending:
+            self._save_pending = False
+            await asyncio.to_thread(self._write, [asdict(a) for a in self.alerts.values()])
+
+    def flush(self):
+        if self._save_pending:
+            self._save_pending = False
+            self._write([asdict(a) for a in self.alerts.values()])
+
+    def _spawn(self, loop: asyncio.AbstractEventLoop, coro) -> asyncio.Task:
+        # 保留后台任务的引用，避免执行中被回收
+        task = loop.create_task(coro)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return task
+
+    # ---- 增删查 ----
+    def _put(self, alert: Alert):
+        self.alerts[alert.id] = alert
+        if alert.active:
+            self._index.setdefault(alert.inst_id, IntervalIndex()).add(alert.id, alert.lo, alert.hi)
+
+    def add(self, alerts: List[Alert]) -> List[Alert]:
+        for a in alerts:
+            self._put(a)
+        self._save()
+        return alerts
+
+    def remove(self, alert_id: str) -> bool:
+        a = self.alerts.pop(alert_id, None)
+        if a is None:
+            return False
+        idx = self._index.get(a.inst_id)
+        if idx is not None:
+            idx.remove(alert_id)
+        self._save()
+        return True
+
+    def list(self, inst_id: Optional[str] = None, active_only: bool = False) -> List[Dict]:
+        return [asdict(a) | {"active": a.active} for a in self.alerts.values()
+                if (inst_id is None or a.inst_id == inst_id) and (a.active or not active_only)]
+
+    # ---- 匹配 ----
+    def on_tick(self, inst_id: str, price: float) -> List[Alert]:
+        """处理一个价格；返回本次触发的告警（投递异步进行）。"""
+        self.ticks += 1
+        prev = self.last_price.get(inst_id, price)
+        self.last_price[inst_id] = price
+        idx = self._index.get(inst_id)
+        if not idx:
+            return []
+        t0 = time.perf_counter()
+        hits = idx.query(min(prev, price), max(prev, price))
+        self.last_match_us = round((time.perf_counter() - t0) * 1e6, 1)
+        fired: List[Alert] = []
+        now = time.time()
+        for aid in hits:
+            a = self.alerts[aid]
+            a.hits += 1
+            a.triggered_at = now
+            a.triggered_price = price
+            if not a.active:
+                idx.remove(aid)
+            fired.append(a)
+        if fired:
+            self.triggered += len(fired)
+            self._save()
+            for a in fired:
+                self._deliver(a, price)
+        return fired
+
+    def _deliver(self, alert: Alert, price: float):
+        event = {"event": "alert_triggered", "price": price, "ts": time.time(), "alert": asdict(alert)}
+        for q in list(self._subscribers):
+            if q.full():
+                q.get_nowait()   # 慢订阅者丢最旧的
+            q.put_nowait(event)
+        if alert.webhook:
+            try:
+                self._spawn(asyncio.get_running_loop(), self._post_webhook(alert.webhook, event))
+            except RuntimeError:
+                pass   # 无事件循环（同步调用场景）时只推送到订阅者
+
+    async def _post_webhook(self, url: str, event: Dict):
+        try:
+            async with httpx.AsyncClient(timeout=WEBHOOK_TIMEOUT_SEC) as c:
+                r = await c.post(url, json=event)
+            if r.status_code < 300:
+                self.webhook_ok += 1
+            else:
+                self.webhook_failed += 1
+        except Exception:
+            # 网络错误 / 非法地址等都算投递失败，不让异常留在无人等待的任务里
+            self.webhook_failed += 1
+
+    # ---- 推送流（SSE）订阅 ----
+    def subscribe(self) -> asyncio.Queue:
+        q: asyncio.Queue = asyncio.Queue(maxsize=100)
+        self._subscribers.append(q)
+        return q
+
+    def unsubscribe(self, q: asyncio.Queue):
+        if q in self._subscribers:
+            self._subscribers.remove(q)
+
+    # ---- 后台行情轮询 ----
+    async def poll_once(self):
+        watched = {inst for inst, idx in self._index.items() if len(idx)}
+        if not watched:
+            return
+        client = OkxClient()
+        try:
+            for inst_type in sorted({_inst_type(i) for i in watched}):
+                res = await client.tickers(inst_type)
+                if res.get("code") != "0" or res.get("stale"):
+                    continue
+                for row in res.get("data", []):
+                    inst = row.get("instId")
+                    if inst in watched:
+                        try:
+                            self.on_tick(inst, float(row.get("last")))
+                        except (TypeError, ValueError):
+                            continue
+        finally:
+            await client.close()
+
+    async def _runner(self):
+        try:
+            while self.running:
+                try:
+                    await self.poll_once()
+                except Exception:
+                    # 单轮失败忽略，下一轮继续
+                    pass
+                await asyncio.sleep(self.interval_sec)
+        except asyncio.CancelledError:
+            pass
+
+    def start(self):
+        if self.running:
+            return
+        self.running = True
+        self._task = asyncio.create_task(self._runner())
+
+    def stop(self):
+        self.flush()
+        if not self.running:
+            return
+        self.running = False
+        if self._task:
+            self._task.cancel()
+            self._task = None
+
+    def status(self):
+        return {
+            "running": self.running,
+            "interval_sec": self.interval_sec,
+            "alerts": len(self.alerts),
+            "active": sum(1 for a in self.alerts.values() if a.active),
+            "instruments": sum(1 for idx in self._index.values() if len(idx)),
+            "ticks": self.ticks,
+            "triggered": self.triggered,
+            "last_match_us": self.last_match_us,
+            "index_rebuilds": sum(idx.rebuilds for idx in self._index.values()),
+            "webhook_ok": self.webhook_ok,
+            "webhook_failed": self.webhook_failed,
+            "subscribers": len(self._subscribers),
+        }
+
+
+watch = WatchEngine()
@@ -0,0 +1,239 @@
+import asyncio
+import math
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+from .config import ANALYTICS_WINDOWS, ANALYTICS_BENCHMARKS, ANALYTICS_CORR_WINDOW, bar_ms
+from .history import history, _np
+
+
+def _num(x) -> Optional[float]:
+    x = float(x)
+    return None if math.isnan(x) or math.isinf(x) else round(x, 6)
+
+
+class _Panel:
+    """
+    某周期的对齐收盘价矩阵：行是统一时间网格（最旧 -> 最新，步长 bar_ms），列是交易对。
+    增量维护：网格前移时整体上移 shift 行；只重填 ring.version 变化过的列。
+    """
+    def __init__(self, step: int, length: int, last_ts: int):
+        np = _np()
+        self.step = step
+        self.length = length
+        self.ts = last_ts - step * np.arange(length - 1, -1, -1, dtype=np.int64)
+        self.symbols: List[str] = []
+        self.closes = np.full((length, 0), np.nan)
+        self.versions: Dict[str, int] = {}
+
+    def sync(self, rings: Dict[str, Any]) -> Dict[str, int]:
+        np = _np()
+        newest = max(r.last_ts for r in rings.values())
+        shift = (newest - int(self.ts[-1])) // self.step
+        if shift > 0:
+            if shift < self.length:
+                self.closes[:-shift] = self.closes[shift:]
+            self.closes[-min(shift, self.length):] = np.nan
+            self.ts = self.ts + shift * self.step
+
+        gone = [s for s in self.symbols if s not in rings]
+        if gone:
+            keep = [j for j, s in enumerate(self.symbols) if s in rings]
+            self.closes = self.closes[:, keep]
+            self.symbols = [self.symbols[j] for j in keep]
+            for s in gone:
+                self.versions.pop(s, None)
+        new = sorted(s for s in rings if s not in self.versions)
+        if new:
+            self.closes = np.hstack([self.closes, np.full((self.length, len(new)), np.nan)])
+            self.symbols.extend(new)
+
+        updated = 0
+        for j, inst in enumerate(self.symbols):
+            ring = rings[inst]
+            if self.versions.get(inst) == ring.version:
+                continue
+            # 先取版本再读数据：计算在线程里跑，期间事件循环可能又写入，版本对不上下次会重填
+            version = ring.version
+            v = ring.view()
+            pos = (v[:, 0].astype(np.int64) - self.ts[0]) // self.step
+            ok = (pos >= 0) & (pos < self.length)
+            col = self.closes[:, j]
+            col[:] = np.nan
+            col[pos[ok]] = v[ok, 4]
+            self.versions[inst] = version
+            updated += 1
+        return {"shift": max(int(shift), 0), "updated": updated, "added": len(new), "removed": len(gone)}
+
+
+def _ffill(a):
+    """沿时间轴向前填充 NaN（开头的 NaN 保留）。"""
+    np = _np()
+    idx = np.where(np.isnan(a), 0, np.arange(a.shape[0])[:, None])
+    np.maximum.accumulate(idx, axis=0, out=idx)
+    return a[idx, np.arange(a.shape[1])]
+
+
+def _ema_last(px, period: int):
+    """
+    逐列 EMA，只返回最后一行。开头的 NaN 用该列第一个有效值回填：
+    常数输入下 EMA 不变，所以等价于从第一个有效值起算（与 features.ema 一致）。
+    """
+    np = _np()
+    first = np.argmax(~np.isnan(px), axis=0)
+    seed = px[first, np.arange(px.shape[1])]
+    x = np.where(np.isnan(px), seed, px)
+    k = 2 / (period + 1)
+    e = x[0].copy()
+    for row in x[1:]:
+        e *= 1 - k
+        e += row * k
+    return e
+
+
+class CrossAnalytics:
+    """
+    跨品种分析（基于 history 环形缓冲，按周期对齐成矩阵后做几次向量化计算）：
+    - 多窗口滚动收益；相对 BTC/ETH 的强弱：(1+r)/(1+r_基准)-1
+    - 最近 ANALYTICS_CORR_WINDOW 根对数收益的相关系数矩阵
+    - 市场宽度：EMA21 > EMA55 的交易对占比
+    扫描器每轮结束调用 refresh_all_async()（计算放到线程里，不占事件循环）；没有新数据时直接返回上次结果。
+    """
+    def __init__(self, windows: List[int] = ANALYTICS_WINDOWS, benchmarks: List[str] = ANALYTICS_BENCHMARKS,
+                 corr_window: int = ANALYTICS_CORR_WINDOW):
+        self.windows = sorted(set(w for w in windows if w > 0))
+        self.benchmarks = benchmarks
+        self.corr_window = corr_window
+        self._panels: Dict[str, _Panel] = {}
+        self._results: Dict[str, Dict[str, Any]] = {}
+        self.refreshes = 0
+        self.recomputes = 0
+        self.skipped = 0
+        self._lock = threading.Lock()       # 扫描器的后台刷新与 /analytics/cross 可能在不同线程
+        self._refreshing = False
+
+    def refresh(self, bar: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            return self._refresh(bar)
+
+    def _refresh(self, bar: str) -> Optional[Dict[str, Any]]:
+        rings = history.series(bar)
+        step = bar_ms(bar)
+        if not rings or not step:
+            self._panels.pop(bar, None)
+            self._results.pop(bar, None)
+            return None
+        self.refreshes += 1
+        panel = self._panels.get(bar)
+        if panel is None or panel.length != history.capacity:
+            panel = self._panels[bar] = _Panel(step, history.capacity, max(r.last_ts for r in rings.values()))
+        changes = panel.sync(rings)
+        if any(changes.values()) or bar not in self._results:
+            t0 = time.perf_counter()
+            self._results[bar] = self._compute(bar, panel)
+            self._results[bar]["compute_ms"] = round((time.perf_counter() - t0) * 1000, 2)
+            self._results[bar]["last_sync"] = changes
+            self.recomputes += 1
+        return self._results[bar]
+
+    def refresh_all(self):
+        for bar in sorted({b for _inst, b in history.keys()}):
+            self.refresh(bar)
+
+    async def refresh_all_async(self):
+        """在线程里 refresh_all()；上一次还没算完时跳过本次，下一轮会带上这期间的更新。"""
+        if self._refreshing:
+            self.skipped += 1
+            return
+        self._refreshing = True
+        try:
+            await asyncio.to_thread(self.refresh_all)
+        finally:
+            self._refreshing = False
+
+    def _compute(self, bar: str, panel: _Panel) -> Dict[str, Any]:
+        np = _np()
+        raw = panel.closes
+        px = _ffill(raw)
+        n, m = px.shape
+        have = ~np.isnan(raw)
+        last_seen = np.where(have.any(axis=0), n - 1 - np.argmax(have[::-1], axis=0), -1)
+
+        last = px[-1]
+        rets = {w: last / px[-1 - w] - 1 for w in self.windows if w < n}
+        col = {s: j for j, s in enumerate(panel.symbols)}
+        benches = [b for b in self.benchmarks if b in col]
+
+        with np.errstate(invalid="ignore", divide="ignore"):
+            ema21 = _ema_last(px, 21)
+            ema55 = _ema_last(px, 55)
+            trend_up = ema21 > ema55
+            valid = ~np.isnan(last)
+
+            window = min(self.corr_window, n - 1)
+            lr = np.diff(np.log(px[-(window + 1):]), axis=0)
+            full = np.isfinite(lr).all(axis=0)
+            corr_syms = [s for s, ok in zip(panel.symbols, full) if ok]
+            corr = np.corrcoef(lr[:, full].T) if len(corr_syms) >= 2 else np.zeros((len(corr_syms), len(corr_syms)))
+
+            rows = []
+            for j, inst in enumerate(panel.symbols):
+                row: Dict[str, Any] = {"inst_id": inst, "close": _num(last[j]),
+                                       "lag_bars": int(n - 1 - last_seen[j]) if last_seen[j] >= 0 else None,
+                                       "ema_trend_up": bool(trend_up[j]) if valid[j] else None}
+                for w, r in rets.items():
+                    row[f"ret_{w}"] = _num(r[j])
+                    for b in benches:
+                        row[f"rs_{b}_{w}"] = _num((1 + r[j]) / (1 + r[col[b]]) - 1)
+                rows.append(row)
+
+        return {
+            "bar": bar,
+            "as_of": int(panel.ts[-1]),
+            "symbols": m,
+            "windows": list(rets),
+            "benchmarks": benches,
+            "benchmarks_missing": [b for b in self.benchmarks if b not in col],
+            "breadth": {"ema21_gt_ema55": _num(trend_up[valid].mean()) if valid.any() else None,
+                        "count": int(valid.sum())},
+            "rows": rows,
+            "_corr": (corr_syms, corr),
+            "computed_at": time.time(),
+        }
+
+    def view(self, bar: str, sort_by: Optional[str] = None, top: Optional[int] = None,
+             with_corr: bool = True) -> Optional[Dict[str, Any]]:
+        """排序 / 截取后的结果；相关矩阵只返回入选交易对之间的子矩阵。"""
+        res = self.refresh(bar)
+        if res is None:
+            return None
+        rows = res["rows"]
+        if sort_by is None and res["windows"]:
+            sort_by = f"ret_{res['windows'][-1]}"
+        if sort_by:
+            rows = sorted(rows, key=lambda r: (r.get(sort_by) is None, -(r.get(sort_by) or 0.0)))
+        if top:
+            rows = rows[:top]
+        out = {k: v for k, v in res.items() if not k.startswith("_")}
+        out["sort_by"] = sort_by
+        out["rows"] = rows
+        if with_corr:
+            syms, corr = res["_corr"]
+            pick = {r["inst_id"] for r in rows}
+            idx = [i for i, s in enumerate(syms) if s in pick]
+            out["correlation"] = {"window": self.corr_window, "symbols": [syms[i] for i in idx],
+                                  "matrix": [[_num(corr[i, k]) for k in idx] for i in idx]}
+        return out
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "bars": sorted(self._panels),
+            "refreshes": self.refreshes,
+            "recomputes": self.recomputes,
+            "skipped": self.skipped,
+            "last_compute_ms": {bar: r.get("compute_ms") for bar, r in self._results.items()},
+        }
+
+
+analytics = CrossAnalytics()
@@ -0,0 +1,77 @@
+import asyncio
+import json
+import time
+from typing import AsyncIterator, Dict, Tuple
+
+from .cache import candle_cache, eval_memo
+from .features import FeatureCache
+from .schemas import EvaluateBatchRequest
+from .strategies import Strategy, run_strategy
+
+
+async def evaluate_batch_stream(st: Strategy, req: EvaluateBatchRequest) -> AsyncIterator[bytes]:
+    """
+    批量评估，逐条以 NDJSON 输出（谁先算完谁先发）：
+    - 所有条目用到的 (inst, bar) 去重后并发拉取，最多 concurrency 个同时进行
+    - 评估放到线程池，与其余 K 线请求重叠执行；结果与单条接口共用 eval_memo
+    - 整个批次共用一份 FeatureCache，同一 (inst, bar) 只解析、只算一次指标
+    - 最后一行是汇总 {"done": true, ...}
+    """
+    t0 = time.perf_counter()
+    sem = asyncio.Semaphore(max(1, req.concurrency))
+
+    async def _fetch(inst_id: str, bar: str) -> Dict:
+        async with sem:
+            return await candle_cache.fetch(inst_id, bar, req.limit)
+
+    fetches: Dict[Tuple[str, str], asyncio.Task] = {}
+    for it in req.items:
+        for bar in (it.bar, it.trend_bar):
+            if (it.inst_id, bar) not in fetches:
+                fetches[(it.inst_id, bar)] = asyncio.create_task(_fetch(it.inst_id, bar))
+
+    loop = asyncio.get_running_loop()
+    feats = FeatureCache()
+
+    async def _one(idx: int):
+        it = req.items[idx]
+        head = {"index": idx, "inst_id": it.inst_id, "bar": it.bar, "trend_bar": it.trend_bar}
+        try:
+            raw_b = await fetches[(it.inst_id, it.bar)]
+            raw_t = await fetches[(it.inst_id, it.trend_bar)]
+            # 与 /strategy/{name}/evaluate 相同的键，单条与批量互相命中
+            params = dict(inst_id=it.inst_id, bar=it.bar, trend_bar=it.trend_bar, limit=req.limit,
+                          risk_percent=req.risk_percent, funds_total=req.funds_total,
+                          funds_split=req.funds_split, leverage=req.leverage,
+                          exclude_btc_in_screen=req.exclude_btc_in_screen)
+            etag = eval_memo.etag(st.name, params, raw_b, raw_t)
+            res = eval_memo.get(etag) if etag else None
+            if res is None:
+                res = await loop.run_in_executor(
+                    None, run_strategy, st, feats, it.inst_id, it.bar, it.trend_bar, raw_b, raw_t,
+                    req.risk_percent, req.funds_total, req.funds_split, req.leverage, req.exclude_btc_in_screen,
+                )
+                if etag:
+                    eval_memo.put(etag, res)
+            if raw_b.get("stale") or raw_t.get("stale"):
+                head["stale"] = True
+            return {**head, "result": res}
+        except Exception as e:
+            return {**head, "error": "server_exception", "detail": str(e)}
+
+    errors = 0
+    try:
+        for fut in asyncio.as_completed([_one(i) for i in range(len(req.items))]):
+            line = await fut
+            errors += "error" in line
+            yield (json.dumps(line, ensure_ascii=False) + "\n").encode("utf-8")
+    finally:
+        for task in fetches.values():
+            task.cancel()
+    yield (json.dumps({
+        "done": True,
+        "count": len(req.items),
+        "errors": errors,
+        "upstream_fetches": len(fetches),
+        "elapsed_ms": round((time.perf_counter() - t0) * 1000, 1),
+    }) + "\n").encode("utf-8")
@@ -0,0 +1,580 @@
+import asyncio
+import bisect
+import json
+import os
+import re
+import time
+import zlib
+from typing import Any, Dict, List, Optional, Tuple
+
+from .config import (
+    DATA_DIR, OKX_DEADLINE_SEC, BOOKS_INSTS, BOOKS_SOURCE, BOOKS_WS_URL, BOOKS_CHANNEL, BOOKS_DEPTH, BOOKS_POLL_SEC,
+    BOOKS_SNAPSHOT_SEC, BOOKS_SNAPSHOT_LEVELS, BOOKS_SNAPSHOT_BATCH, BOOKS_KEEP_FILES,
+)
+from .okx import OkxClient
+from .storage import _compress, _write_atomic, segment_ext, read_bytes, register_evictable
+
+BOOKS_DIR = os.path.join(DATA_DIR, "books")
+CHECKSUM_LEVELS = 25    # OKX checksum 取每侧前 25 档
+_FILE_RE = re.compile(r"\.(?P<first>\d+)-(?P<last>\d+)\.jsonl(?:\.gz|\.zst)?$")
+
+
+def _ws():
+    # websockets 随 uvicorn[standard] 安装；缺失时只能用 REST 轮询
+    try:
+        import websockets
+        return websockets
+    except ImportError:
+        return None
+
+
+def _signed32(x: int) -> int:
+    return x - (1 << 32) if x >= (1 << 31) else x
+
+
+class Levels:
+    """
+    一侧盘口：按价格有序的并行数组（key / px / sz），bisect 定位，插入删除是一次数组移动。
+    key 为 float(px)，买盘取负数，两侧都是 index 0 最优。
+    px / sz 保留 OKX 原始字符串：checksum 按原字符串计算，落盘也不损失精度。
+    """
+    __slots__ = ("sign", "keys", "px", "sz")
+
+    def __init__(self, sign: int):
+        self.sign = sign
+        self.keys: List[float] = []
+        self.px: List[str] = []
+        self.sz: List[str] = []
+
+    def __len__(self):
+        return len(self.keys)
+
+    def replace(self, levels: List[List[str]]):
+        rows = sorted(((self.sign * float(lv[0]), lv[0], lv[1]) for lv in levels if float(lv[1]) > 0))
+        self.keys = [r[0] for r in rows]
+        self.px = [r[1] for r in rows]
+        self.sz = [r[2] for r in rows]
+
+    def apply(self, levels: List[List[str]]):
+        """增量：sz 为 0 删除该价位，否则新增或覆盖。"""
+        for lv in levels:
+            px, sz = lv[0], lv[1]
+            k = self.sign * float(px)
+            i = bisect.bisect_left(self.keys, k)
+            exists = i < len(self.keys) and self.keys[i] == k
+            if float(sz) == 0:
+                if exists:
+                    del self.keys[i], self.px[i], self.sz[i]
+            elif exists:
+                self.px[i], self.sz[i] = px, sz
+            else:
+                self.keys.insert(i, k)
+                self.px.insert(i, px)
+                self.sz.insert(i, sz)
+
+    def top(self, n: Optional[int] = None) -> List[List[str]]:
+        n = len(self.keys) if n is None else n
+        return [[p, s] for p, s in zip(self.px[:n], self.sz[:n])]
+
+    def best(self) -> Optional[float]:
+        return float(self.px[0]) if self.px else None
+
+
+class OrderBook:
+    """单个交易对的盘口：快照重置 + 增量更新；books 频道带 seqId / checksum 时逐条校验。"""
+    def __init__(self, inst_id: str):
+        self.inst_id = inst_id
+        self.bids = Levels(-1)
+        self.asks = Levels(1)
+        self.ts: Optional[int] = None        # 交易所时间戳（ms）
+        self.received = 0.0                  # 本地收到时间
+        self.seq_id: Optional[int] = None
+        self.valid = False                   # 校验失败 / 序号断档后为 False，等下一次快照
+        self.source = ""
+        self.updates = 0
+
+    def checksum(self) -> int:
+        parts: List[str] = []
+        for i in range(CHECKSUM_LEVELS):
+            if i < len(self.bids):
+                parts += (self.bids.px[i], self.bids.sz[i])
+            if i < len(self.asks):
+                parts += (self.asks.px[i], self.asks.sz[i])
+        return _signed32(zlib.crc32(":".join(parts).encode()))
+
+    def _stamp(self, d: Dict[str, Any], source: str):
+        self.ts = int(d["ts"]) if d.get("ts") else self.ts
+        self.received = time.time()
+        self.source = source
+        if d.get("seqId") is not None:
+            self.seq_id = int(d["seqId"])
+
+    def _verify(self, d: Dict[str, Any]) -> bool:
+        if d.get("checksum") is None:
+            return True
+        return int(d["checksum"]) == self.checksum()
+
+    def snapshot(self, d: Dict[str, Any], source: str = "ws") -> bool:
+        self.bids.replace(d.get("bids") or [])
+        self.asks.replace(d.get("asks") or [])
+        self._stamp(d, source)
+        self.valid = self._verify(d)
+        return self.valid
+
+    def update(self, d: Dict[str, Any], source: str = "ws") -> bool:
+        """返回 False 表示需要重新订阅拿快照（序号断档或 checksum 不一致）。"""
+        if not self.valid:
+            return False
+        prev = d.get("prevSeqId")
+        if prev is not None and self.seq_id is not None and int(prev) != self.seq_id:
+            self.valid = False
+            return False
+        self.bids.apply(d.get("bids") or [])
+        self.asks.apply(d.get("asks") or [])
+        self._stamp(d, source)
+        self.updates += 1
+        self.valid = self._verify(d)
+        return self.valid
+
+    def depth(self, levels: int = 20) -> Dict[str, Any]:
+        bid, ask = self.bids.best(), self.asks.best()
+        return {
+            "inst_id": self.inst_id,
+            "ts": self.ts,
+            "age_ms": int((time.time() - self.received) * 1000) if self.received else None,
+            "source": self.source,
+            "valid": self.valid,
+            "seq_id": self.seq_id,
+            "levels": {"bids": len(self.bids), "asks": len(self.asks)},
+            "best_bid": bid,
+            "best_ask": ask,
+            "spread_bps": round((ask - bid) / ((ask + bid) / 2) * 1e4, 4) if bid and ask else None,
+            "bids": self.bids.top(levels),
+            "asks": self.asks.top(levels),
+        }
+
+    def slippage(self, qty: float, side: str, ct_val: float = 1.0) -> Dict[str, Any]:
+        """
+        按当前盘口吃掉 qty（盘口 sz 单位：现货为币，合约为张）的成交均价与滑点。
+        side: buy 吃卖盘，sell 吃买盘。slippage_bps 相对本侧最优价，impact_bps 相对中间价，正数表示更差。
+        """
+        book = self.asks if side == "buy" else self.bids
+        sign = 1 if side == "buy" else -1
+        best, bid, ask = book.best(), self.bids.best(), self.asks.best()
+        remaining, cost, used, worst = qty, 0.0, 0, None
+        for px, sz in zip(book.px, book.sz):
+            if remaining <= 0:
+                break
+            p, take = float(px), min(float(sz), remaining)
+            cost += p * take
+            remaining -= take
+            used += 1
+            worst = p
+        filled = qty - remaining
+        vwap = cost / filled if filled > 0 else None
+        mid = (bid + ask) / 2 if bid and ask else None
+        out = {
+            "inst_id": self.inst_id,
+            "side": side,
+            "qty": qty,
+            "filled": round(filled, 12),
+            "unfilled": round(max(remaining, 0.0), 12),
+            "levels_used": used,
+            "best": best,
+            "mid": mid,
+            "vwap": vwap,
+            "worst_price": worst,
+            "slippage_bps": None,
+            "impact_bps": None,
+            "slip_per_unit": None,
+            "slip_cost": None,
+        }
+        if vwap is not None and best:
+            per_unit = sign * (vwap - best)
+            out["slippage_bps"] = round(per_unit / best * 1e4, 4)
+            out["slip_per_unit"] = per_unit
+            out["slip_cost"] = per_unit * filled * ct_val      # 计价币
+            if mid:
+                out["impact_bps"] = round(sign * (vwap - mid) / mid * 1e4, 4)
+        return out
+
+
+class SnapshotLog:
+    """
+    单个交易对的落盘快照：第一条记全量前 N 档，之后只记相对上一条变化的价位（sz 为 "0" 表示移出），
+    攒够 BOOKS_SNAPSHOT_BATCH 条写成一个压缩文件 books/{inst}/{inst}.{first_ts}-{last_ts}.jsonl.zst。
+    """
+    def __init__(self, inst_id: str, levels: int = BOOKS_SNAPSHOT_LEVELS):
+        self.inst_id = inst_id
+        self.levels = levels
+        self.lines: List[str] = []
+        self.first_ts: Optional[int] = None
+        self.last_ts: Optional[int] = None
+        self._prev: Optional[Tuple[Dict[str, str], Dict[str, str]]] = None
+
+    @staticmethod
+    def _diff(prev: Dict[str, str], cur: Dict[str, str]) -> List[List[str]]:
+        out = [[p, s] for p, s in cur.items() if prev.get(p) != s]
+        out += [[p, "0"] for p in prev if p not in cur]
+        return out
+
+    def record(self, book: OrderBook):
+        ts = int(time.time() * 1000)     # 记录时刻；盘口自身的交易所时间戳记为 bts
+        b, a = book.bids.top(self.levels), book.asks.top(self.levels)
+        cur = (dict(b), dict(a))
+        if self._prev is None:
+            line = {"ts": ts, "bts": book.ts, "b": b, "a": a}
+        else:
+            line = {"ts": ts, "bts": book.ts, "d": 1,
+                    "b": self._diff(self._prev[0], cur[0]), "a": self._diff(self._prev[1], cur[1])}
+        self._prev = cur
+        self.lines.append(json.dumps(line, separators=(",", ":")))
+        self.first_ts = ts if self.first_ts is None else self.first_ts
+        self.last_ts = ts
+
+    def take(self) -> Optional[Tuple[str, bytes]]:
+        """取出待写入的 (路径, 内容) 并清空缓冲；下一批重新从全量开始。"""
+        if not self.lines:
+            return None
+        ext = segment_ext()
+        safe = self.inst_id.replace("/", "-")
+        path = os.path.join(BOOKS_DIR, safe, f"{safe}.{self.first_ts}-{self.last_ts}.jsonl{ext}")
+        data = _compress(("\n".join(self.lines) + "\n").encode(), ext)
+        self.lines, self.first_ts, self.last_ts, self._prev = [], None, None, None
+        return path, data
+
+
+def _span(name: str) -> Optional[Tuple[int, int]]:
+    m = _FILE_RE.search(name)
+    return (int(m.group("first")), int(m.group("last"))) if m else None
+
+
+def _files(folder: str) -> List[Tuple[int, int, str]]:
+    out = []
+    for name in os.listdir(folder):
+        span = _span(name)
+        if span:
+            out.append((span[0], span[1], name))
+    return sorted(out)
+
+
+def write_snapshots(path: str, data: bytes, keep: int = BOOKS_KEEP_FILES):
+    folder = os.path.dirname(path)
+    os.makedirs(folder, exist_ok=True)
+    _write_atomic(path, data)
+    files = _files(folder)
+    for _first, _last, name in files[:max(len(files) - keep, 0)]:
+        os.remove(os.path.join(folder, name))
+
+
+@register_evictable
+def _snapshot_files() -> List[Tuple[int, str]]:
+    # 磁盘预算超出时，旧快照文件与 K 线压缩段一起按时间淘汰
+    if not os.path.isdir(BOOKS_DIR):
+        return []
+    out = []
+    for inst in os.listdir(BOOKS_DIR):
+        folder = os.path.join(BOOKS_DIR, inst)
+        if os.path.isdir(folder):
+            out.extend((last, os.path.join(folder, name)) for _first, last, name in _files(folder))
+    return out
+
+
+def read_snapshots(inst_id: str, since: Optional[int] = None, until: Optional[int] = None,
+                   limit: int = 100) -> List[Dict[str, Any]]:
+    """回放落盘快照，返回 since..until 之间最近 limit 条的完整前 N 档。"""
+    safe = inst_id.replace("/", "-")
+    folder = os.path.join(BOOKS_DIR, safe)
+    if not os.path.isdir(folder):
+        return []
+    out: List[Dict[str, Any]] = []
+    for first, last, name in _files(folder):
+        if since is not None and last < since:
+            continue
+        if until is not None and first > until:
+            break
+        bids: Dict[str, str] = {}
+        asks: Dict[str, str] = {}
+        for raw in read_bytes(os.path.join(folder, name)).decode().splitlines():
+            line = json.loads(raw)
+            if not line.get("d"):
+                bids, asks = {}, {}
+            for side, levels in ((bids, line["b"]), (asks, line["a"])):
+                for p, s in levels:
+                    if s == "0":
+                        side.pop(p, None)
+                    else:
+                        side[p] = s
+            ts = line["ts"]
+            if (since is None or ts >= since) and (until is None or ts <= until):
+                out.append({"ts": ts, "book_ts": line.get("bts"),
+                            "bids": sorted(([p, s] for p, s in bids.items()), key=lambda x: -float(x[0])),
+                            "asks": sorted(([p, s] for p, s in asks.items()), key=lambda x: float(x[0]))})
+    return out[-limit:]
+
+
+class BookManager:
+    """
+    盘口维护（后台任务，start/stop 与 WatchEngine 相同）：
+    - ws：订阅 books 频道，snapshot 重置、update 增量；seqId 断档或 checksum 不一致时退订再订阅拿新快照
+    - rest：每 BOOKS_POLL_SEC 拉 /market/books 快照整体替换（无 checksum）
+    - 每 BOOKS_SNAPSHOT_SEC 把有效盘口的前 N 档记入 SnapshotLog，攒批压缩落盘
+    未在维护列表里的交易对，depth() 按需拉一次 REST 快照并短暂复用；WS 维护的交易对从不混入 REST 快照。
+    """
+    def __init__(self):
+        self.books: Dict[str, OrderBook] = {}
+        self.insts: List[str] = list(BOOKS_INSTS)
+        self.source = BOOKS_SOURCE
+        self.ws_url = BOOKS_WS_URL
+        self.running = False
+        self._tasks: List[asyncio.Task] = []
+        self._logs: Dict[str, SnapshotLog] = {}
+        self._conn = None                                   # 当前 WS 连接
+        self._events: Dict[str, asyncio.Event] = {}         # 盘口恢复有效时 set
+        self._resyncing: set = set()                        # 已请求重新订阅、还没收到快照的
+        self.messages = 0
+        self.checksum_failures = 0
+        self.seq_gaps = 0
+        self.resyncs = 0
+        self.reconnects = 0
+        self.snapshots = 0
+        self.files_written = 0
+        self.last_error: Optional[str] = None
+
+    # ---- 消息处理 ----
+    def on_message(self, msg: Dict[str, Any]) -> List[str]:
+        """处理一条 WS 推送；返回需要重新订阅的交易对。"""
+        if msg.get("event"):
+            if msg["event"] == "error":
+                self.last_error = f"{msg.get('code')}: {msg.get('msg')}"
+            return []
+        inst = (msg.get("arg") or {}).get("instId")
+        if not inst:
+            return []
+        self.messages += 1
+        book = self.books.setdefault(inst, OrderBook(inst))
+        resync: List[str] = []
+        for d in msg.get("data") or []:
+            if msg.get("action", "snapshot") == "snapshot":
+                ok = book.snapshot(d, "ws")
+                self.checksum_failures += not ok
+            elif not book.valid:
+                continue          # 已请求重新订阅，等快照
+            else:
+                prev = d.get("prevSeqId")
+                if prev is not None and book.seq_id is not None and int(prev) != book.seq_id:
+                    book.valid = ok = False
+                    self.seq_gaps += 1
+                else:
+                    ok = book.update(d, "ws")
+                    self.checksum_failures += not ok
+            if not ok:
+                resync.append(inst)
+                break
+        self._mark(book)
+        return resync
+
+    def _ws_owned(self, inst_id: str) -> bool:
+        return self.running and self.source == "ws" and inst_id in self.insts
+
+    def _ready(self, inst_id: str) -> asyncio.Event:
+        ev = self._events.get(inst_id)
+        if ev is None:
+            ev = self._events[inst_id] = asyncio.Event()
+        return ev
+
+    def _mark(self, book: OrderBook):
+        ev = self._events.get(book.inst_id)
+        if book.valid:
+            self._resyncing.discard(book.inst_id)
+            if ev is not None:
+                ev.set()
+        elif ev is not None:
+            ev.clear()
+
+    async def _resubscribe(self, insts: List[str]):
+        """退订再订阅，交易所会重新推一次全量快照。"""
+        ws = self._conn
+        if ws is None or not insts:
+            return
+        self._resyncing.update(insts)
+        self.resyncs += len(insts)
+        await ws.send(self._sub("unsubscribe", insts))
+        await ws.send(self._sub("subscribe", insts))
+
+    def apply_rest(self, inst_id: str, res: Dict[str, Any]) -> Optional[OrderBook]:
+        if self._ws_owned(inst_id):
+            return None       # WS 维护的盘口不混入 REST 快照（seqId 接不上）
+        if str(res.get("code")) != "0" or not res.get("data"):
+            self.last_error = f"{inst_id}: {res.get('error') or res.get('msg') or res.get('code')}"
+            return None
+        book = self.books.setdefault(inst_id, OrderBook(inst_id))
+        book.snapshot(res["data"][0], "rest")
+        book.seq_id = None
+        return book
+
+    # ---- 查询 ----
+    def _fresh(self, book: Optional[OrderBook]) -> bool:
+        if book is None or not book.valid:
+            return False
+        if self.running and book.inst_id in self.insts:
+            return True       # 后台持续维护中
+        return time.time() - book.received < BOOKS_POLL_SEC
+
+    async def depth(self, inst_id: str, wait_sec: float = OKX_DEADLINE_SEC) -> Optional[OrderBook]:
+        """
+        当前盘口。WS 维护中的交易对只用 WS 数据：暂时无效（断档 / 校验失败 / 重连）时触发重新订阅
+        并等待新快照，最多 wait_sec；其余交易对按需拉一次 REST 快照并短暂复用。
+        """
+        book = self.books.get(inst_id)
+        if self._fresh(book):
+            return book
+        if self._ws_owned(inst_id):
+            if inst_id not in self._resyncing:
+                await self._resubscribe([inst_id])
+            try:
+                await asyncio.wait_for(self._ready(inst_id).wait(), wait_sec)
+            except asyncio.TimeoutError:
+                self.last_error = f"{inst_id}: waiting for ws snapshot"
+            book = self.books.get(inst_id)
+            return book if book is not None and book.valid else None
+        client = OkxClient()
+        try:
+            return self.apply_rest(inst_id, await client.books(inst_id, BOOKS_DEPTH))
+        finally:
+            await client.close()
+
+    # ---- 落盘 ----
+    def record_snapshots(self) -> List[Tuple[str, bytes]]:
+        pending = []
+        for inst in self.insts:
+            book = self.books.get(inst)
+            if book is None or not book.valid:
+                continue
+            log = self._logs.setdefault(inst, SnapshotLog(inst))
+            log.record(book)
+            self.snapshots += 1
+            if len(log.lines) >= BOOKS_SNAPSHOT_BATCH:
+                pending.append(log.take())
+        return pending
+
+    def _write(self, pending: List[Tuple[str, bytes]]):
+        for path, data in pending:
+            write_snapshots(path, data)
+            self.files_written += 1
+
+    def flush(self):
+        self._write([p for p in (log.take() for log in self._logs.values()) if p])
+
+    async def _snapshot_loop(self):
+        try:
+            while self.running:
+                await asyncio.sleep(BOOKS_SNAPSHOT_SEC)
+                pending = self.record_snapshots()
+                if pending:
+                    await asyncio.to_thread(self._write, pending)
+        except asyncio.CancelledError:
+            pass
+
+    # ---- 数据源 ----
+    async def _rest_loop(self):
+        client = OkxClient()
+        try:
+            while self.running:
+                results = await asyncio.gather(*(client.books(i, BOOKS_DEPTH) for i in self.insts),
+                                               return_exceptions=True)
+                for inst, res in zip(self.insts, results):
+                    if isinstance(res, Exception):
+                        self.last_error = f"{inst}: {res}"
+                        continue
+                    self.apply_rest(inst, res)
+                await asyncio.sleep(BOOKS_POLL_SEC)
+        except asyncio.CancelledError:
+            pass
+        finally:
+            await client.close()
+
+    def _sub(self, op: str, insts: List[str]) -> str:
+        return json.dumps({"op": op, "args": [{"channel": BOOKS_CHANNEL, "instId": i} for i in insts]})
+
+    async def _ws_loop(self):
+        websockets = _ws()
+        if websockets is None:
+            self.last_error = "websockets not installed, falling back to rest"
+            self.source = "rest"
+            await self._rest_loop()
+            return
+        backoff = 1.0
+        try:
+            while self.running:
+                try:
+                    async with websockets.connect(self.ws_url, ping_interval=None, max_size=2 ** 22) as ws:
+                        self._conn = ws
+                        self._resyncing.clear()
+                        await ws.send(self._sub("subscribe", self.insts))
+                        backoff = 1.0
+                        while self.running:
+                            try:
+                                raw = await asyncio.wait_for(ws.recv(), 25)
+                            except asyncio.TimeoutError:
+                                await ws.send("ping")   # OKX 30 秒无消息会断开
+                                continue
+                            if raw == "pong":
+                                continue
+                            await self._resubscribe(self.on_message(json.loads(raw)))
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    self.last_error = f"{type(e).__name__}: {e}"
+                finally:
+                    self._conn = None
+                for book in self.books.values():
+                    if book.source == "ws":
+                        book.valid = False      # 断线期间的增量丢了，重连后等新快照
+                        self._mark(book)
+                self.reconnects += 1
+                await asyncio.sleep(backoff)
+                backoff = min(backoff * 2, 30.0)
+        except asyncio.CancelledError:
+            pass
+
+    def start(self, insts: Optional[List[str]] = None, source: Optional[str] = None):
+        if insts is not None:
+            self.insts = list(dict.fromkeys(insts))
+        if source is not None:
+            self.source = source
+        if self.running or not self.insts:
+            return
+        self.running = True
+        feed = self._ws_loop() if self.source == "ws" else self._rest_loop()
+        self._tasks = [asyncio.create_task(feed), asyncio.create_task(self._snapshot_loop())]
+
+    def stop(self):
+        if not self.running:
+            return
+        self.running = False
+        for t in self._tasks:
+            t.cancel()
+        self._tasks = []
+        self.flush()
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "running": self.running,
+            "source": self.source,
+            "instruments": self.insts,
+            "books": {i: {"valid": b.valid, "source": b.source, "bids": len(b.bids), "asks": len(b.asks),
+                          "updates": b.updates, "age_ms": int((time.time() - b.received) * 1000)}
+                      for i, b in self.books.items()},
+            "messages": self.messages,
+            "checksum_failures": self.checksum_failures,
+            "seq_gaps": self.seq_gaps,
+            "resyncs": self.resyncs,
+            "reconnects": self.reconnects,
+            "snapshots": self.snapshots,
+            "files_written": self.files_written,
+            "last_error": self.last_error,
+        }
+
+
+books = BookManager()
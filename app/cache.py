@@ -0,0 +1,208 @@
+import asyncio
+import hashlib
+import json
+import math
+import os
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+from .config import (
+    CANDLE_TTL_SEC, CACHE_MAX_KEYS, CACHE_MAX_ROWS, WARM_START_BARS, EVAL_MEMO_SIZE, bar_ms,
+)
+from .okx import OkxClient
+from .history import history
+
+
+def _merge_rows(old: List[List[Any]], new: List[List[Any]], max_rows: int,
+                step: Optional[int] = None) -> List[List[Any]]:
+    # OKX 行格式，按 ts 倒序；同一 ts 以新数据为准。
+    # 已知周期时，旧数据只保留与新数据首尾相接的部分：在新数据最旧一根之前遇到第一个断档（> step）就截断，
+    # 否则预热的旧盘数据与刚拉的新数据之间会夹一个空洞，指标会跨空洞计算
+    by_ts: Dict[int, List[Any]] = {}
+    for row in old:
+        by_ts[int(row[0])] = row
+    for row in new:
+        by_ts[int(row[0])] = list(row)
+    ordered = sorted(by_ts, reverse=True)
+    if step and new:
+        oldest_new = min(int(row[0]) for row in new)
+        keep = []
+        for ts in ordered:
+            if ts < oldest_new and keep and keep[-1] - ts > step:
+                break
+            keep.append(ts)
+        ordered = keep
+    return [by_ts[ts] for ts in ordered[:max_rows]]
+
+
+class CandleCache:
+    """
+    进程内 K 线缓存（LRU，按 (inst, bar) 存最近 max_rows 根，OKX 格式倒序）：
+    - 新鲜期（CANDLE_TTL_SEC）内直接返回
+    - 过期但覆盖了所需根数时，只向 OKX 取缺口那几根再合并
+    - 扫描器结果与启动时的磁盘数据都会写进来
+    """
+    def __init__(self, max_keys: int = CACHE_MAX_KEYS, max_rows: int = CACHE_MAX_ROWS,
+                 ttl_sec: float = CANDLE_TTL_SEC):
+        self.max_keys = max_keys
+        self.max_rows = max_rows
+        self.ttl_sec = ttl_sec
+        self._data: "OrderedDict[Tuple[str, str], Dict[str, Any]]" = OrderedDict()
+        self.hits = 0
+        self.partial = 0
+        self.misses = 0
+
+    def get(self, inst_id: str, bar: str) -> Optional[Dict[str, Any]]:
+        entry = self._data.get((inst_id, bar))
+        if entry is not None:
+            self._data.move_to_end((inst_id, bar))
+        return entry
+
+    def merge(self, inst_id: str, bar: str, rows: List[List[Any]], source: str = "okx",
+              updated: Optional[float] = None):
+        if not rows:
+            return
+        key = (inst_id, bar)
+        old = self._data.get(key)
+        merged = _merge_rows(old["rows"] if old else [], rows, self.max_rows, bar_ms(bar))
+        self._data[key] = {"rows": merged, "updated": time.monotonic() if updated is None else updated,
+                           "source": source}
+        self._data.move_to_end(key)
+        while len(self._data) > self.max_keys:
+            self._data.popitem(last=False)
+        # 同步写入定长环形缓冲（策略从这里取零拷贝视图）
+        history.ingest(inst_id, bar, rows)
+
+    def _missing_rows(self, entry: Dict[str, Any], bar: str) -> Optional[int]:
+        # 距最新一根过去了几根（含正在走的那根）；无法判断周期时返回 None
+        step = bar_ms(bar)
+        if not step or not entry["rows"]:
+            return None
+        newest = int(entry["rows"][0][0])
+        return max(2, math.ceil((time.time() * 1000 - newest) / step) + 1)
+
+    async def fetch(self, inst_id: str, bar: str, limit: int) -> Dict[str, Any]:
+        entry = self.get(inst_id, bar)
+        if entry and len(entry["rows"]) >= limit:
+            if time.monotonic() - entry["updated"] < self.ttl_sec:
+                self.hits += 1
+                return {"code": "0", "msg": "", "data": entry["rows"][:limit]}
+            need = self._missing_rows(entry, bar)
+            if need is not None and need < limit:
+                self.partial += 1
+                res = await _okx_candles(inst_id, bar, need)
+                if res.get("code") != "0" or res.get("stale"):
+                    return self._stale(entry, limit, res)
+                self.merge(inst_id, bar, res.get("data", []))
+                rows = self._data[(inst_id, bar)]["rows"]
+                if len(rows) >= limit:
+                    return {"code": "0", "msg": "", "data": rows[:limit]}
+                # 与旧数据接不上（旧数据被截掉），退化为整窗拉取
+        self.misses += 1
+        res = await _okx_candles(inst_id, bar, limit)
+        if res.get("code") == "0" and not res.get("stale"):
+            self.merge(inst_id, bar, res.get("data", []))
+            return res
+        if entry and len(entry["rows"]) >= limit:
+            return self._stale(entry, limit, res)
+        return res
+
+    @staticmethod
+    def _stale(entry: Dict[str, Any], limit: int, err: Dict[str, Any]) -> Dict[str, Any]:
+        # 上游失败/熔断时用缓存兜底，并标明数据已过期
+        return {"code": "0", "msg": "", "data": entry["rows"][:limit], "stale": True,
+                "stale_age_sec": round(time.monotonic() - entry["updated"], 1),
+                "stale_reason": err.get("stale_reason") or err.get("error") or err.get("msg")}
+
+    # ---- 冷启动预热 ----
+    def _read_disk(self, n: int) -> List[Tuple[str, str, List[List[str]], float, Optional[str]]]:
+        from .storage import list_series, read_candles
+
+        out = []
+        for (inst, bar), item in list_series().items():
+            rows = read_candles(inst, bar, n)
+            if not rows:
+                continue
+            # 磁盘数据的“更新时间”取文件 mtime，避免把旧数据当成新鲜的
+            src = item["active"] or item["segments"][-1][2]
+            age = max(0.0, time.time() - os.path.getmtime(src))
+            out.append((inst, bar, rows, age, item["active"]))
+        return out
+
+    async def hydrate(self, n: int = WARM_START_BARS) -> List[str]:
+        """从 DATA_DIR 读每个 (inst, bar) 最近 n 根进缓存；读盘/解压在线程里，合并回到事件循环。返回活跃 CSV 路径。"""
+        loaded = await asyncio.to_thread(self._read_disk, min(n, self.max_rows))
+        paths: List[str] = []
+        for inst, bar, rows, age, active in loaded:
+            if active:
+                paths.append(active)
+            if (inst, bar) in self._data:
+                # 预热期间已有请求拉过新数据，不用旧数据覆盖
+                continue
+            self.merge(inst, bar, list(reversed(rows)), source="disk", updated=time.monotonic() - age)
+        return paths
+
+    def status(self):
+        return {
+            "keys": len(self._data),
+            "max_keys": self.max_keys,
+            "max_rows": self.max_rows,
+            "ttl_sec": self.ttl_sec,
+            "hits": self.hits,
+            "partial": self.partial,
+            "misses": self.misses,
+            "from_disk": sum(1 for e in self._data.values() if e["source"] == "disk"),
+        }
+
+
+class EvalMemo:
+    """
+    评估结果记忆化（LRU）。评估是 (参数, K 线) 的纯函数，而历史 K 线已确认不变，
+    因此键取：参数 + base/trend 最新一根的 ts + 最新一根（未确认 K 线）内容的哈希。
+    键的 sha1 同时作为 HTTP ETag。
+    """
+    def __init__(self, max_size: int = EVAL_MEMO_SIZE):
+        self.max_size = max_size
+        self._data: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def etag(name: str, params: Dict[str, Any], raw_base: Dict, raw_trend: Dict) -> Optional[str]:
+        base, trend = raw_base.get("data") or [], raw_trend.get("data") or []
+        if raw_base.get("code") != "0" or raw_trend.get("code") != "0" or not base or not trend:
+            return None  # 上游出错不缓存
+        key = json.dumps([name, sorted(params.items()), base[0][0], trend[0][0], base[0], trend[0]],
+                         separators=(",", ":"), default=str)
+        return '"' + hashlib.sha1(key.encode("utf-8")).hexdigest() + '"'
+
+    def get(self, etag: str) -> Optional[Dict[str, Any]]:
+        body = self._data.get(etag)
+        if body is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self._data.move_to_end(etag)
+        return body
+
+    def put(self, etag: str, body: Dict[str, Any]):
+        self._data[etag] = body
+        self._data.move_to_end(etag)
+        while len(self._data) > self.max_size:
+            self._data.popitem(last=False)
+
+    def status(self):
+        return {"size": len(self._data), "max_size": self.max_size, "hits": self.hits, "misses": self.misses}
+
+
+async def _okx_candles(inst_id: str, bar: str, limit: int) -> Dict[str, Any]:
+    client = OkxClient()
+    try:
+        return await client.candles(inst_id, bar, limit)
+    finally:
+        await client.close()
+
+
+candle_cache = CandleCache()
+eval_memo = EvalMemo()
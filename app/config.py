@@ -21,12 +21,95 @@ def parse_bars(s: str) -> Dict[str, int]:
         out[bar.strip()] = int(limit)
     return out
 
+_BAR_UNIT_MS = {"m": 60_000, "H": 3_600_000, "D": 86_400_000, "W": 604_800_000}
+
+def bar_ms(bar: str) -> int:
+    """K 线周期的毫秒数，如 15m -> 900000；无法识别（如 1M）返回 0。"""
+    n, unit = bar[:-1], bar[-1:]
+    if not n.isdigit() or unit not in _BAR_UNIT_MS:
+        return 0
+    return int(n) * _BAR_UNIT_MS[unit]
+
 API_KEY = os.getenv("API_KEY", "change-me")
+# 管理密钥：/debug/profile 等诊断接口需额外携带 x-admin-key；留空则关闭这些接口
+ADMIN_KEY = os.getenv("ADMIN_KEY", "")
 # 改到 Render 可写临时盘
 DATA_DIR = os.getenv("DATA_DIR", "/var/tmp/okxdata")
 SCAN_SYMBOLS = parse_symbols(os.getenv("SCAN_SYMBOLS", "ETH-USDT,SOL-USDT,BNB-USDT,OP-USDT,ARB-USDT"))
 SCAN_BARS = parse_bars(os.getenv("SCAN_BARS", ",".join([f"{k}:{v}" for k, v in DEFAULT_BARS.items()])))
 SCAN_BATCH = int(os.getenv("SCAN_BATCH", "5"))
 SCAN_INTERVAL_SEC = int(os.getenv("SCAN_INTERVAL_SEC", "30"))
+# 扫描器上游并发：AIMD 自适应，初始值 / 上限 / 目标延迟；失败 (inst, bar) 最多尝试次数
+SCAN_CONCURRENCY = int(os.getenv("SCAN_CONCURRENCY", "4"))
+SCAN_MAX_CONCURRENCY = int(os.getenv("SCAN_MAX_CONCURRENCY", "32"))
+SCAN_TARGET_LATENCY_SEC = float(os.getenv("SCAN_TARGET_LATENCY_SEC", "1.0"))
+SCAN_MAX_RETRY = int(os.getenv("SCAN_MAX_RETRY", "3"))
+# 分片扫描：SHARD_ID 为空则单进程；SHARD_NODES 为空时成员按心跳动态发现
+SHARD_ID = os.getenv("SHARD_ID", "")
+SHARD_NODES = parse_symbols(os.getenv("SHARD_NODES", ""))
+SHARD_VNODES = int(os.getenv("SHARD_VNODES", "64"))
+SHARD_HEARTBEAT_TTL_SEC = float(os.getenv("SHARD_HEARTBEAT_TTL_SEC", "120"))
+SHARD_JOIN_GRACE_SEC = float(os.getenv("SHARD_JOIN_GRACE_SEC", "2"))   # 动态成员：首轮前等同伴登记心跳
+SHARD_FOLLOW_SEC = float(os.getenv("SHARD_FOLLOW_SEC", "10"))          # API 进程读回分片落盘结果的间隔
 OKX_BASE = os.getenv("OKX_BASE", "https://www.okx.com")
 PORT = int(os.getenv("PORT", "8000"))
+
+# —— 数据目录维护：压缩整理 / 保留 / 磁盘预算 ——
+COMPRESSION = os.getenv("COMPRESSION", "zstd")                 # zstd | gzip（未装 zstandard 时自动回退 gzip）
+COMPACT_INTERVAL_SEC = int(os.getenv("COMPACT_INTERVAL_SEC", "600"))
+COMPACT_HOT_ROWS = int(os.getenv("COMPACT_HOT_ROWS", "500"))        # 活跃 CSV 保留的最近根数
+COMPACT_SEGMENT_ROWS = int(os.getenv("COMPACT_SEGMENT_ROWS", "2000"))  # 每个压缩段的根数
+RETAIN_BARS = parse_bars(os.getenv("RETAIN_BARS", "1D:3000,4H:6000,1H:10000,15m:20000,5m:20000"))
+DATA_MAX_MB = float(os.getenv("DATA_MAX_MB", "256"))
+
+# —— 内存 K 线缓存 / 冷启动预热 ——
+CANDLE_TTL_SEC = float(os.getenv("CANDLE_TTL_SEC", "3"))      # 缓存新鲜期内直接返回，不访问 OKX
+CACHE_MAX_KEYS = int(os.getenv("CACHE_MAX_KEYS", "500"))      # 最多缓存的 (inst, bar) 数
+CACHE_MAX_ROWS = int(os.getenv("CACHE_MAX_ROWS", "300"))      # 每个 (inst, bar) 最多缓存的根数
+WARM_START_BARS = int(os.getenv("WARM_START_BARS", "300"))    # 启动时从磁盘预热的最近根数
+EVAL_MEMO_SIZE = int(os.getenv("EVAL_MEMO_SIZE", "1000"))     # 评估结果记忆化条数（ETag/304）
+
+# —— OKX 上游容错：熔断 / 对冲请求 / 过期数据兜底 ——
+OKX_DEADLINE_SEC = float(os.getenv("OKX_DEADLINE_SEC", "4"))          # 单次调用总时限（含对冲）
+BREAKER_WINDOW = int(os.getenv("BREAKER_WINDOW", "20"))               # 统计最近 N 次调用
+BREAKER_MIN_CALLS = int(os.getenv("BREAKER_MIN_CALLS", "5"))
+BREAKER_ERROR_RATE = float(os.getenv("BREAKER_ERROR_RATE", "0.5"))    # 错误率达到即熔断
+BREAKER_SLOW_SEC = float(os.getenv("BREAKER_SLOW_SEC", "3"))          # 超过视为慢调用
+BREAKER_SLOW_RATE = float(os.getenv("BREAKER_SLOW_RATE", "0.8"))      # 慢调用占比达到即熔断
+BREAKER_COOLDOWN_SEC = float(os.getenv("BREAKER_COOLDOWN_SEC", "15")) # 熔断后多久放一个探测请求
+HEDGE_ENABLED = os.getenv("HEDGE_ENABLED", "1") == "1"
+HEDGE_MIN_DELAY_SEC = float(os.getenv("HEDGE_MIN_DELAY_SEC", "0.15")) # 对冲延迟下限（默认取 p95）
+STALE_MAX_ENTRIES = int(os.getenv("STALE_MAX_ENTRIES", "2000"))
+
+# —— 价格告警 ——
+WATCH_INTERVAL_SEC = float(os.getenv("WATCH_INTERVAL_SEC", "5"))      # 行情轮询间隔（仅在有告警时请求）
+WEBHOOK_TIMEOUT_SEC = float(os.getenv("WEBHOOK_TIMEOUT_SEC", "5"))
+
+# —— 内存 K 线历史（NumPy 环形缓冲）——
+HISTORY_CAPACITY = int(os.getenv("HISTORY_CAPACITY", "300"))        # 每个 (inst, bar) 保留的根数
+HISTORY_MAX_SERIES = int(os.getenv("HISTORY_MAX_SERIES", "1000"))   # 最多保留的 (inst, bar) 数（LRU）
+SAVED_FILES_MAX = int(os.getenv("SAVED_FILES_MAX", "1000"))         # 扫描器记录的已落盘文件数上限
+
+# —— 跨品种分析（相对强弱 / 相关性 / 市场宽度）——
+ANALYTICS_WINDOWS = [int(x) for x in parse_symbols(os.getenv("ANALYTICS_WINDOWS", "1,4,24,96"))]  # 收益窗口（根数）
+ANALYTICS_BENCHMARKS = parse_symbols(os.getenv("ANALYTICS_BENCHMARKS", "BTC-USDT,ETH-USDT"))
+ANALYTICS_CORR_WINDOW = int(os.getenv("ANALYTICS_CORR_WINDOW", "96"))                           # 相关性用最近 N 根收益
+
+# —— 历史形态检索 ——
+PATTERN_CACHE_SEGMENTS = int(os.getenv("PATTERN_CACHE_SEGMENTS", "256"))  # 缓存形态掩码的压缩段数（LRU）
+
+# —— 参数寻优（多进程回测）——
+SWEEP_WORKERS = int(os.getenv("SWEEP_WORKERS", str(os.cpu_count() or 1)))
+SWEEP_MAX_CONFIGS = int(os.getenv("SWEEP_MAX_CONFIGS", "5000"))
+
+# —— 盘口深度（增量维护 + 快照落盘）——
+BOOKS_INSTS = parse_symbols(os.getenv("BOOKS_INSTS", ""))               # 启动即维护的交易对；空则按需
+BOOKS_SOURCE = os.getenv("BOOKS_SOURCE", "ws")                          # ws（WebSocket 增量）/ rest（轮询快照）
+BOOKS_WS_URL = os.getenv("BOOKS_WS_URL", "wss://ws.okx.com:8443/ws/v5/public")
+BOOKS_CHANNEL = os.getenv("BOOKS_CHANNEL", "books")                     # books：400 档增量，带 checksum
+BOOKS_DEPTH = int(os.getenv("BOOKS_DEPTH", "400"))                      # REST 快照档数
+BOOKS_POLL_SEC = float(os.getenv("BOOKS_POLL_SEC", "2"))                # REST 轮询间隔 / 按需快照的新鲜期
+BOOKS_SNAPSHOT_SEC = float(os.getenv("BOOKS_SNAPSHOT_SEC", "60"))       # 落盘快照间隔
+BOOKS_SNAPSHOT_LEVELS = int(os.getenv("BOOKS_SNAPSHOT_LEVELS", "50"))   # 每侧落盘档数
+BOOKS_SNAPSHOT_BATCH = int(os.getenv("BOOKS_SNAPSHOT_BATCH", "60"))     # 攒够多少个快照写一个压缩文件
+BOOKS_KEEP_FILES = int(os.getenv("BOOKS_KEEP_FILES", "500"))            # 每个交易对保留的快照文件数
@@ -0,0 +1,223 @@
+from __future__ import annotations
+from typing import Any, Dict, List, Optional, Tuple
+
+# ---------------- Indicators (shared by all strategies) ----------------
+
+def _f(x):
+    try:
+        return float(x)
+    except Exception:
+        return 0.0
+
+def ema(arr: List[float], period: int) -> List[float]:
+    if len(arr) == 0:
+        return []
+    k = 2/(period+1)
+    out = [arr[0]]
+    for i in range(1, len(arr)):
+        out.append(arr[i]*k + out[-1]*(1-k))
+    return out
+
+def atr(high: List[float], low: List[float], close: List[float], period: int = 14) -> List[float]:
+    trs = []
+    for i in range(len(close)):
+        if i == 0:
+            trs.append(high[i] - low[i])
+        else:
+            trs.append(max(high[i]-low[i], abs(high[i]-close[i-1]), abs(low[i]-close[i-1])))
+    out = []
+    s = 0.0
+    for i, t in enumerate(trs):
+        s += t
+        if i < period:
+            out.append(s/(i+1))
+        else:
+            s = out[-1]*(period-1)/period + t/period
+            out.append(s)
+    return out
+
+# pivots (swing points)
+def pivots(h: List[float], l: List[float], left: int = 2, right: int = 2) -> Tuple[List[bool], List[bool]]:
+    n = len(h)
+    ph = [False]*n
+    pl = [False]*n
+    for i in range(left, n-right):
+        ph[i] = all(h[i] > h[i-k-1] for k in range(left)) and all(h[i] >= h[i+k+1] for k in range(right))
+        pl[i] = all(l[i] < l[i-k-1] for k in range(left)) and all(l[i] <= l[i+k+1] for k in range(right))
+    return ph, pl
+
+def last_swing_levels(h: List[float], l: List[float], left: int = 2, right: int = 2) -> Tuple[Optional[float], Optional[float]]:
+    ph, pl = pivots(h, l, left, right)
+    last_h = last_l = None
+    for i in range(len(h)-1, -1, -1):
+        if last_h is None and ph[i]:
+            last_h = h[i]
+        if last_l is None and pl[i]:
+            last_l = l[i]
+        if last_h is not None and last_l is not None:
+            break
+    return last_h, last_l
+
+# ---------------- 12 金K（常用子集） ----------------
+
+def is_bull_engulf(o1,c1,o2,c2): return (c1<o1) and (c2>o2) and (o2<=c1) and (c2>=o1)
+def is_bear_engulf(o1,c1,o2,c2): return (c1>o1) and (c2<o2) and (o2>=c1) and (c2<=o1)
+def is_inside_bar(h1,l1,h2,l2):  return (h2<=h1) and (l2>=l1)
+def is_outside_bar(h1,l1,h2,l2): return (h2>=h1) and (l2<=l1)
+
+def is_bull_pin(o,h,l,c):
+    body=abs(c-o); lower=(o if c>=o else c)-l; rng=max(h-l,1e-8)
+    return (lower>2*body) and (c>o) and (c>l+0.6*rng)
+
+def is_bear_pin(o,h,l,c):
+    body=abs(c-o); upper=h-(c if c>=o else o); rng=max(h-l,1e-8)
+    return (upper>2*body) and (c<o) and (c<h-0.6*rng)
+
+def is_piercing(o1,c1,o2,c2,h2,l2):
+    return (c1<o1) and (c2>o2) and (o2<l2+0.2*(h2-l2)) and (c2>(o1+c1)/2)
+
+def is_dark_cloud(o1,c1,o2,c2,h2,l2):
+    return (c1>o1) and (c2<o2) and (o2>l2+0.8*(h2-l2)) and (c2<(o1+c1)/2)
+
+def three_white_soldiers(c,o):
+    return len(c)>=3 and (c[-3]>o[-3] and c[-2]>o[-2] and c[-1]>o[-1]) and (c[-1]>c[-2]>c[-3])
+
+def three_black_crows(c,o):
+    return len(c)>=3 and (c[-3]<o[-3] and c[-2]<o[-2] and c[-1]<o[-1]) and (c[-1]<c[-2]<c[-3])
+
+# ---------------- Feature set: parse once, compute each indicator once ----------------
+
+class Features:
+    """
+    One parsed candle series (ascending) plus a memo of derived indicators.
+    Strategies ask for ema(p)/atr(p)/swing_levels()/candle_flags(); each is computed
+    at most once per series, so several strategies on the same symbol share the work.
+    """
+    def __init__(self, ts: List[int], o: List[float], h: List[float], l: List[float], c: List[float]):
+        self.ts, self.o, self.h, self.l, self.c = ts, o, h, l, c
+        self._memo: Dict[Tuple, Any] = {}
+
+    @classmethod
+    def from_raw(cls, raw: Dict) -> "Features":
+        rows = list(reversed(raw.get("data", []) or []))
+        return cls([int(_f(r[0])) for r in rows], [_f(r[1]) for r in rows], [_f(r[2]) for r in rows],
+                   [_f(r[3]) for r in rows], [_f(r[4]) for r in rows])
+
+    @classmethod
+    def from_view(cls, view) -> "Features":
+        """Build from a history ring view (columns ts, o, h, l, c, vol): one C-level copy per column, no string parsing."""
+        ts, o, h, l, c = view[:, :5].T.tolist()
+        return cls([int(t) for t in ts], o, h, l, c)
+
+    @property
+    def n(self) -> int:
+        return len(self.c)
+
+    @property
+    def computed(self) -> List[str]:
+        return [":".join(str(p) for p in k) for k in self._memo]
+
+    def _get(self, key: Tuple, fn):
+        if key not in self._memo:
+            self._memo[key] = fn()
+        return self._memo[key]
+
+    def ema(self, period: int) -> List[float]:
+        return self._get(("ema", period), lambda: ema(self.c, period))
+
+    def atr(self, period: int = 14) -> List[float]:
+        return self._get(("atr", period), lambda: atr(self.h, self.l, self.c, period))
+
+    def pivots(self, left: int = 2, right: int = 2) -> Tuple[List[bool], List[bool]]:
+        return self._get(("pivots", left, right), lambda: pivots(self.h, self.l, left, right))
+
+    def swing_levels(self, left: int = 2, right: int = 2) -> Tuple[Optional[float], Optional[float]]:
+        def _calc():
+            ph, pl = self.pivots(left, right)
+            last_h = last_l = None
+            for i in range(self.n-1, -1, -1):
+                if last_h is None and ph[i]:
+                    last_h = self.h[i]
+                if last_l is None and pl[i]:
+                    last_l = self.l[i]
+                if last_h is not None and last_l is not None:
+                    break
+            return last_h, last_l
+        return self._get(("swings", left, right), _calc)
+
+    def candle_flags(self) -> Dict[str, bool]:
+        """Gold12 pattern flags on the latest bar(s)."""
+        def _calc():
+            o, h, l, c = self.o, self.h, self.l, self.c
+            flags = dict.fromkeys(["bull_engulf", "bear_engulf", "inside_bar", "outside_bar", "piercing",
+                                   "dark_cloud", "bull_pin", "bear_pin", "three_white_soldiers",
+                                   "three_black_crows"], False)
+            if self.n >= 2:
+                o1, c1, h1, l1 = o[-2], c[-2], h[-2], l[-2]
+                o2, c2, h2, l2 = o[-1], c[-1], h[-1], l[-1]
+                flags["bull_engulf"] = is_bull_engulf(o1, c1, o2, c2)
+                flags["bear_engulf"] = is_bear_engulf(o1, c1, o2, c2)
+                flags["inside_bar"] = is_inside_bar(h1, l1, h2, l2)
+                flags["outside_bar"] = is_outside_bar(h1, l1, h2, l2)
+                flags["piercing"] = is_piercing(o1, c1, o2, c2, h2, l2)
+                flags["dark_cloud"] = is_dark_cloud(o1, c1, o2, c2, h2, l2)
+                flags["bull_pin"] = is_bull_pin(o2, h2, l2, c2)
+                flags["bear_pin"] = is_bear_pin(o2, h2, l2, c2)
+            flags["three_white_soldiers"] = three_white_soldiers(c, o)
+            flags["three_black_crows"] = three_black_crows(c, o)
+            return flags
+        return self._get(("candles",), _calc)
+
+    def warm(self, specs: List[str]):
+        """Precompute declared features, e.g. ["ema:20", "atr:14", "swings", "candles"]."""
+        for spec in specs:
+            kind, *args = spec.split(":")
+            if kind == "ema":
+                self.ema(int(args[0]))
+            elif kind == "atr":
+                self.atr(int(args[0]) if args else 14)
+            elif kind == "swings":
+                self.swing_levels(*(int(a) for a in args))
+            elif kind == "candles":
+                self.candle_flags()
+            else:
+                raise ValueError(f"unknown feature: {spec}")
+
+
+def as_features(x) -> Features:
+    """Accept either an OKX candles payload or an already parsed Features."""
+    return x if isinstance(x, Features) else Features.from_raw(x)
+
+
+def _from_history(inst_id: str, bar: str, raw: Dict) -> Optional[Features]:
+    """Use the in-memory ring when it holds the same window as raw (same length and end timestamps)."""
+    from .history import history
+
+    data = raw.get("data") or []
+    ring = history.get(inst_id, bar)
+    if ring is None or not data or ring.size < len(data):
+        return None
+    try:
+        first, last = int(data[-1][0]), int(data[0][0])
+    except (TypeError, ValueError, IndexError):
+        return None
+    feats = Features.from_view(ring.view(len(data)))
+    # the ring is written on the event loop; re-check end points after the copy
+    if feats.ts[0] != first or feats.ts[-1] != last:
+        return None
+    return feats
+
+
+class FeatureCache:
+    """Per-request cache: one Features per (inst_id, bar), shared by every strategy in the request."""
+    def __init__(self):
+        self._data: Dict[Tuple[str, str], Features] = {}
+
+    def get(self, inst_id: str, bar: str, raw: Dict) -> Features:
+        key = (inst_id, bar)
+        if key not in self._data:
+            self._data[key] = _from_history(inst_id, bar, raw) or Features.from_raw(raw)
+        return self._data[key]
+
+    def computed(self) -> Dict[str, List[str]]:
+        return {f"{inst}:{bar}": f.computed for (inst, bar), f in self._data.items()}
@@ -0,0 +1,270 @@
+import asyncio
+import bisect
+import math
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from .config import bar_ms
+from .okx import OkxClient
+from . import storage
+
+PAGE_LIMIT = 100    # /market/history-candles 单次最多 100 根
+
+
+def _runs(ts: List[int], step: int) -> List[List[int]]:
+    """升序 ts -> 连续区间 [[start, end], ...]（端点都是已有 K 线的 ts）。"""
+    out: List[List[int]] = []
+    for t in ts:
+        if out and t - out[-1][1] <= step:
+            out[-1][1] = max(out[-1][1], t)
+        else:
+            out.append([t, t])
+    return out
+
+
+def _subtract(gaps: List[Tuple[int, int]], holes: List[Tuple[int, int]], step: int) -> List[Tuple[int, int]]:
+    """区间减区间（都按时间升序）：如从缺口里去掉已确认上游没有数据的部分。"""
+    out = []
+    for a, b in gaps:
+        for ha, hb in holes:
+            if hb < a or ha > b:
+                continue
+            if ha > a:
+                out.append((a, ha - step))
+            a = hb + step
+            if a > b:
+                break
+        if a <= b:
+            out.append((a, b))
+    return out
+
+
+def _pages(a: int, b: int, step: int) -> int:
+    return math.ceil(((b - a) // step + 1) / PAGE_LIMIT)
+
+
+def coalesce(gaps: List[Tuple[int, int]], step: int) -> List[Tuple[int, int]]:
+    """
+    把相邻缺口合并成拉取区间：只要合并后分页数不多于分别拉取（中间夹着的已有 K 线不会多花请求），就合并。
+    返回的区间按时间升序；拉回来的数据只写入真正缺失的 ts。
+    """
+    spans: List[Tuple[int, int]] = []
+    for a, b in gaps:
+        if spans:
+            pa, pb = spans[-1]
+            if _pages(pa, b, step) <= _pages(pa, pb, step) + _pages(a, b, step):
+                spans[-1] = (pa, b)
+                continue
+        spans.append((a, b))
+    return spans
+
+
+class SeriesIndex:
+    """一个 (inst, bar) 的已有区间（按 bar 间隔合并），以及确认上游无数据的区间。"""
+    def __init__(self, inst_id: str, bar: str, step: int, ts: List[int], signature):
+        self.inst_id = inst_id
+        self.bar = bar
+        self.step = step
+        self.ranges = _runs(ts, step)
+        self.signature = signature
+        self.empty: List[Tuple[int, int]] = []
+
+    def add(self, ts: List[int]):
+        for a, b in _runs(sorted(set(ts)), self.step):
+            i = bisect.bisect_left(self.ranges, [a, a])
+            # 与前一个区间相接或重叠时从它开始合并
+            if i > 0 and self.ranges[i - 1][1] + self.step >= a:
+                i -= 1
+            j = i
+            while j < len(self.ranges) and self.ranges[j][0] <= b + self.step:
+                a, b = min(a, self.ranges[j][0]), max(b, self.ranges[j][1])
+                j += 1
+            self.ranges[i:j] = [[a, b]]
+
+    def present(self) -> int:
+        return sum((b - a) // self.step + 1 for a, b in self.ranges)
+
+    def missing(self, now_ms: Optional[int] = None) -> List[Tuple[int, int]]:
+        """内部空洞 + 尾部缺口（最新已收盘的一根之后不算），已扣除确认无数据的区间。"""
+        if not self.ranges:
+            return []
+        gaps = [(e1 + self.step, s2 - self.step) for (_, e1), (s2, _) in zip(self.ranges, self.ranges[1:])]
+        now_ms = int(time.time() * 1000) if now_ms is None else now_ms
+        phase = self.ranges[0][0] % self.step
+        last_closed = (now_ms - phase) // self.step * self.step + phase - self.step
+        if last_closed > self.ranges[-1][1]:
+            gaps.append((self.ranges[-1][1] + self.step, last_closed))
+        return _subtract([g for g in gaps if g[0] <= g[1]], self.empty, self.step)
+
+    def report(self, max_gaps: int = 20, now_ms: Optional[int] = None) -> Dict[str, Any]:
+        gaps = self.missing(now_ms)
+        present = self.present()
+        missing = sum((b - a) // self.step + 1 for a, b in gaps)
+        tail = gaps[-1] if gaps and gaps[-1][1] >= (self.ranges[-1][1] if self.ranges else 0) else None
+        return {
+            "inst_id": self.inst_id,
+            "bar": self.bar,
+            "first_ts": self.ranges[0][0] if self.ranges else None,
+            "last_ts": self.ranges[-1][1] if self.ranges else None,
+            "bars_present": present,
+            "bars_missing": missing,
+            "coverage": round(present / (present + missing), 6) if present + missing else None,
+            "ranges": len(self.ranges),
+            "gaps": len(gaps),
+            "largest_gap_bars": max(((b - a) // self.step + 1 for a, b in gaps), default=0),
+            "tail_gap_bars": (tail[1] - tail[0]) // self.step + 1 if tail else 0,
+            "confirmed_empty": [list(h) for h in self.empty],
+            "missing_ranges": [[a, b] for a, b in gaps[-max_gaps:]],
+            "fetch_plan": [[a, b] for a, b in coalesce(gaps, self.step)][-max_gaps:],
+        }
+
+
+class GapIndex:
+    """
+    每个 (inst, bar) 的已有 / 缺失区间：
+    - 首次用到时从磁盘读全部 ts 建索引；之后每次 save_candles_csv 通过 storage.on_change 增量更新
+    - 活跃 CSV 的 (size, mtime) 与索引记录的不一致（别的进程写过），或整理 / 删段之后，下次用到时重建
+    - repair() 按合并后的区间分页调用 /market/history-candles，只写入缺失的 K 线
+    """
+    def __init__(self):
+        self._series: Dict[Tuple[str, str], SeriesIndex] = {}
+        self._empty: Dict[Tuple[str, str], List[Tuple[int, int]]] = {}   # 重建索引时保留
+        self._lock = threading.Lock()
+        self.rebuilds = 0
+        self.incremental = 0
+        self.requests = 0
+        self.rows_filled = 0
+        self.last_repair: Dict[str, Any] = {}
+        storage.on_change(self._on_change)
+
+    # ---- 维护 ----
+    def _on_change(self, inst: str, bar: str, ts: Optional[List[int]], before, after):
+        key = (inst, bar)
+        with self._lock:
+            idx = self._series.get(key)
+            if idx is None:
+                return
+            if ts is None or idx.signature != before:
+                self._series.pop(key, None)
+                return
+            idx.add(ts)
+            idx.signature = after
+            self.incremental += 1
+
+    def get(self, inst_id: str, bar: str) -> Optional[SeriesIndex]:
+        """阻塞（可能读盘），在线程里调用。"""
+        step = bar_ms(bar)
+        if not step:
+            return None
+        key = (inst_id.replace("/", "-"), bar)
+        with self._lock:
+            idx = self._series.get(key)
+            if idx is not None and idx.signature == storage.series_signature(*key):
+                return idx
+        sig, ts = storage.read_timestamps(*key)
+        idx = SeriesIndex(key[0], bar, step, ts, sig)
+        with self._lock:
+            idx.empty = self._empty.setdefault(key, [])
+            self._series[key] = idx
+            self.rebuilds += 1
+        return idx
+
+    def coverage(self, inst_id: Optional[str] = None, bar: Optional[str] = None,
+                 max_gaps: int = 20) -> List[Dict[str, Any]]:
+        out = []
+        for inst, b in sorted(storage.list_series()):
+            if (inst_id and inst != inst_id.replace("/", "-")) or (bar and b != bar):
+                continue
+            idx = self.get(inst, b)
+            out.append(idx.report(max_gaps) if idx is not None
+                       else {"inst_id": inst, "bar": b, "error": "unsupported bar (no fixed spacing)"})
+        return out
+
+    # ---- 修复 ----
+    async def repair(self, inst_id: str, bar: str, max_requests: int = 50,
+                     client: Optional[OkxClient] = None) -> Dict[str, Any]:
+        idx = await asyncio.to_thread(self.get, inst_id, bar)
+        if idx is None:
+            return {"inst_id": inst_id, "bar": bar, "error": "unsupported bar (no fixed spacing)"}
+        step = idx.step
+        gaps = idx.missing()
+        plan = coalesce(gaps, step)
+        own = client is None
+        client = client or OkxClient()
+        stats = {"inst_id": idx.inst_id, "bar": bar, "gaps": len(gaps),
+                 "bars_missing": sum((b - a) // step + 1 for a, b in gaps),
+                 "spans": len(plan), "requests": 0, "rows_filled": 0, "errors": [], "confirmed_empty": 0}
+        try:
+            for a, b in reversed(plan):   # 先补最近的
+                # 该拉取区间内真正缺失的子区间（合并时夹在中间的已有 K 线不重复写）
+                holes = [(max(ga, a), min(gb, b)) for ga, gb in gaps if ga <= b and gb >= a]
+                starts = [h[0] for h in holes]
+                got: set = set()
+                after, complete = b + step, False
+                while stats["requests"] < max_requests:
+                    res = await client.history_candles(inst_id, bar, after=after, before=a - step, limit=PAGE_LIMIT)
+                    stats["requests"] += 1
+                    if str(res.get("code")) != "0" or res.get("stale"):
+                        stats["errors"].append({"span": [a, b], "code": res.get("stale_code") or res.get("code"),
+                                                "error": res.get("error") or res.get("msg")})
+                        break
+                    data = res.get("data") or []
+                    rows = []
+                    for r in data:
+                        t = int(r[0])
+                        i = bisect.bisect_right(starts, t) - 1
+                        if i >= 0 and t <= holes[i][1] and t not in got:
+                            rows.append(r)
+                            got.add(t)
+                    if rows:
+                        await asyncio.to_thread(storage.save_candles_csv, inst_id, bar, {"data": rows})
+                    oldest = min((int(r[0]) for r in data), default=None)
+                    if oldest is None or oldest <= a or len(data) < PAGE_LIMIT:
+                        complete = True
+                        break
+                    after = oldest
+                stats["rows_filled"] += len(got)
+                if complete:
+                    # 整段拉完仍缺的：上游就没有（停盘 / 上市前），以后不再重复拉；最近两根可能还没进历史接口，不算
+                    recent = int(time.time() * 1000) - 2 * step
+                    for ra, rb in _subtract(holes, [(t, t) for t in sorted(got)], step):
+                        rb = min(rb, recent)
+                        if ra <= rb:
+                            idx.empty.append((ra, rb))
+                            stats["confirmed_empty"] += (rb - ra) // step + 1
+                    idx.empty.sort()
+                if stats["requests"] >= max_requests:
+                    break
+        finally:
+            if own:
+                await client.close()
+        self.requests += stats["requests"]
+        self.rows_filled += stats["rows_filled"]
+        self.last_repair = {**stats, "at": time.time()}
+        return stats
+
+    async def repair_all(self, bar: Optional[str] = None, max_requests: int = 200) -> Dict[str, Any]:
+        keys = [k for k in sorted(await asyncio.to_thread(storage.list_series)) if bar is None or k[1] == bar]
+        results = []
+        budget = max_requests
+        client = OkxClient()
+        try:
+            for inst, b in keys:
+                if budget <= 0:
+                    break
+                st = await self.repair(inst, b, budget, client)
+                budget -= st.get("requests", 0)
+                if st.get("gaps") or st.get("error"):
+                    results.append(st)
+        finally:
+            await client.close()
+        return {"series": len(keys), "requests": max_requests - budget,
+                "rows_filled": sum(r.get("rows_filled", 0) for r in results), "repaired": results}
+
+    def status(self) -> Dict[str, Any]:
+        return {"indexed": len(self._series), "rebuilds": self.rebuilds, "incremental_updates": self.incremental,
+                "repair_requests": self.requests, "rows_filled": self.rows_filled, "last_repair": self.last_repair}
+
+
+gap_index = GapIndex()
@@ -0,0 +1,161 @@
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+from .config import HISTORY_CAPACITY, HISTORY_MAX_SERIES
+
+COLS = ("ts", "open", "high", "low", "close", "vol")
+
+
+def _np():
+    # numpy 延迟导入：不拖慢进程启动（端口先开，第一次写入时才加载）
+    import numpy
+    return numpy
+
+
+class CandleRing:
+    """
+    单个 (inst, bar) 的定长 K 线环形缓冲（float64，列见 COLS，按 ts 升序）：
+    - 预分配 2*capacity 行，每行同时写在 p 和 p+capacity（双写），
+      因此任意“最近 n 根”都是一段连续内存，view() 直接返回切片，零拷贝
+    - 新 ts 追加（满了覆盖最旧）；已有 ts 原地更新（未收盘 K 线）；比窗口更旧的丢弃
+    - 内存恒为 2 * capacity * 6 * 8 字节，与运行时长无关
+    """
+    def __init__(self, capacity: int = HISTORY_CAPACITY):
+        np = _np()
+        self.capacity = capacity
+        self._buf = np.zeros((2 * capacity, len(COLS)), dtype=np.float64)
+        self._start = 0
+        self.size = 0
+        self.version = 0     # 每次有写入 +1，供下游判断是否需要重算
+
+    @property
+    def nbytes(self) -> int:
+        return self._buf.nbytes
+
+    @property
+    def last_ts(self) -> Optional[int]:
+        return int(self._buf[self._start + self.size - 1, 0]) if self.size else None
+
+    def _write(self, pos: int, row):
+        self._buf[pos] = row
+        self._buf[pos + self.capacity] = row
+
+    def append(self, rows) -> int:
+        """rows: (k, 6) 数组，按 ts 升序。返回新增根数。"""
+        np = _np()
+        added = 0
+        for row in rows:
+            ts = row[0]
+            if self.size and ts <= self._buf[self._start + self.size - 1, 0]:
+                view = self.view()
+                i = int(np.searchsorted(view[:, 0], ts))
+                if i < self.size and view[i, 0] == ts:
+                    self._write((self._start + i) % self.capacity, row)
+                    self.version += 1
+                continue
+            if self.size < self.capacity:
+                self._write((self._start + self.size) % self.capacity, row)
+                self.size += 1
+            else:
+                self._write(self._start, row)
+                self._start = (self._start + 1) % self.capacity
+            added += 1
+            self.version += 1
+        return added
+
+    def view(self, n: Optional[int] = None):
+        """最近 n 根（默认全部）的只读视图，形状 (n, 6)，零拷贝。"""
+        n = self.size if n is None else min(n, self.size)
+        v = self._buf[self._start + self.size - n: self._start + self.size]
+        v.flags.writeable = False
+        return v
+
+
+def okx_rows_to_array(data: List[List[Any]]):
+    """
+    OKX data（按 ts 倒序的字符串行）-> (k, 6) float64，按 ts 升序。
+    格式不对的行（缺列、非数字、空值）逐行丢弃，不连累同批的其他行。
+    """
+    np = _np()
+    width = len(COLS)
+    try:
+        arr = np.array([r[:width] for r in reversed(data)], dtype=np.float64).reshape(-1, width)
+    except (ValueError, TypeError):
+        good = []
+        for r in reversed(data):
+            try:
+                row = [float(x) for x in r[:width]]
+            except (ValueError, TypeError):
+                continue
+            if len(row) == width:
+                good.append(row)
+        arr = np.array(good, dtype=np.float64).reshape(-1, width)
+    # None / "nan" 会被解析成 NaN，同样视为坏行
+    return arr[np.isfinite(arr).all(axis=1)]
+
+
+class HistoryStore:
+    """
+    内存 K 线历史：每个 (inst, bar) 一个 CandleRing。
+    series 数上限 max_series（按最近写入 LRU 淘汰），因此总内存有硬上限：
+    max_series * 2 * capacity * 6 * 8 字节。
+    """
+    def __init__(self, capacity: int = HISTORY_CAPACITY, max_series: int = HISTORY_MAX_SERIES):
+        self.capacity = capacity
+        self.max_series = max_series
+        self._rings: "OrderedDict[Tuple[str, str], CandleRing]" = OrderedDict()
+        self.evicted = 0
+        self.rows_rejected = 0
+
+    def get(self, inst_id: str, bar: str) -> Optional[CandleRing]:
+        return self._rings.get((inst_id, bar))
+
+    def keys(self) -> List[Tuple[str, str]]:
+        return list(self._rings.keys())
+
+    def series(self, bar: str) -> Dict[str, CandleRing]:
+        """某周期下所有非空的 {inst: ring}。"""
+        # 先整体拷出条目：跨品种分析在线程里调用，事件循环可能同时新增序列
+        return {inst: ring for (inst, b), ring in list(self._rings.items()) if b == bar and ring.size}
+
+    def ingest(self, inst_id: str, bar: str, data: List[List[Any]]) -> int:
+        if not data:
+            return 0
+        # 先解析：坏行计数后丢弃；整批都无效时不建环、不改变 LRU 次序
+        rows = okx_rows_to_array(data)
+        self.rows_rejected += len(data) - len(rows)
+        if not len(rows):
+            return 0
+        key = (inst_id, bar)
+        ring = self._rings.get(key)
+        if ring is None:
+            ring = self._rings[key] = CandleRing(self.capacity)
+        self._rings.move_to_end(key)
+        while len(self._rings) > self.max_series:
+            self._rings.popitem(last=False)
+            self.evicted += 1
+        return ring.append(rows)
+
+    def view(self, inst_id: str, bar: str, n: Optional[int] = None):
+        ring = self.get(inst_id, bar)
+        return ring.view(n) if ring is not None else None
+
+    def status(self) -> Dict[str, Any]:
+        per_symbol: Dict[str, int] = {}
+        for (inst, _bar), ring in self._rings.items():
+            per_symbol[inst] = per_symbol.get(inst, 0) + ring.nbytes
+        ring_bytes = 2 * self.capacity * len(COLS) * 8
+        return {
+            "series": len(self._rings),
+            "capacity": self.capacity,
+            "max_series": self.max_series,
+            "bytes_per_series": ring_bytes,
+            "bytes_total": sum(per_symbol.values()),
+            "bytes_limit": ring_bytes * self.max_series,
+            "evicted": self.evicted,
+            "rows_rejected": self.rows_rejected,
+            "bytes_per_symbol": per_symbol,
+        }
+
+
+history = HistoryStore()
@@ -0,0 +1,79 @@
+import asyncio
+import time
+from typing import Dict
+
+
+class AimdLimiter:
+    """
+    AIMD 自适应并发上限（类似 TCP 拥塞控制）：
+    - 成功且延迟低于 target_latency：limit += 1/limit（约每“一轮”并发 +1）
+    - 出错 / 被限流：limit *= backoff；延迟超标：limit *= latency_backoff
+    - 一次降速后，一个平均延迟（RTT）内不再重复降速，避免同一波失败把并发砍到底
+    """
+    def __init__(self, initial: float = 4, min_limit: int = 1, max_limit: int = 32,
+                 target_latency: float = 1.0, backoff: float = 0.5, latency_backoff: float = 0.8):
+        self.limit = float(initial)
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.target_latency = target_latency
+        self.backoff = backoff
+        self.latency_backoff = latency_backoff
+        self.latency_ewma: float = 0.0
+        self.inflight = 0
+        self._cond = asyncio.Condition()
+        self._last_decrease = 0.0
+        self.increases = 0
+        self.decreases = 0
+        self.rate_limited = 0
+        self.errors = 0
+
+    async def acquire(self):
+        async with self._cond:
+            await self._cond.wait_for(lambda: self.inflight < int(self.limit))
+            self.inflight += 1
+
+    async def release(self, ok: bool, latency: float, rate_limited: bool = False):
+        self.inflight -= 1
+        self.latency_ewma = latency if not self.latency_ewma else 0.8 * self.latency_ewma + 0.2 * latency
+        if rate_limited:
+            self.rate_limited += 1
+            self._decrease(self.backoff)
+        elif not ok:
+            self.errors += 1
+            self._decrease(self.backoff)
+        elif latency > self.target_latency:
+            self._decrease(self.latency_backoff)
+        else:
+            self.limit = min(self.max_limit, self.limit + 1.0 / self.limit)
+            self.increases += 1
+        async with self._cond:
+            self._cond.notify_all()
+
+    async def abandon(self):
+        """请求被取消（停止扫描 / 超时）：只归还名额，不算成功也不算失败，不调整上限。"""
+        self.inflight -= 1
+        async with self._cond:
+            self._cond.notify_all()
+
+    def _decrease(self, factor: float):
+        now = time.monotonic()
+        if now - self._last_decrease < self.latency_ewma:
+            return
+        self._last_decrease = now
+        self.limit = max(float(self.min_limit), self.limit * factor)
+        self.decreases += 1
+
+    def status(self) -> Dict:
+        return {
+            "limit": round(self.limit, 2),
+            "effective": int(self.limit),
+            "inflight": self.inflight,
+            "min": self.min_limit,
+            "max": self.max_limit,
+            "target_latency_sec": self.target_latency,
+            "latency_ewma_ms": round(self.latency_ewma * 1000, 1),
+            "increases": self.increases,
+            "decreases": self.decreases,
+            "rate_limited": self.rate_limited,
+            "errors": self.errors,
+        }
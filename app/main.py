@@ -1,29 +1,76 @@
 # app/main.py
+import time
+_BOOT_T0 = time.perf_counter()
+
+import asyncio
 from fastapi import FastAPI, HTTPException, Query, Request
-from fastapi.responses import JSONResponse, FileResponse
+from fastapi.responses import JSONResponse, FileResponse, Response, StreamingResponse, PlainTextResponse
+from contextlib import asynccontextmanager
 from typing import Optional
 import os
 
-from .config import API_KEY, DATA_DIR, DEFAULT_BARS
-from .okx import OkxClient
+from .config import API_KEY, ADMIN_KEY, DATA_DIR, DEFAULT_BARS
+from .okx import OkxClient, upstream_status
 from .scan import scanner
+from .shard import aggregate_status, member_from_env, follower
+from .cache import candle_cache, eval_memo
+from .history import history
+from .analytics import analytics
+from .patterns import pattern_search
+from .sweep import sweeper
+from .gaps import gap_index
+from .books import books, read_snapshots
+from .maintenance import maintenance
+from .storage import read_bytes, plain_name, read_candles
 from .dashboard import dashboard_page
+from . import profiling
+from .profiling import stage
+from .schemas import EvaluateBatchRequest, AlertCreate, AlertFromEvaluate, Tick, SweepRequest
+from .alerts import Alert, watch, alerts_from_evaluation
+import json
+from .batch import evaluate_batch_stream
+
+# —— 策略：插件注册表（熊猫系统 / 日内交易系统 …），路由按注册表生成 ——
+from .strategies import REGISTRY, Strategy, get_strategy, run_strategy, compare as compare_strategies
+from .features import FeatureCache
 
-# —— 策略：熊猫系统（保留，便于回退/对比）——
-from .strategy_panda import (
-    evaluate_panda,
-    scan_top as scan_top_panda,
-    fetch_candles as fetch_candles_panda,
-)
+# 启动耗时：listening_ms = 进程启动到端口可用；ready_ms = 到磁盘预热完成
+startup = {"ready": False, "listening_ms": None, "ready_ms": None, "hydrated_series": 0, "error": None}
 
-# —— 策略：新“日内交易系统”（EMA21/55/144 · 定势→找位→信号）——
-from .strategy_custom import (
-    evaluate_custom,
-    scan_top as scan_top_custom,
-    fetch_candles as fetch_candles_custom,
-)
+async def _warm_start():
+    try:
+        paths = await candle_cache.hydrate()
+        scanner.restore_files(paths)
+        startup["hydrated_series"] = candle_cache.status()["keys"]
+    except Exception as e:
+        # 预热失败不影响服务，按冷启动继续
+        startup["error"] = str(e)
+    startup["ready"] = True
+    startup["ready_ms"] = round((time.perf_counter() - _BOOT_T0) * 1000, 1)
 
-app = FastAPI(title="okx-fastapi", version="1.5.0")
+@asynccontextmanager
+async def lifespan(_app: FastAPI):
+    # 预热放后台，不阻塞端口监听；数据目录维护常驻后台；扫描器仍由 /scan/start 手动启动
+    member = member_from_env()
+    if member is not None:
+        # 多实例部署：本实例只扫描归自己的那部分交易对
+        scanner.set_shard(member)
+    warm = asyncio.create_task(_warm_start())
+    maintenance.start()
+    watch.start()
+    books.start()       # 仅当配置了 BOOKS_INSTS
+    follower.start(member.shard_id if member is not None else None)   # 有其他分片在跑时读回它们的落盘结果
+    startup["listening_ms"] = round((time.perf_counter() - _BOOT_T0) * 1000, 1)
+    yield
+    warm.cancel()
+    follower.stop()
+    sweeper.stop()
+    books.stop()
+    watch.stop()
+    maintenance.stop()
+    scanner.stop()
+
+app = FastAPI(title="okx-fastapi", version="1.5.0", lifespan=lifespan)
 
 # =========================
 # 统一异常：全部转为 JSON
@@ -64,6 +111,25 @@ async def check_api_key(request: Request, call_next):
         return JSONResponse({"error": "Unauthorized"}, status_code=401)
     return await call_next(request)
 
+def _is_admin(req: Request) -> bool:
+    return bool(ADMIN_KEY) and req.headers.get("x-admin-key") == ADMIN_KEY
+
+# =========================
+# 分阶段计时（Server-Timing，常开）+ 按需剖析（x-profile: 1，需管理密钥）
+# =========================
+@app.middleware("http")
+async def server_timing(request: Request, call_next):
+    t0 = time.perf_counter()
+    timings = profiling.begin()
+    prof = None
+    if request.headers.get("x-profile") == "1" and _is_admin(request):
+        prof = profiling.SamplingProfiler().start()
+    response = await call_next(request)
+    if prof is not None:
+        response.headers["X-Profile-Id"] = profiling.save_profile(request.url.path, prof.stop())
+    response.headers["Server-Timing"] = profiling.server_timing(timings, (time.perf_counter() - t0) * 1000)
+    return response
+
 # =========================
 # 调试：查看是否带上了密钥（仅回显是否存在与尾四位）
 # =========================
@@ -80,12 +146,55 @@ async def debug_echo(request: Request):
         },
     }
 
+# =========================
+# 调试：采样剖析（需管理密钥）
+# - GET /debug/profile?seconds=5      采样整个事件循环 N 秒，返回 collapsed stacks
+# - GET /debug/profile/{id}           取回某次 x-profile 请求的剖析结果
+# - GET /debug/profiles               最近的请求级剖析列表
+# =========================
+@app.get("/debug/profile")
+async def debug_profile(request: Request, seconds: float = Query(5.0, gt=0, le=60)):
+    if not _is_admin(request):
+        raise HTTPException(status_code=403, detail="Admin key required")
+    prof = profiling.SamplingProfiler().start()
+    await asyncio.sleep(seconds)
+    return PlainTextResponse(prof.stop().collapsed())
+
+@app.get("/debug/profiles")
+async def debug_profiles(request: Request):
+    if not _is_admin(request):
+        raise HTTPException(status_code=403, detail="Admin key required")
+    return {"profiles": [{k: v for k, v in p.items() if k != "collapsed"} for p in profiling.PROFILES.values()]}
+
+@app.get("/debug/profile/{pid}")
+async def debug_profile_get(request: Request, pid: str):
+    if not _is_admin(request):
+        raise HTTPException(status_code=403, detail="Admin key required")
+    p = profiling.PROFILES.get(pid)
+    if p is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return PlainTextResponse(p["collapsed"])
+
 # =========================
 # 基础
 # =========================
 @app.get("/health")
 async def health():
-    return {"status": "ok"}
+    return {"status": "ok", "ready": startup["ready"], "startup": startup, "cache": candle_cache.status(), "eval_memo": eval_memo.status()}
+
+@app.get("/metrics")
+async def metrics():
+    return {
+        "upstream": upstream_status(),
+        "cache": candle_cache.status(),
+        "eval_memo": eval_memo.status(),
+        "storage": maintenance.status(),
+        "history": {k: v for k, v in history.status().items() if k != "bytes_per_symbol"},
+        "analytics": analytics.status(),
+        "patterns": pattern_search.status(),
+        "gaps": gap_index.status(),
+        "books": {k: v for k, v in books.status().items() if k != "books"},
+    }
 
 @app.get("/dashboard")
 async def dashboard():
@@ -141,7 +250,9 @@ async def scan_stop():
 
 @app.get("/scan/status")
 async def scan_status():
-    return scanner.status()
+    shards = await asyncio.to_thread(aggregate_status)
+    return {**scanner.status(), "upstream": upstream_status(), "sharded": shards is not None, "shards": shards,
+            "follower": follower.status()}
 
 # =========================
 # 文件访问（扫描结果）
@@ -155,53 +266,249 @@ async def files_list():
 async def files_download(path: str):
     if not os.path.isfile(path):
         raise HTTPException(status_code=404, detail="File not found")
+    if path.endswith((".gz", ".zst")):
+        # 压缩段透明解压，客户端拿到的始终是 CSV
+        return Response(
+            await asyncio.to_thread(read_bytes, path), media_type="text/csv",
+            headers={"Content-Disposition": f'attachment; filename="{plain_name(path)}"'},
+        )
     return FileResponse(path, filename=os.path.basename(path))
 
+@app.get("/files/history")
+async def files_history(inst_id: str, bar: str, limit: Optional[int] = None):
+    # 本地历史（压缩段 + 活跃段，已去重）；与 OKX 一致：data 按时间倒序
+    rows = await asyncio.to_thread(read_candles, inst_id, bar, limit)
+    return {"code": "0", "inst_id": inst_id, "bar": bar, "data": list(reversed(rows))}
+
 # =========================
-# 策略 · 熊猫系统（保留）
+# 内存 K 线历史（环形缓冲）：内存占用按交易对统计
 # =========================
-@app.get("/strategy/panda/evaluate")
-async def strategy_panda_evaluate(
-    inst_id: str = Query(...),
-    bar: str = Query("15m"),
-    trend_bar: str = Query("1H"),
-    limit: int = Query(150),
-    risk_percent: float = Query(2.0),
-    funds_total: float = Query(694.0),
-    funds_split: int = Query(7),
-    leverage: float = Query(5.0),
-    exclude_btc_in_screen: bool = Query(True),
-):
-    raw_b = await fetch_candles_panda(inst_id, bar, limit)
-    raw_t = await fetch_candles_panda(inst_id, trend_bar, limit)
-    return evaluate_panda(
-        inst_id, bar, raw_b, raw_t,
-        risk_percent, funds_total, funds_split, leverage, exclude_btc_in_screen
-    )
+@app.get("/history/status")
+async def history_status():
+    return history.status()
 
-@app.get("/strategy/panda/scan")
-async def strategy_panda_scan(
-    inst_type: str = Query("SPOT"),
-    top: int = Query(5),
-    bar: str = Query("15m"),
-    trend_bar: str = Query("1H"),
-    limit: int = Query(150),
-    risk_percent: float = Query(2.0),
-    funds_total: float = Query(694.0),
-    funds_split: int = Query(7),
-    leverage: float = Query(5.0),
-    exclude_btc_in_screen: bool = Query(True),
-):
-    return await scan_top_panda(
-        inst_type, top, bar, trend_bar, limit,
-        exclude_btc_in_screen, funds_total, funds_split, leverage, risk_percent
-    )
+@app.get("/history/candles")
+async def history_candles(inst_id: str, bar: str = "15m", limit: int = Query(100, ge=1, le=1000)):
+    view = history.view(inst_id, bar, limit)
+    if view is None:
+        raise HTTPException(status_code=404, detail="Series not in memory")
+    # 与 OKX 一致：data 按时间倒序
+    return {"code": "0", "inst_id": inst_id, "bar": bar, "columns": ["ts", "open", "high", "low", "close", "vol"],
+            "data": [[int(r[0]), *r[1:]] for r in view[::-1].tolist()]}
+
+# =========================
+# 跨品种分析：滚动收益 / 相对强弱 / 相关性 / 市场宽度（基于内存历史，扫描器每轮增量刷新）
+# =========================
+@app.get("/analytics/cross")
+async def analytics_cross(bar: str = "15m", sort_by: Optional[str] = None, top: int = Query(50, ge=1, le=1000),
+                          corr: bool = True):
+    with stage("analytics"):
+        res = await asyncio.to_thread(analytics.view, bar, sort_by, top, corr)
+    if res is None:
+        raise HTTPException(status_code=404, detail=f"No history in memory for bar {bar}")
+    return res
+
+# =========================
+# 历史形态检索：gold12 形态在全部落盘历史上的出现位置（压缩段的掩码有缓存）
+# =========================
+@app.get("/patterns/search")
+async def patterns_search(bar: str = "15m", patterns: Optional[str] = None, inst_ids: Optional[str] = None,
+                          trend: str = "any", since: Optional[int] = None, until: Optional[int] = None,
+                          limit: int = Query(500, ge=1, le=10000)):
+    try:
+        return await asyncio.to_thread(
+            pattern_search.search, bar,
+            [p.strip() for p in patterns.split(",") if p.strip()] if patterns else None,
+            [i.strip() for i in inst_ids.split(",") if i.strip()] if inst_ids else None,
+            trend, since, until, limit)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+# =========================
+# 参数寻优：网格 / 随机搜索，多进程回测，报告落盘 DATA_DIR/sweeps/{id}.json
+# =========================
+@app.post("/sweep")
+async def sweep_start(req: SweepRequest):
+    try:
+        return sweeper.start(req.model_dump())
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@app.get("/sweeps")
+async def sweep_list():
+    return {"sweeps": await asyncio.to_thread(sweeper.list)}
+
+@app.get("/sweep/{sweep_id}")
+async def sweep_get(sweep_id: str, top: int = Query(50, ge=1, le=5000)):
+    report = await asyncio.to_thread(sweeper.get, sweep_id, top)
+    if report is None:
+        raise HTTPException(status_code=404, detail="Sweep not found")
+    return report
+
+# =========================
+# 盘口深度（增量维护 / 滑点估算 / 落盘快照）
+# =========================
+_SIDES = {"long": "buy", "buy": "buy", "short": "sell", "sell": "sell"}
+
+@app.post("/books/start")
+async def books_start(cfg: dict):
+    source = cfg.get("source") or books.source
+    if source not in ("ws", "rest"):
+        raise HTTPException(status_code=400, detail="source must be ws or rest")
+    books.stop()
+    books.start(cfg.get("inst_ids") or books.insts, source)
+    return {"started": books.running, **books.status()}
+
+@app.post("/books/stop")
+async def books_stop():
+    books.stop()
+    return {"stopped": True, **books.status()}
+
+@app.get("/books/status")
+async def books_status():
+    return books.status()
+
+@app.get("/books/depth")
+async def books_depth(inst_id: str, levels: int = Query(20, ge=1, le=400)):
+    book = await books.depth(inst_id)
+    if book is None:
+        raise HTTPException(status_code=404, detail=books.last_error or "Order book not available")
+    return book.depth(levels)
+
+@app.get("/books/slippage")
+async def books_slippage(inst_id: str, position_qty: float = Query(..., gt=0), side: str = "long",
+                         ct_val: float = Query(1.0, gt=0), risk_per_unit: Optional[float] = None):
+    # position_qty 与盘口 sz 同单位（现货为币，合约为张，ct_val 为每张面值）；
+    # 传入评估结果里的 risk_per_unit 时，额外给出计入滑点后的每单位风险
+    if side not in _SIDES:
+        raise HTTPException(status_code=400, detail="side must be long/short/buy/sell")
+    book = await books.depth(inst_id)
+    if book is None:
+        raise HTTPException(status_code=404, detail=books.last_error or "Order book not available")
+    out = book.slippage(position_qty, _SIDES[side], ct_val)
+    out["book_ts"], out["book_source"] = book.ts, book.source
+    if risk_per_unit is not None and out["slip_per_unit"] is not None:
+        out["risk_per_unit"] = risk_per_unit
+        out["risk_per_unit_with_slippage"] = risk_per_unit + out["slip_per_unit"]
+    return out
+
+@app.get("/books/snapshots")
+async def books_snapshots(inst_id: str, since: Optional[int] = None, until: Optional[int] = None,
+                          limit: int = Query(100, ge=1, le=5000)):
+    snaps = await asyncio.to_thread(read_snapshots, inst_id, since, until, limit)
+    return {"inst_id": inst_id, "count": len(snaps), "snapshots": snaps}
 
 # =========================
-# 策略 · 新“日内交易系统”（EMA21/55/144）
+# 数据目录维护（压缩整理 / 保留 / 预算）
 # =========================
-@app.get("/strategy/custom/evaluate")
-async def strategy_custom_evaluate(
+@app.get("/storage/status")
+async def storage_status():
+    return maintenance.status()
+
+@app.post("/storage/compact")
+async def storage_compact():
+    return await maintenance.run_once()
+
+@app.get("/storage/coverage")
+async def storage_coverage(inst_id: Optional[str] = None, bar: Optional[str] = None,
+                           gaps: int = Query(20, ge=0, le=1000)):
+    # 每个 (inst, bar) 的已有 / 缺失区间与覆盖率；fetch_plan 为修复时合并后的拉取区间
+    series = await asyncio.to_thread(gap_index.coverage, inst_id, bar, gaps)
+    return {"series": series, "index": gap_index.status()}
+
+@app.post("/storage/repair")
+async def storage_repair(inst_id: Optional[str] = None, bar: Optional[str] = None,
+                         max_requests: int = Query(50, ge=1, le=1000)):
+    # 只拉缺失的区间（/market/history-candles 分页）；不指定 inst_id 时修复全部（可按 bar 过滤）
+    if inst_id and bar:
+        return await gap_index.repair(inst_id, bar, max_requests)
+    return await gap_index.repair_all(bar, max_requests)
+
+# =========================
+# 评估结果条件响应：ETag / If-None-Match，K 线未变时不重算
+# =========================
+def _memo_response(request: Request, name: str, params: dict, raw_b: dict, raw_t: dict, compute):
+    etag = eval_memo.etag(name, params, raw_b, raw_t)
+    if etag is None:
+        return compute()
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    inm = request.headers.get("if-none-match")
+    if inm and etag in [t.strip() for t in inm.split(",")]:
+        return Response(status_code=304, headers=headers)
+    body = eval_memo.get(etag)
+    if body is None:
+        body = compute()
+        eval_memo.put(etag, body)
+    stale = [r.get("stale_age_sec", 0) for r in (raw_b, raw_t) if r.get("stale")]
+    if stale:
+        # 上游不可用时基于缓存 K 线计算，明确告知调用方
+        body = {**body, "stale": True, "stale_age_sec": max(stale)}
+    with stage("encode"):
+        return JSONResponse(body, headers=headers)
+
+# =========================
+# 策略 · 按注册表生成 /strategy/{name}/evaluate 与 /strategy/{name}/scan
+# =========================
+def _evaluate_route(st: Strategy):
+    async def evaluate(
+        request: Request,
+        inst_id: str = Query(...),
+        bar: str = Query("15m"),
+        trend_bar: str = Query("1H"),
+        limit: int = Query(150),
+        risk_percent: float = Query(2.0),
+        funds_total: float = Query(694.0),
+        funds_split: int = Query(7),
+        leverage: float = Query(5.0),
+        exclude_btc_in_screen: bool = Query(True),
+    ):
+        with stage("fetch_candles"):
+            raw_b, raw_t = await asyncio.gather(candle_cache.fetch(inst_id, bar, limit),
+                                                candle_cache.fetch(inst_id, trend_bar, limit))
+        params = dict(inst_id=inst_id, bar=bar, trend_bar=trend_bar, limit=limit, risk_percent=risk_percent,
+                      funds_total=funds_total, funds_split=funds_split, leverage=leverage,
+                      exclude_btc_in_screen=exclude_btc_in_screen)
+        def compute():
+            with stage("evaluate"):
+                return run_strategy(st, FeatureCache(), inst_id, bar, trend_bar, raw_b, raw_t,
+                                    risk_percent, funds_total, funds_split, leverage, exclude_btc_in_screen)
+        return _memo_response(request, st.name, params, raw_b, raw_t, compute)
+    return evaluate
+
+def _scan_route(st: Strategy):
+    async def scan(
+        inst_type: str = Query("SPOT"),
+        top: int = Query(5),
+        bar: str = Query("15m"),
+        trend_bar: str = Query("1H"),
+        limit: int = Query(150),
+        risk_percent: float = Query(2.0),
+        funds_total: float = Query(694.0),
+        funds_split: int = Query(7),
+        leverage: float = Query(5.0),
+        exclude_btc_in_screen: bool = Query(True),
+    ):
+        result = await st.scan_top(
+            inst_type, top, bar, trend_bar, limit,
+            exclude_btc_in_screen, funds_total, funds_split, leverage, risk_percent
+        )
+        # timings：各阶段累计耗时（ms）；编码耗时只能出现在 Server-Timing 头里
+        result["timings"] = profiling.current()
+        with stage("encode"):
+            return JSONResponse(result)
+    return scan
+
+for _st in REGISTRY.values():
+    app.add_api_route(f"/strategy/{_st.name}/evaluate", _evaluate_route(_st), methods=["GET"],
+                      name=f"strategy_{_st.name}_evaluate", summary=f"Evaluate · {_st.title}")
+    app.add_api_route(f"/strategy/{_st.name}/scan", _scan_route(_st), methods=["GET"],
+                      name=f"strategy_{_st.name}_scan", summary=f"Scan top gainers · {_st.title}")
+
+# =========================
+# 策略 · 多策略对比（同一标的一次拉取，指标共用）
+# =========================
+@app.get("/strategy/compare")
+async def strategy_compare(
     inst_id: str = Query(...),
     bar: str = Query("15m"),
     trend_bar: str = Query("1H"),
@@ -211,28 +518,82 @@ async def strategy_custom_evaluate(
     funds_split: int = Query(7),
     leverage: float = Query(5.0),
     exclude_btc_in_screen: bool = Query(True),
+    strategies: Optional[str] = Query(None, description="逗号分隔，默认全部"),
 ):
-    raw_b = await fetch_candles_custom(inst_id, bar, limit)
-    raw_t = await fetch_candles_custom(inst_id, trend_bar, limit)
-    return evaluate_custom(
-        inst_id, bar, raw_b, raw_t,
-        risk_percent, funds_total, funds_split, leverage, exclude_btc_in_screen
-    )
+    names = [x.strip() for x in strategies.split(",") if x.strip()] if strategies else None
+    return await compare_strategies(inst_id, bar, trend_bar, limit, risk_percent, funds_total,
+                                    funds_split, leverage, exclude_btc_in_screen, names)
 
-@app.get("/strategy/custom/scan")
-async def strategy_custom_scan(
-    inst_type: str = Query("SPOT"),
-    top: int = Query(5),
-    bar: str = Query("15m"),
-    trend_bar: str = Query("1H"),
-    limit: int = Query(150),
-    risk_percent: float = Query(2.0),
-    funds_total: float = Query(694.0),
-    funds_split: int = Query(7),
-    leverage: float = Query(5.0),
-    exclude_btc_in_screen: bool = Query(True),
-):
-    return await scan_top_custom(
-        inst_type, top, bar, trend_bar, limit,
-        exclude_btc_in_screen, funds_total, funds_split, leverage, risk_percent
-    )
+# =========================
+# 策略 · 批量评估（NDJSON 流式返回）
+# =========================
+@app.post("/strategy/{name}/evaluate_batch")
+async def strategy_evaluate_batch(name: str, req: EvaluateBatchRequest):
+    st = get_strategy(name)
+    if st is None:
+        raise HTTPException(status_code=404, detail=f"Unknown strategy: {name}")
+    return StreamingResponse(evaluate_batch_stream(st, req), media_type="application/x-ndjson")
+
+# =========================
+# 价格告警（入场区 / 止损 / 止盈 / 关键区）
+# =========================
+@app.post("/alerts")
+async def alerts_create(req: AlertCreate):
+    lo = req.lo if req.lo is not None else req.level
+    hi = req.hi if req.hi is not None else req.level
+    if lo is None or hi is None:
+        raise HTTPException(status_code=422, detail="level or lo/hi required")
+    alert = Alert(inst_id=req.inst_id, lo=lo, hi=hi, label=req.label, webhook=req.webhook, once=req.once)
+    watch.add([alert])
+    return {"created": [alert.id], "alerts": watch.list(req.inst_id, active_only=True)}
+
+@app.post("/alerts/from_evaluate")
+async def alerts_from_evaluate(req: AlertFromEvaluate):
+    result = req.result
+    if result is None:
+        st = get_strategy(req.strategy)
+        if st is None or not req.inst_id:
+            raise HTTPException(status_code=422, detail="known strategy and inst_id required")
+        raw_b, raw_t = await asyncio.gather(candle_cache.fetch(req.inst_id, req.bar, req.limit),
+                                            candle_cache.fetch(req.inst_id, req.trend_bar, req.limit))
+        result = run_strategy(st, FeatureCache(), req.inst_id, req.bar, req.trend_bar, raw_b, raw_t,
+                              req.risk_percent, req.funds_total, req.funds_split, req.leverage,
+                              req.exclude_btc_in_screen)
+    created = watch.add(alerts_from_evaluation(result, req.webhook, f"{req.strategy}:{req.bar}/{req.trend_bar}"))
+    return {"created": [a.id for a in created], "side": result.get("side"),
+            "alerts": [a for a in watch.list(result.get("inst_id")) if a["id"] in {c.id for c in created}]}
+
+@app.get("/alerts")
+async def alerts_list(inst_id: Optional[str] = None, active_only: bool = False):
+    return {"alerts": watch.list(inst_id, active_only), "status": watch.status()}
+
+@app.delete("/alerts/{alert_id}")
+async def alerts_delete(alert_id: str):
+    if not watch.remove(alert_id):
+        raise HTTPException(status_code=404, detail="Alert not found")
+    return {"deleted": alert_id}
+
+@app.post("/alerts/tick")
+async def alerts_tick(tick: Tick):
+    # 手工注入价格（调试 / 外部行情源）
+    fired = watch.on_tick(tick.inst_id, tick.price)
+    return {"triggered": [a.id for a in fired]}
+
+@app.get("/alerts/stream")
+async def alerts_stream(request: Request):
+    # Server-Sent Events：每个触发事件一条 data
+    q = watch.subscribe()
+
+    async def gen():
+        try:
+            yield ": connected\n\n"
+            while not await request.is_disconnected():
+                try:
+                    event = await asyncio.wait_for(q.get(), timeout=15)
+                except asyncio.TimeoutError:
+                    yield ": keepalive\n\n"
+                    continue
+                yield f"event: alert\ndata: {json.dumps(event, ensure_ascii=False)}\n\n"
+        finally:
+            watch.unsubscribe(q)
+    return StreamingResponse(gen(), media_type="text/event-stream")
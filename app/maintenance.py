@@ -0,0 +1,115 @@
+import asyncio
+import time
+from typing import Dict, List, Optional
+
+from .config import (
+    COMPACT_INTERVAL_SEC, COMPACT_HOT_ROWS, COMPACT_SEGMENT_ROWS, RETAIN_BARS, DATA_MAX_MB,
+)
+from .storage import list_series, compact_series, disk_usage, enforce_budget
+
+
+class Maintenance:
+    """
+    数据目录后台维护（与 Scanner 相同的 asyncio 循环模式）：
+    - 每 interval_sec 对所有 (inst, bar) 去重整理，旧数据滚动为压缩的不可变段
+    - 按 RETAIN_BARS 限制每个周期的保留根数，按 DATA_MAX_MB 限制总占用
+    - 整理本身是阻塞 IO，放到线程里跑，不卡事件循环
+    """
+    def __init__(self):
+        self.running: bool = False
+        self._task: asyncio.Task | None = None
+
+        self.interval_sec: int = COMPACT_INTERVAL_SEC
+        self.hot_rows: int = COMPACT_HOT_ROWS
+        self.segment_rows: int = COMPACT_SEGMENT_ROWS
+        self.retain_bars: Dict[str, int] = dict(RETAIN_BARS)
+        self.max_bytes: int = int(DATA_MAX_MB * 1024 * 1024)
+
+        self.runs: int = 0
+        self.last_run_at: Optional[float] = None
+        self.last_duration_ms: Optional[float] = None
+        self.last_result: Dict = {}
+        self.last_error: Optional[str] = None
+
+    # ---- 单次整理 ----
+    def _run_sync(self) -> Dict:
+        t0 = time.perf_counter()
+        before = disk_usage()["total_bytes"]
+        series: List[Dict] = []
+        for inst, bar in sorted(list_series().keys()):
+            s0 = time.perf_counter()
+            st = compact_series(inst, bar, self.hot_rows, self.segment_rows, self.retain_bars.get(bar))
+            st["duration_ms"] = round((time.perf_counter() - s0) * 1000, 2)
+            series.append(st)
+        deleted = enforce_budget(self.max_bytes)
+        after = disk_usage()["total_bytes"]
+        return {
+            "bytes_before": before,
+            "bytes_after": after,
+            "series": len(series),
+            "duplicates_dropped": sum(max(0, s["rows_in"] - s["rows_out"] - s["rows_merged"]) for s in series),
+            "rows_merged": sum(s["rows_merged"] for s in series),
+            "segments_rolled": sum(s["segments_rolled"] for s in series),
+            "segments_deleted": sum(s["segments_deleted"] for s in series) + len(deleted),
+            "budget_deleted": deleted,
+            "slowest": sorted(series, key=lambda s: s["duration_ms"], reverse=True)[:5],
+            "duration_ms": round((time.perf_counter() - t0) * 1000, 2),
+        }
+
+    async def run_once(self) -> Dict:
+        self.last_run_at = time.time()
+        try:
+            self.last_result = await asyncio.to_thread(self._run_sync)
+            self.last_duration_ms = self.last_result["duration_ms"]
+            self.last_error = None
+        except Exception as e:
+            # 单次失败不影响下一轮
+            self.last_error = str(e)
+        self.runs += 1
+        return self.status()
+
+    # ---- 主循环 ----
+    async def _runner(self):
+        try:
+            while self.running:
+                await self.run_once()
+                await asyncio.sleep(self.interval_sec)
+        except asyncio.CancelledError:
+            pass
+
+    # ---- 控制 ----
+    def start(self):
+        if self.running:
+            return
+        self.running = True
+        self._task = asyncio.create_task(self._runner())
+
+    def stop(self):
+        if not self.running:
+            return
+        self.running = False
+        if self._task:
+            self._task.cancel()
+            self._task = None
+
+    def status(self):
+        usage = disk_usage()
+        return {
+            "running": self.running,
+            "interval_sec": self.interval_sec,
+            "hot_rows": self.hot_rows,
+            "segment_rows": self.segment_rows,
+            "retain_bars": self.retain_bars,
+            "disk": {**usage, "budget_bytes": self.max_bytes,
+                     "budget_used_pct": round(usage["total_bytes"] / max(1, self.max_bytes) * 100, 2)},
+            "compaction": {
+                "runs": self.runs,
+                "last_run_at": self.last_run_at,
+                "last_duration_ms": self.last_duration_ms,
+                "last_error": self.last_error,
+                "last_result": self.last_result,
+            },
+        }
+
+
+maintenance = Maintenance()
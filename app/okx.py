@@ -1,25 +1,238 @@
+import asyncio
+import time
 import httpx
-from typing import Any, Dict
-from .config import OKX_BASE
+from collections import OrderedDict, deque
+from typing import Any, Dict, Optional, Tuple
+from .profiling import stage
+from .config import (
+    OKX_BASE, OKX_DEADLINE_SEC, BREAKER_WINDOW, BREAKER_MIN_CALLS, BREAKER_ERROR_RATE,
+    BREAKER_SLOW_SEC, BREAKER_SLOW_RATE, BREAKER_COOLDOWN_SEC, HEDGE_ENABLED, HEDGE_MIN_DELAY_SEC,
+    STALE_MAX_ENTRIES,
+)
 
 TIMEOUT = httpx.Timeout(10.0, connect=10.0)
 HEADERS = {"Accept": "application/json", "User-Agent": "okx-fastapi/1.1"}
 
+
+class CircuitBreaker:
+    """
+    单个 OKX 端点的熔断器（closed → open → half_open → closed）：
+    - 最近 window 次调用里错误率或慢调用占比超过阈值即 open
+    - open 期间直接拒绝，cooldown 后放一个探测请求（half_open），成功则恢复
+    - 同时记录延迟，p95 用作对冲请求的触发延迟
+    每次状态切换 / 发放探测名额都换一代（generation）：调用带着发起时的代号回报结果，
+    旧一代的完成（熔断前发出的请求、对冲的备份请求）只计入总数，不影响状态；half_open 只认探测请求本身
+    """
+    def __init__(self, path: str):
+        self.path = path
+        self.state = "closed"
+        self.opened_at = 0.0
+        self._probe_inflight = False
+        self._probe_at = 0.0
+        self.generation = 0
+        self._calls: deque = deque(maxlen=BREAKER_WINDOW)   # (ok, latency)
+        self.total = 0
+        self.failures = 0
+        self.rejected = 0
+        self.hedged = 0
+        self.hedge_wins = 0
+        self.stale_served = 0
+
+    def allow(self) -> bool:
+        if self.state == "closed":
+            return True
+        if self.state == "open" and time.monotonic() - self.opened_at >= BREAKER_COOLDOWN_SEC:
+            self.state = "half_open"
+        # 探测请求被取消（未走到 record）时，超过调用总时限也视为已结束，避免永远卡在 half_open
+        if self.state == "half_open" and (not self._probe_inflight
+                                          or time.monotonic() - self._probe_at > OKX_DEADLINE_SEC):
+            self._probe_inflight = True
+            self._probe_at = time.monotonic()
+            self.generation += 1
+            return True
+        self.rejected += 1
+        return False
+
+    def record(self, ok: bool, latency: float, generation: Optional[int] = None, probe: bool = False):
+        self.total += 1
+        self.failures += (not ok)
+        if generation is not None and generation != self.generation:
+            return
+        if self.state == "half_open":
+            if not probe:
+                return
+            self._probe_inflight = False
+            if ok and latency < BREAKER_SLOW_SEC:
+                self.state = "closed"
+                self.generation += 1
+                self._calls.clear()
+            else:
+                self._open()
+            return
+        if self.state != "closed":
+            return
+        self._calls.append((ok, latency))
+        n = len(self._calls)
+        if n < BREAKER_MIN_CALLS:
+            return
+        err_rate = sum(1 for ok_, _ in self._calls if not ok_) / n
+        slow_rate = sum(1 for _, lat in self._calls if lat >= BREAKER_SLOW_SEC) / n
+        if err_rate >= BREAKER_ERROR_RATE or slow_rate >= BREAKER_SLOW_RATE:
+            self._open()
+
+    def release_probe(self, generation: int):
+        """探测请求没有结果就结束（被取消）时归还名额，下一个调用可以重新探测。"""
+        if self.state == "half_open" and generation == self.generation:
+            self._probe_inflight = False
+
+    def _open(self):
+        self.state = "open"
+        self.opened_at = time.monotonic()
+        self.generation += 1
+
+    def p95(self) -> Optional[float]:
+        lats = sorted(lat for ok, lat in self._calls if ok)
+        if len(lats) < BREAKER_MIN_CALLS:
+            return None
+        return lats[min(len(lats) - 1, int(len(lats) * 0.95))]
+
+    def hedge_delay(self) -> Optional[float]:
+        if not HEDGE_ENABLED or self.state != "closed":
+            return None
+        p95 = self.p95()
+        return None if p95 is None else max(HEDGE_MIN_DELAY_SEC, p95)
+
+    def status(self):
+        n = len(self._calls)
+        p95 = self.p95()
+        return {
+            "state": self.state,
+            "window": n,
+            "error_rate": round(sum(1 for ok, _ in self._calls if not ok) / n, 3) if n else 0.0,
+            "p95_ms": round(p95 * 1000, 1) if p95 is not None else None,
+            "total": self.total,
+            "failures": self.failures,
+            "rejected": self.rejected,
+            "hedged": self.hedged,
+            "hedge_wins": self.hedge_wins,
+            "stale_served": self.stale_served,
+        }
+
+
+# 每个 OkxClient 都是临时创建的，熔断与兜底状态放在模块级共享
+BREAKERS: Dict[str, CircuitBreaker] = {}
+_STALE: "OrderedDict[Tuple, Tuple[float, Dict[str, Any]]]" = OrderedDict()
+
+
+def breaker(path: str) -> CircuitBreaker:
+    if path not in BREAKERS:
+        BREAKERS[path] = CircuitBreaker(path)
+    return BREAKERS[path]
+
+
+def upstream_status() -> Dict[str, Any]:
+    return {"deadline_sec": OKX_DEADLINE_SEC, "hedge_enabled": HEDGE_ENABLED,
+            "stale_entries": len(_STALE), "breakers": {p: b.status() for p, b in BREAKERS.items()}}
+
+
+def _healthy(res: Dict[str, Any]) -> bool:
+    # 网络错误、5xx、429 算上游不健康；OKX 业务错误码（如交易对不存在）不算
+    if res.get("error") == "network_error":
+        return False
+    if res.get("error") == "upstream_http_error":
+        code = int(res.get("code", "0"))
+        return not (code >= 500 or code == 429)
+    return True
+
+
 class OkxClient:
     def __init__(self):
         self._client = httpx.AsyncClient(timeout=TIMEOUT, headers=HEADERS)
 
-    async def _get(self, path: str, params: Dict[str, Any]) -> Dict[str, Any]:
-        url = f"{OKX_BASE}/api/v5{path}"
+    async def _request(self, url: str, params: Dict[str, Any]) -> Dict[str, Any]:
         try:
-            r = await self._client.get(url, params=params)
+            with stage("okx_http"):
+                r = await self._client.get(url, params=params)
             if r.status_code != 200:
                 return {"code": str(r.status_code), "error": "upstream_http_error",
                         "url": str(r.url), "detail": r.text[:500]}
-            return r.json()
+            with stage("okx_json"):
+                return r.json()
         except httpx.RequestError as e:
             return {"code": "-1", "error": "network_error", "detail": str(e)}
 
+    async def _timed(self, br: CircuitBreaker, url: str, params: Dict[str, Any],
+                     gen: int, probe: bool = False) -> Dict[str, Any]:
+        t0 = time.monotonic()
+        res = await self._request(url, params)
+        br.record(_healthy(res), time.monotonic() - t0, gen, probe)
+        return res
+
+    async def _hedged(self, br: CircuitBreaker, url: str, params: Dict[str, Any],
+                      gen: int, probe: bool) -> Dict[str, Any]:
+        # 主请求超过 p95 仍未返回时，再发一个相同请求，谁先成功用谁（GET 幂等）。
+        # 调用方被取消（总时限 / 客户端断开）时，finally 取消所有未完成的请求，不留后台任务
+        primary = asyncio.create_task(self._timed(br, url, params, gen, probe))
+        pending = {primary}
+        res: Dict[str, Any] = {}
+        try:
+            delay = None if probe else br.hedge_delay()
+            if delay is None:
+                return await primary
+            done, _ = await asyncio.wait({primary}, timeout=delay)
+            if done:
+                return primary.result()
+            br.hedged += 1
+            backup = asyncio.create_task(self._timed(br, url, params, gen))
+            pending = {primary, backup}
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    res = task.result()
+                    if _healthy(res):
+                        br.hedge_wins += task is backup
+                        return res
+            return res
+        finally:
+            for task in pending:
+                task.cancel()
+
+    def _stale_or(self, br: CircuitBreaker, key: Tuple, err: Dict[str, Any]) -> Dict[str, Any]:
+        hit = _STALE.get(key)
+        if hit is None:
+            return err
+        br.stale_served += 1
+        saved_at, payload = hit
+        return {**payload, "stale": True, "stale_age_sec": round(time.time() - saved_at, 1),
+                "stale_reason": err.get("error"), "stale_code": err.get("code")}
+
+    async def _get(self, path: str, params: Dict[str, Any]) -> Dict[str, Any]:
+        url = f"{OKX_BASE}/api/v5{path}"
+        br = breaker(path)
+        key = (path, tuple(sorted(params.items())))
+        if not br.allow():
+            return self._stale_or(br, key, {"code": "-1", "error": "circuit_open", "detail": path})
+        gen, probe = br.generation, br.state == "half_open"
+        try:
+            res = await asyncio.wait_for(self._hedged(br, url, params, gen, probe), OKX_DEADLINE_SEC)
+        except asyncio.TimeoutError:
+            br.record(False, OKX_DEADLINE_SEC, gen, probe)
+            return self._stale_or(br, key, {"code": "-1", "error": "deadline_exceeded",
+                                            "detail": f"{path} > {OKX_DEADLINE_SEC}s"})
+        except BaseException:
+            # 取消（扫描器停止 / 批量流中断 / 客户端断开）不计入健康统计，但要归还探测名额
+            if probe:
+                br.release_probe(gen)
+            raise
+        if res.get("code") == "0":
+            _STALE[key] = (time.time(), res)
+            _STALE.move_to_end(key)
+            while len(_STALE) > STALE_MAX_ENTRIES:
+                _STALE.popitem(last=False)
+        elif not _healthy(res):
+            return self._stale_or(br, key, res)
+        return res
+
     async def ticker(self, inst_id: str) -> Dict[str, Any]:
         return await self._get("/market/ticker", {"instId": inst_id})
 
@@ -29,5 +242,19 @@ class OkxClient:
     async def candles(self, inst_id: str, bar: str, limit: int) -> Dict[str, Any]:
         return await self._get("/market/candles", {"instId": inst_id, "bar": bar, "limit": limit})
 
+    async def history_candles(self, inst_id: str, bar: str, after: Optional[int] = None,
+                              before: Optional[int] = None, limit: int = 100) -> Dict[str, Any]:
+        # 历史 K 线（按 ts 倒序）：after 取早于该 ts 的，before 取晚于该 ts 的；单次最多 100 根
+        params: Dict[str, Any] = {"instId": inst_id, "bar": bar, "limit": limit}
+        if after is not None:
+            params["after"] = str(after)
+        if before is not None:
+            params["before"] = str(before)
+        return await self._get("/market/history-candles", params)
+
+    async def books(self, inst_id: str, sz: int = 400) -> Dict[str, Any]:
+        # 盘口快照：data[0] = {asks, bids, ts}，档位为 [px, sz, 0, 订单数]；sz 最大 400
+        return await self._get("/market/books", {"instId": inst_id, "sz": sz})
+
     async def close(self):
         await self._client.aclose()
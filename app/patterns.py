@@ -0,0 +1,223 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+from .config import PATTERN_CACHE_SEGMENTS
+from .features import _f
+from .history import _np
+from .storage import list_series, read_segment
+
+# 与 Features.candle_flags() 的键一致
+PATTERNS = ("bull_engulf", "bear_engulf", "inside_bar", "outside_bar", "piercing", "dark_cloud",
+            "bull_pin", "bear_pin", "three_white_soldiers", "three_black_crows")
+TREND_FAST, TREND_SLOW = 20, 50     # 趋势过滤与 panda 一致：EMA20 vs EMA50（同周期）
+_PREFIX_ROWS = 2                    # 三根 K 线形态需要前一段的最后两根
+
+
+def pattern_masks(o, h, l, c):
+    """
+    gold12 检测器的向量化版本：输入升序 o/h/l/c 数组，返回 (len(PATTERNS), n) 的布尔掩码，
+    第 i 列表示“以第 i 根结尾”的形态（与对最后几根调用标量检测器的结果逐点一致）。
+    """
+    np = _np()
+    n = len(c)
+    out = np.zeros((len(PATTERNS), n), dtype=bool)
+    if n == 0:
+        return out
+    row = {name: i for i, name in enumerate(PATTERNS)}
+
+    if n >= 2:
+        o1, c1, h1, l1 = o[:-1], c[:-1], h[:-1], l[:-1]
+        o2, c2, h2, l2 = o[1:], c[1:], h[1:], l[1:]
+        # 单根形态也从第 2 根起算：标量检测器在不足两根时不判 pin
+        body = np.abs(c2 - o2)
+        rng = np.maximum(h2 - l2, 1e-8)
+        out[row["bull_pin"], 1:] = (np.minimum(o2, c2) - l2 > 2 * body) & (c2 > o2) & (c2 > l2 + 0.6 * rng)
+        out[row["bear_pin"], 1:] = (h2 - np.maximum(o2, c2) > 2 * body) & (c2 < o2) & (c2 < h2 - 0.6 * rng)
+        out[row["bull_engulf"], 1:] = (c1 < o1) & (c2 > o2) & (o2 <= c1) & (c2 >= o1)
+        out[row["bear_engulf"], 1:] = (c1 > o1) & (c2 < o2) & (o2 >= c1) & (c2 <= o1)
+        out[row["inside_bar"], 1:] = (h2 <= h1) & (l2 >= l1)
+        out[row["outside_bar"], 1:] = (h2 >= h1) & (l2 <= l1)
+        out[row["piercing"], 1:] = (c1 < o1) & (c2 > o2) & (o2 < l2 + 0.2 * (h2 - l2)) & (c2 > (o1 + c1) / 2)
+        out[row["dark_cloud"], 1:] = (c1 > o1) & (c2 < o2) & (o2 > l2 + 0.8 * (h2 - l2)) & (c2 < (o1 + c1) / 2)
+
+    if n >= 3:
+        up = c > o
+        down = c < o
+        out[row["three_white_soldiers"], 2:] = up[:-2] & up[1:-1] & up[2:] & (c[2:] > c[1:-1]) & (c[1:-1] > c[:-2])
+        out[row["three_black_crows"], 2:] = down[:-2] & down[1:-1] & down[2:] & (c[2:] < c[1:-1]) & (c[1:-1] < c[:-2])
+    return out
+
+
+def _ema(x: List[float], period: int, seed: Optional[float]) -> List[float]:
+    # 与 features.ema 相同；seed 为上一段最后的 EMA 值，使分段计算与整体计算一致
+    k = 2 / (period + 1)
+    out = []
+    e = seed
+    for v in x:
+        e = v if e is None else v * k + e * (1 - k)
+        out.append(e)
+    return out
+
+
+def _segment_entry(rows: List[List[str]], prefix, seed) -> Dict[str, Any]:
+    np = _np()
+    try:
+        ohlc = np.array([r[1:5] for r in rows], dtype=np.float64)
+    except ValueError:
+        ohlc = np.array([[_f(x) for x in r[1:5]] for r in rows], dtype=np.float64)
+    ts = np.array([int(r[0]) for r in rows], dtype=np.int64)
+    full = np.vstack([prefix, ohlc]) if len(prefix) else ohlc
+    masks = pattern_masks(*full.T)[:, len(prefix):]
+    close = ohlc[:, 3].tolist()
+    fast = _ema(close, TREND_FAST, seed[0] if seed else None)
+    slow = _ema(close, TREND_SLOW, seed[1] if seed else None)
+    fast_a, slow_a = np.array(fast), np.array(slow)
+    return {
+        "ts": ts,
+        "close": ohlc[:, 3],
+        "masks": masks,
+        "up": fast_a > slow_a,
+        "down": fast_a < slow_a,
+        "tail": full[-_PREFIX_ROWS:],
+        "ema": (fast[-1], slow[-1]),
+    }
+
+
+class PatternSearch:
+    """
+    在全部落盘历史上检索 gold12 形态：
+    - 压缩段只在整理并回补数时重写，每段的形态掩码 / 趋势状态按 (段路径, mtime, 前两根, EMA 起点) 缓存（LRU），重复查询旧数据不再读盘
+    - 活跃段每次现算（它还在追加）
+    - 段首的两根/三根形态用前一段最后两根补齐；EMA 沿段链接续，结果与整体计算一致
+    """
+    def __init__(self, max_segments: int = PATTERN_CACHE_SEGMENTS):
+        self.max_segments = max_segments
+        self._cache: "OrderedDict[tuple, Dict[str, Any]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()   # 查询在线程池里跑，串行化对缓存的访问
+
+    def _entries(self, item: Dict) -> List[Dict[str, Any]]:
+        np = _np()
+        prefix = np.zeros((0, 4))
+        seed = None
+        sealed_last = None
+        out: List[Dict[str, Any]] = []
+        for _first, last, path in item["segments"]:
+            try:
+                # 段在整理时可能被原地重写（并入修复补回的行），mtime 一并作为键
+                mtime = os.stat(path).st_mtime_ns
+            except FileNotFoundError:
+                continue     # 刚被保留策略删除
+            key = (path, mtime, prefix.tobytes(), seed)
+            entry = self._cache.get(key)
+            if entry is not None:
+                self.hits += 1
+                self._cache.move_to_end(key)
+            else:
+                try:
+                    rows = read_segment(path)
+                except FileNotFoundError:
+                    continue     # 刚被保留策略删除
+                if not rows:
+                    continue
+                self.misses += 1
+                entry = self._cache[key] = _segment_entry(rows, prefix, seed)
+                while len(self._cache) > self.max_segments:
+                    self._cache.popitem(last=False)
+            out.append(entry)
+            prefix, seed, sealed_last = entry["tail"], entry["ema"], last
+        if item["active"]:
+            try:
+                rows = read_segment(item["active"])
+            except FileNotFoundError:
+                rows = []
+            rows = [r for r in rows if sealed_last is None or int(r[0]) > sealed_last]
+            if rows:
+                out.append(_segment_entry(rows, prefix, seed))
+        return out
+
+    def search(self, bar: str, patterns: Optional[List[str]] = None, inst_ids: Optional[List[str]] = None,
+               trend: str = "any", since: Optional[int] = None, until: Optional[int] = None,
+               limit: int = 500) -> Dict[str, Any]:
+        patterns = list(patterns or PATTERNS)
+        unknown = [p for p in patterns if p not in PATTERNS]
+        if unknown:
+            raise ValueError(f"unknown patterns: {unknown}; available: {list(PATTERNS)}")
+        if trend not in ("any", "up", "down"):
+            raise ValueError("trend must be one of any/up/down")
+        with self._lock:
+            return self._search(bar, patterns, inst_ids, trend, since, until, limit)
+
+    def _search(self, bar, patterns, inst_ids, trend, since, until, limit) -> Dict[str, Any]:
+        np = _np()
+        t0 = time.perf_counter()
+        hits0, misses0 = self.hits, self.misses
+        pidx = [PATTERNS.index(p) for p in patterns]
+        wanted = {i.replace("/", "-") for i in inst_ids} if inst_ids else None
+
+        found: List[tuple] = []      # (inst, entry, 命中行号数组)；只为最终返回的 limit 条生成字典
+        counts = dict.fromkeys(patterns, 0)
+        by_inst: Dict[str, int] = {}
+        scanned = 0
+        for (inst, b), item in sorted(list_series().items()):
+            if b != bar or (wanted is not None and inst not in wanted):
+                continue
+            for e in self._entries(item):
+                scanned += len(e["ts"])
+                m = e["masks"][pidx]
+                sel = m.any(axis=0)
+                if trend == "up":
+                    sel &= e["up"]
+                elif trend == "down":
+                    sel &= e["down"]
+                if since is not None:
+                    sel &= e["ts"] >= since
+                if until is not None:
+                    sel &= e["ts"] <= until
+                idx = np.flatnonzero(sel)
+                if not len(idx):
+                    continue
+                for name, cnt in zip(patterns, m[:, idx].sum(axis=1).tolist()):
+                    counts[name] += cnt
+                by_inst[inst] = by_inst.get(inst, 0) + len(idx)
+                found.append((inst, e, m, idx))
+
+        total = sum(len(idx) for *_, idx in found)
+        occurrences: List[Dict[str, Any]] = []
+        if found:
+            ts_all = np.concatenate([e["ts"][idx] for _, e, _, idx in found])
+            owner = np.repeat(np.arange(len(found)), [len(idx) for *_, idx in found])
+            pos = np.concatenate([idx for *_, idx in found])
+            for k in np.argsort(-ts_all, kind="stable")[:limit].tolist():
+                inst, e, m, _ = found[owner[k]]
+                i = int(pos[k])
+                occurrences.append({
+                    "inst_id": inst,
+                    "ts": int(e["ts"][i]),
+                    "close": float(e["close"][i]),
+                    "patterns": [p for p, hit in zip(patterns, m[:, i].tolist()) if hit],
+                    "trend": "up" if e["up"][i] else ("down" if e["down"][i] else "flat"),
+                })
+        return {
+            "bar": bar,
+            "patterns": patterns,
+            "trend": trend,
+            "total": total,
+            "counts": counts,
+            "by_inst": by_inst,
+            "bars_scanned": scanned,
+            "occurrences": occurrences,
+            "segment_cache": {"hits": self.hits - hits0, "misses": self.misses - misses0},
+            "elapsed_ms": round((time.perf_counter() - t0) * 1000, 2),
+        }
+
+    def status(self) -> Dict[str, Any]:
+        return {"segments_cached": len(self._cache), "max_segments": self.max_segments,
+                "hits": self.hits, "misses": self.misses}
+
+
+pattern_search = PatternSearch()
@@ -0,0 +1,101 @@
+import sys
+import threading
+import time
+import uuid
+from collections import Counter, OrderedDict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, List, Optional
+
+# =========================
+# 分阶段计时（常开，开销极小）：路由/客户端里用 with stage("xxx") 包住各步骤，
+# 中间件把结果写进 Server-Timing 头。并发子任务共享同一个 dict，所以是累计耗时。
+# =========================
+_timings: ContextVar[Optional[Dict[str, float]]] = ContextVar("timings", default=None)
+
+
+def begin() -> Dict[str, float]:
+    d: Dict[str, float] = {}
+    _timings.set(d)
+    return d
+
+
+def current() -> Dict[str, float]:
+    d = _timings.get()
+    return {k: round(v, 2) for k, v in d.items()} if d else {}
+
+
+@contextmanager
+def stage(name: str):
+    d = _timings.get()
+    if d is None:
+        yield
+        return
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        d[name] = d.get(name, 0.0) + (time.perf_counter() - t0) * 1000
+
+
+def server_timing(d: Dict[str, float], total_ms: float) -> str:
+    parts = [f"{k};dur={v:.2f}" for k, v in d.items()]
+    parts.append(f"total;dur={total_ms:.2f}")
+    return ", ".join(parts)
+
+
+# =========================
+# 按需采样剖析：后台线程定时抓取目标线程的调用栈，输出 collapsed stacks
+# （flamegraph.pl / speedscope 可直接读取）。事件循环是单线程，采样到的是该线程上
+# 所有正在跑的协程，而不仅是被剖析的那个请求。
+# =========================
+class SamplingProfiler:
+    def __init__(self, thread_id: Optional[int] = None, interval: float = 0.005):
+        self.thread_id = thread_id or threading.get_ident()
+        self.interval = interval
+        self.samples: Counter = Counter()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.started_at = 0.0
+        self.duration_ms = 0.0
+
+    def _loop(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack: List[str] = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({code.co_filename.rsplit('/', 1)[-1]}:{frame.f_lineno})")
+                frame = frame.f_back
+            if stack:
+                self.samples[";".join(reversed(stack))] += 1
+
+    def start(self) -> "SamplingProfiler":
+        self.started_at = time.perf_counter()
+        self._thread = threading.Thread(target=self._loop, name="sampling-profiler", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> "SamplingProfiler":
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+        self.duration_ms = (time.perf_counter() - self.started_at) * 1000
+        return self
+
+    def collapsed(self) -> str:
+        return "\n".join(f"{stack} {n}" for stack, n in self.samples.most_common()) + "\n"
+
+
+# 最近的请求级剖析结果（id -> 元信息 + collapsed stacks）
+PROFILES: "OrderedDict[str, Dict]" = OrderedDict()
+MAX_PROFILES = 20
+
+
+def save_profile(path: str, prof: SamplingProfiler) -> str:
+    pid = uuid.uuid4().hex[:12]
+    PROFILES[pid] = {"id": pid, "path": path, "at": time.time(), "duration_ms": round(prof.duration_ms, 1),
+                     "samples": sum(prof.samples.values()), "collapsed": prof.collapsed()}
+    while len(PROFILES) > MAX_PROFILES:
+        PROFILES.popitem(last=False)
+    return pid
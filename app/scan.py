@@ -1,10 +1,19 @@
 import asyncio
-from collections import deque
-from typing import Dict, List
-
-from .config import SCAN_SYMBOLS, SCAN_BARS, SCAN_BATCH, SCAN_INTERVAL_SEC
+import time
+from collections import OrderedDict, deque
+from typing import Dict, List, Tuple
+
+from .config import (
+    SCAN_SYMBOLS, SCAN_BARS, SCAN_BATCH, SCAN_INTERVAL_SEC,
+    SCAN_CONCURRENCY, SCAN_MAX_CONCURRENCY, SCAN_TARGET_LATENCY_SEC, SCAN_MAX_RETRY,
+    SAVED_FILES_MAX,
+)
 from .okx import OkxClient
+from .limiter import AimdLimiter
 from .storage import save_candles_csv
+from .cache import candle_cache
+from .alerts import watch
+from .analytics import analytics
 
 
 class Scanner:
@@ -13,18 +22,30 @@ class Scanner:
     - 使用 asyncio.create_task 启动循环，不依赖 APScheduler
     - 每 interval_sec 跑一批（batch 个 symbol × 所有周期）
     - 结果追加到 CSV；状态里返回 processed_batches / saved_files
+    - 上游并发由 AIMD 自适应控制；失败的 (inst, bar) 进入重试队列，下一轮优先补拉
     """
     def __init__(self):
         self.running: bool = False
         self._task: asyncio.Task | None = None
 
+        self.universe: List[str] = list(SCAN_SYMBOLS)   # 全部交易对；分片时 symbols 只是其中归本分片的部分
         self.symbols = deque(SCAN_SYMBOLS)
+        self.shard = None                                # shard.ShardMember | None
         self.bars: Dict[str, int] = dict(SCAN_BARS)
         self.batch: int = SCAN_BATCH
         self.interval_sec: int = SCAN_INTERVAL_SEC
 
         self.processed_batches: int = 0
-        self.saved_files: List[str] = []
+        self.saved_files: "OrderedDict[str, None]" = OrderedDict()   # 有序集合，最多 SAVED_FILES_MAX 个
+
+        self.limiter = AimdLimiter(SCAN_CONCURRENCY, 1, SCAN_MAX_CONCURRENCY, SCAN_TARGET_LATENCY_SEC)
+        self._retry: deque = deque()               # [(inst, bar, attempts), ...]
+        self.failed: int = 0
+        self.retried_ok: int = 0
+        self.dropped: int = 0
+        self.candles_total: int = 0
+        self.last_cycle: Dict = {}
+        self._tput_ewma: float | None = None
 
     # ---- 批次计算 ----
     def _peek_next_batch(self) -> List[str]:
@@ -42,42 +63,118 @@ class Scanner:
     # ---- 主循环 ----
     async def _runner(self):
         try:
+            if self.shard is not None:
+                # 先登记心跳、看到同伴后再算归属；否则第一轮每个 worker 都按独占全部交易对来扫
+                await self.shard.join(self.status())
             while self.running:
+                self._rebalance()
                 await self._do_scan_once()
+                if self.shard is not None:
+                    await asyncio.to_thread(self.shard.heartbeat, self.status())
                 await asyncio.sleep(self.interval_sec)
         except asyncio.CancelledError:
             # 停止时取消即可
             pass
 
+    async def _fetch_pair(self, client: OkxClient, inst: str, bar: str, attempts: int) -> int:
+        """拉取并落盘一个 (inst, bar)；返回写入的 K 线根数，失败时进重试队列并返回 0。"""
+        limit = self.bars.get(bar)
+        if limit is None:
+            return 0
+        await self.limiter.acquire()
+        t0 = time.monotonic()
+        try:
+            res = await client.candles(inst, bar, limit)
+        except asyncio.CancelledError:
+            # 停止 / 超时导致的取消不是上游的问题：归还名额但不做 AIMD 反馈
+            await self.limiter.abandon()
+            raise
+        except Exception as e:
+            res = {"code": "-1", "error": "exception", "detail": str(e)}
+        res = res or {}
+        ok = str(res.get("code")) == "0" and not res.get("stale")
+        # 过期兜底数据里带着真实的上游错误码
+        code = str(res.get("stale_code") or res.get("code"))
+        # HTTP 429 或 OKX 50011（请求过于频繁）视为限流
+        await self.limiter.release(ok, time.monotonic() - t0, rate_limited=code in ("429", "50011"))
+        if not ok:
+            self.failed += 1
+            if attempts + 1 < SCAN_MAX_RETRY:
+                self._retry.append((inst, bar, attempts + 1))
+            else:
+                self.dropped += 1
+            return 0
+        if attempts:
+            self.retried_ok += 1
+        # 即便 data 为空，也会落一个带表头的 CSV，便于可视化与验证
+        # 落盘（取序列锁、追加 CSV）放到线程里，不阻塞事件循环
+        self._remember_file(await asyncio.to_thread(save_candles_csv, inst, bar, res))
+        data = res.get("data", [])
+        candle_cache.merge(inst, bar, data)   # 同时写入 history 环形缓冲
+        if data:
+            # 最新一根的收盘价顺便喂给告警引擎
+            try:
+                watch.on_tick(inst, float(data[0][4]))
+            except (TypeError, ValueError, IndexError):
+                pass
+        return len(data)
+
     async def _do_scan_once(self):
-        syms = self._next_batch()
-        if not syms:
+        # 先补上一轮失败的，再跑新一批
+        pairs: List[Tuple[str, str, int]] = []
+        while self._retry:
+            pairs.append(self._retry.popleft())
+        retries = len(pairs)
+        for inst in self._next_batch():
+            for bar in self.bars.keys():
+                pairs.append((inst, bar, 0))
+        if not pairs:
             return
 
+        t0 = time.monotonic()
         client = OkxClient()
         try:
-            tasks = []
-            for inst in syms:
-                for bar, limit in self.bars.items():
-                    tasks.append(client.candles(inst, bar, limit))
-            results = await asyncio.gather(*tasks, return_exceptions=True)
-
-            i = 0
-            for inst in syms:
-                for bar in self.bars.keys():
-                    res = results[i]
-                    i += 1
-                    if isinstance(res, Exception):
-                        # 忽略该条错误，下一轮继续
-                        continue
-                    # 即便 data 为空，也会落一个带表头的 CSV，便于可视化与验证
-                    path = save_candles_csv(inst, bar, res)
-                    if path not in self.saved_files:
-                        self.saved_files.append(path)
-
-            self.processed_batches += 1
+            counts = await asyncio.gather(*(self._fetch_pair(client, inst, bar, n) for inst, bar, n in pairs))
         finally:
             await client.close()
+        elapsed = max(time.monotonic() - t0, 1e-6)
+        candles = sum(counts)
+        tput = candles / elapsed
+        self._tput_ewma = tput if self._tput_ewma is None else 0.8 * self._tput_ewma + 0.2 * tput
+        self.candles_total += candles
+        self.last_cycle = {"pairs": len(pairs), "retries": retries, "ok": sum(1 for c in counts if c),
+                           "candles": candles, "elapsed_sec": round(elapsed, 3),
+                           "candles_per_sec": round(tput, 1)}
+        self.processed_batches += 1
+        # 跨品种分析只重填本轮有更新的交易对；矩阵计算在线程里跑
+        await analytics.refresh_all_async()
+
+    def restore_files(self, paths: List[str]):
+        # 重启后从磁盘恢复已落盘文件列表，避免状态从零开始
+        for path in paths:
+            self._remember_file(path)
+
+    def _remember_file(self, path: str):
+        self.saved_files[path] = None
+        self.saved_files.move_to_end(path)
+        while len(self.saved_files) > SAVED_FILES_MAX:
+            self.saved_files.popitem(last=False)
+
+    # ---- 分片 ----
+    def set_shard(self, member):
+        self.shard = member
+        self._rebalance()
+
+    def _rebalance(self):
+        # 成员变化时重新计算归属；未变化的交易对保持原有轮转顺序
+        if self.shard is None:
+            return
+        owned = self.shard.owned(self.universe)
+        owned_set = set(owned)
+        if owned_set != set(self.symbols):
+            keep = [s for s in self.symbols if s in owned_set]
+            kept = set(keep)
+            self.symbols = deque(keep + [s for s in owned if s not in kept])
 
     # ---- 控制 ----
     def start(self):
@@ -96,7 +193,9 @@ class Scanner:
             self._task = None
 
     def reconfig(self, symbols: List[str], bars: Dict[str, int], batch: int, interval_sec: int):
-        self.symbols = deque(symbols or [])
+        self.universe = list(symbols or [])
+        self.symbols = deque(self.universe)
+        self._rebalance()
         self.bars = dict(bars or {})
         self.batch = int(batch)
         self.interval_sec = int(interval_sec)
@@ -108,13 +207,25 @@ class Scanner:
     def status(self):
         return {
             "running": self.running,
+            "shard_id": self.shard.shard_id if self.shard is not None else None,
             "symbols": list(self.symbols),
             "bars": self.bars,
             "batch": self.batch,
             "interval_sec": self.interval_sec,
             "next_batch": self._peek_next_batch(),   # 仅查看，不改变队列
             "processed_batches": self.processed_batches,
-            "saved_files": self.saved_files[-20:],    # 仅展示最近 20 个
+            "saved_files": list(self.saved_files)[-20:],    # 仅展示最近 20 个
+            "concurrency": self.limiter.status(),
+            "retry_queue": len(self._retry),
+            "failed": self.failed,
+            "retried_ok": self.retried_ok,
+            "dropped": self.dropped,
+            "throughput": {
+                "candles_per_sec": self.last_cycle.get("candles_per_sec"),
+                "candles_per_sec_ewma": round(self._tput_ewma, 1) if self._tput_ewma is not None else None,
+                "candles_total": self.candles_total,
+                "last_cycle": self.last_cycle,
+            },
         }
 
 
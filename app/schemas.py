@@ -24,3 +24,70 @@ class ScanStatus(BaseModel):
     next_batch: List[str]
     processed_batches: int
     saved_files: List[str]
+
+
+class BatchItem(BaseModel):
+    inst_id: str = Field(..., description="交易对，如 ETH-USDT")
+    bar: str = Field("15m", description="信号周期")
+    trend_bar: str = Field("1H", description="趋势周期")
+
+
+BATCH_MAX_ITEMS = 100
+BATCH_MAX_CONCURRENCY = 32
+
+
+class EvaluateBatchRequest(BaseModel):
+    items: List[BatchItem] = Field(..., min_length=1, max_length=BATCH_MAX_ITEMS)
+    limit: int = Field(150, ge=1, le=300)
+    risk_percent: float = 2.0
+    funds_total: float = 694.0
+    funds_split: int = 7
+    leverage: float = 5.0
+    exclude_btc_in_screen: bool = True
+    concurrency: int = Field(8, ge=1, le=BATCH_MAX_CONCURRENCY, description="同时向 OKX 发起的 K 线请求数上限")
+
+
+class AlertCreate(BaseModel):
+    inst_id: str
+    level: Optional[float] = Field(None, description="单一价位；与 lo/hi 二选一")
+    lo: Optional[float] = None
+    hi: Optional[float] = None
+    label: str = "level"
+    webhook: Optional[str] = Field(None, description="触发时 POST 的地址")
+    once: bool = True
+
+
+class AlertFromEvaluate(BaseModel):
+    strategy: str = "custom"
+    inst_id: Optional[str] = None
+    bar: str = "15m"
+    trend_bar: str = "1H"
+    limit: int = 150
+    # 服务端现算时与 /strategy/{name}/evaluate 相同的风控参数与默认值，保证价位一致
+    risk_percent: float = 2.0
+    funds_total: float = 694.0
+    funds_split: int = 7
+    leverage: float = 5.0
+    exclude_btc_in_screen: bool = True
+    result: Optional[Dict] = Field(None, description="已有的评估结果；为空时服务端现算")
+    webhook: Optional[str] = None
+
+
+class Tick(BaseModel):
+    inst_id: str
+    price: float
+
+
+class SweepRequest(BaseModel):
+    strategy: str = Field("panda", description="panda | custom")
+    inst_ids: List[str] = Field(..., description="用哪些交易对的落盘历史回测")
+    bar: str = "15m"
+    trend_bar: Optional[str] = Field(None, description="趋势周期；为空或无落盘数据时用信号周期本身")
+    mode: str = Field("grid", description="grid | random")
+    samples: int = Field(200, description="random 模式的抽样组合数")
+    seed: int = 0
+    space: Optional[Dict[str, List[float]]] = Field(None, description="覆盖默认参数空间，如 {\"ema_fast\": [10, 20]}")
+    max_hold: int = Field(48, description="信号后最多持有的根数，期间未触及止损/止盈则按收盘价平仓")
+    min_trades: int = Field(20, description="交易数不足的组合排在最后")
+    metric: str = Field("expectancy", description="expectancy | total_r | win_rate | profit_factor")
+    workers: Optional[int] = Field(None, ge=1, le=64, description="进程数，默认且最多为 min(SWEEP_WORKERS, CPU 数)")
@@ -0,0 +1,341 @@
+"""
+分片扫描：按一致性哈希把交易对分给多个扫描 worker（进程或实例），共用 DATA_DIR。
+
+- 每个 worker 以 SHARD_ID 标识，每轮把自己的状态写到 DATA_DIR/shards/{id}.json（心跳）
+- 成员列表取 SHARD_NODES（静态），未配置时取心跳未过期的 worker（动态增减）
+- 增删一个 worker 只会移动约 1/N 的交易对（虚拟节点的一致性哈希环）
+- 动态模式下成员变化后的一两轮可能有重叠扫描；CSV 追加是幂等的，压缩整理时去重
+- worker 启动时先写心跳、等同伴登记（SHARD_JOIN_GRACE_SEC）再计算归属，避免第一轮各自扫全量
+
+API 进程与分片 worker 的状态：
+- /scan/status 汇总所有分片的心跳
+- worker 把 K 线喂给的是各自进程里的缓存 / 环形缓冲 / 告警 / 跨品种分析。有存活的其他分片时，
+  API 进程的 ShardFollower 每 SHARD_FOLLOW_SEC 读回落盘变化的序列，喂给本进程的 candle_cache
+  （连带 /history）、watch（告警按收盘价触发）并刷新 /analytics/cross，延迟最多一个跟随周期
+- 仍只在本进程生效的：/scan/start、/scan/stop（只控制本进程的扫描器）、/books/*、/sweep、
+  /debug/profile*；worker 各自的 AIMD 并发与重试队列只体现在心跳里
+
+本地多进程：
+    python -m app.shard local --workers 3      # 起 3 个无 HTTP 的扫描 worker
+    python -m app.shard worker --id w1         # 单独起一个 worker
+"""
+import argparse
+import asyncio
+import bisect
+import hashlib
+import json
+import os
+import signal
+import subprocess
+import sys
+import time
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from .config import (
+    DATA_DIR, SHARD_ID, SHARD_NODES, SHARD_VNODES, SHARD_HEARTBEAT_TTL_SEC, SHARD_JOIN_GRACE_SEC,
+    SHARD_FOLLOW_SEC, SCAN_BARS,
+)
+
+SHARDS_DIR = os.path.join(DATA_DIR, "shards")
+
+
+def _hash(key: str) -> int:
+    return int.from_bytes(hashlib.md5(key.encode("utf-8")).digest()[:8], "big")
+
+
+class HashRing:
+    """一致性哈希环：每个节点放 vnodes 个虚拟点，key 归顺时针遇到的第一个点。"""
+    def __init__(self, nodes: Iterable[str], vnodes: int = SHARD_VNODES):
+        self.nodes = sorted(set(nodes))
+        points = sorted((_hash(f"{node}#{i}"), node) for node in self.nodes for i in range(vnodes))
+        self._keys = [p for p, _ in points]
+        self._owners = [n for _, n in points]
+
+    def owner(self, key: str) -> Optional[str]:
+        if not self._keys:
+            return None
+        i = bisect.bisect(self._keys, _hash(key)) % len(self._keys)
+        return self._owners[i]
+
+    def assign(self, keys: Iterable[str]) -> Dict[str, List[str]]:
+        out: Dict[str, List[str]] = {n: [] for n in self.nodes}
+        for k in keys:
+            out[self.owner(k)].append(k)
+        return out
+
+
+def _heartbeat_path(shard_id: str) -> str:
+    return os.path.join(SHARDS_DIR, f"{shard_id}.json")
+
+
+def read_heartbeats() -> Dict[str, Dict]:
+    out: Dict[str, Dict] = {}
+    if not os.path.isdir(SHARDS_DIR):
+        return out
+    now = time.time()
+    for name in os.listdir(SHARDS_DIR):
+        if not name.endswith(".json"):
+            continue
+        try:
+            with open(os.path.join(SHARDS_DIR, name), "r", encoding="utf-8") as f:
+                hb = json.load(f)
+        except (OSError, ValueError):
+            continue
+        hb["alive"] = now - hb.get("updated_at", 0) <= SHARD_HEARTBEAT_TTL_SEC
+        out[hb.get("shard_id", name[:-5])] = hb
+    return out
+
+
+class ShardMember:
+    """当前进程在分片环中的身份：决定本进程负责哪些交易对，并写心跳。"""
+    def __init__(self, shard_id: str, static_nodes: Optional[List[str]] = None):
+        self.shard_id = shard_id
+        self.static_nodes = static_nodes or []
+        self.nodes: List[str] = []
+        self.moved: int = 0         # 成员变化时本分片新增/移出的交易对数累计
+        self._owned: List[str] = []
+        self.left = False
+
+    def members(self) -> List[str]:
+        if self.static_nodes:
+            return sorted(set(self.static_nodes))
+        alive = [sid for sid, hb in read_heartbeats().items() if hb["alive"]]
+        return sorted(set(alive) | {self.shard_id})
+
+    def owned(self, universe: List[str]) -> List[str]:
+        self.nodes = self.members()
+        ring = HashRing(self.nodes)
+        owned = [s for s in universe if ring.owner(s) == self.shard_id]
+        self.moved += len(set(owned) ^ set(self._owned)) if self._owned else 0
+        self._owned = owned
+        return owned
+
+    async def join(self, status: Dict):
+        """首轮扫描前登记心跳；动态成员时等同伴也登记上，再由调用方计算归属。"""
+        await asyncio.to_thread(self.heartbeat, status)
+        if not self.static_nodes:
+            await asyncio.sleep(SHARD_JOIN_GRACE_SEC)
+
+    def heartbeat(self, status: Dict):
+        if self.left:
+            return
+        os.makedirs(SHARDS_DIR, exist_ok=True)
+        hb = {"shard_id": self.shard_id, "pid": os.getpid(), "nodes": self.nodes, "moved": self.moved,
+              "updated_at": time.time(), "status": status}
+        tmp = _heartbeat_path(self.shard_id) + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(hb, f, ensure_ascii=False)
+        os.replace(tmp, _heartbeat_path(self.shard_id))
+        if self.left:
+            # 写心跳的线程与 leave() 交错时，不留下过期心跳
+            self.leave()
+
+    def leave(self):
+        self.left = True
+        try:
+            os.remove(_heartbeat_path(self.shard_id))
+        except FileNotFoundError:
+            pass
+
+
+def aggregate_status() -> Optional[Dict]:
+    """汇总所有分片心跳；没有任何分片时返回 None（单进程模式）。"""
+    hbs = read_heartbeats()
+    if not hbs:
+        return None
+    alive = {sid: hb for sid, hb in hbs.items() if hb["alive"]}
+    totals = {"symbols": 0, "processed_batches": 0, "candles_total": 0, "candles_per_sec": 0.0,
+              "failed": 0, "retry_queue": 0}
+    for hb in alive.values():
+        st = hb.get("status", {})
+        tp = st.get("throughput", {})
+        totals["symbols"] += len(st.get("symbols", []))
+        totals["processed_batches"] += st.get("processed_batches", 0)
+        totals["candles_total"] += tp.get("candles_total", 0)
+        totals["candles_per_sec"] += tp.get("candles_per_sec_ewma") or 0.0
+        totals["failed"] += st.get("failed", 0)
+        totals["retry_queue"] += st.get("retry_queue", 0)
+    totals["candles_per_sec"] = round(totals["candles_per_sec"], 1)
+    return {
+        "shards_alive": sorted(alive),
+        "shards_dead": sorted(set(hbs) - set(alive)),
+        "totals": totals,
+        "shards": {sid: {"alive": hb["alive"], "pid": hb.get("pid"), "updated_at": hb.get("updated_at"),
+                         "moved": hb.get("moved"), "symbols": hb.get("status", {}).get("symbols", []),
+                         "running": hb.get("status", {}).get("running"),
+                         "throughput": hb.get("status", {}).get("throughput", {}),
+                         "concurrency": hb.get("status", {}).get("concurrency", {})}
+                   for sid, hb in sorted(hbs.items())},
+    }
+
+
+def member_from_env() -> Optional[ShardMember]:
+    return ShardMember(SHARD_ID, SHARD_NODES) if SHARD_ID else None
+
+
+# =========================
+# API 进程：读回分片 worker 的落盘结果
+# =========================
+class ShardFollower:
+    """
+    有存活的其他分片时，按活跃 CSV 的签名找出落盘有变化的序列，读最近 tail 根：
+    并入 candle_cache（同时写入 history 环形缓冲）、最新收盘价喂给 watch，有更新时刷新 analytics。
+    读盘在线程里，合并回到事件循环（与扫描器写入本进程状态的方式相同）。
+    """
+    def __init__(self, interval_sec: float = SHARD_FOLLOW_SEC, tail: int = max(SCAN_BARS.values(), default=150)):
+        self.running: bool = False
+        self._task: asyncio.Task | None = None
+        self.interval_sec = interval_sec
+        self.tail = tail
+        self.self_id: Optional[str] = None
+        self._sigs: Dict[Tuple[str, str], Tuple[int, int]] = {}
+        self.following: List[str] = []
+        self.cycles: int = 0
+        self.series_updated: int = 0
+        self.last_error: Optional[str] = None
+
+    def _read_changed(self, skip: set) -> List[Tuple[str, str, List[List[str]], float]]:
+        from .storage import list_series, read_candles, series_signature
+
+        out = []
+        for (inst, bar), item in list_series().items():
+            if not item["active"] or inst in skip:
+                continue
+            sig = series_signature(inst, bar)
+            if sig is None or self._sigs.get((inst, bar)) == sig:
+                continue
+            rows = read_candles(inst, bar, self.tail)
+            self._sigs[(inst, bar)] = sig
+            if rows:
+                out.append((inst, bar, rows, max(0.0, time.time() - sig[1] / 1e9)))
+        return out
+
+    async def run_once(self) -> int:
+        from .cache import candle_cache
+        from .alerts import watch
+        from .analytics import analytics
+        from .scan import scanner
+
+        hbs = await asyncio.to_thread(read_heartbeats)
+        self.following = sorted(sid for sid, hb in hbs.items() if hb["alive"] and sid != self.self_id)
+        if not self.following:
+            return 0
+        # 本进程自己在扫的交易对已经直接写进了本进程状态
+        skip = set(scanner.symbols) if scanner.running else set()
+        changed = await asyncio.to_thread(self._read_changed, skip)
+        for inst, bar, rows, age in changed:
+            candle_cache.merge(inst, bar, list(reversed(rows)), source="shard", updated=time.monotonic() - age)
+            try:
+                watch.on_tick(inst, float(rows[-1][4]))
+            except (TypeError, ValueError, IndexError):
+                pass
+        if changed:
+            await analytics.refresh_all_async()
+        self.series_updated += len(changed)
+        return len(changed)
+
+    async def _runner(self):
+        try:
+            while self.running:
+                try:
+                    await self.run_once()
+                    self.last_error = None
+                except Exception as e:
+                    # 单轮失败不影响下一轮
+                    self.last_error = str(e)
+                self.cycles += 1
+                await asyncio.sleep(self.interval_sec)
+        except asyncio.CancelledError:
+            pass
+
+    def start(self, self_id: Optional[str] = None):
+        if self.running:
+            return
+        self.self_id = self_id
+        self.running = True
+        self._task = asyncio.create_task(self._runner())
+
+    def stop(self):
+        if not self.running:
+            return
+        self.running = False
+        if self._task:
+            self._task.cancel()
+            self._task = None
+
+    def status(self) -> Dict:
+        return {"running": self.running, "following": self.following, "interval_sec": self.interval_sec,
+                "cycles": self.cycles, "series_updated": self.series_updated, "last_error": self.last_error}
+
+
+follower = ShardFollower()
+
+
+# =========================
+# 命令行：无 HTTP 的扫描 worker / 本地多进程
+# =========================
+async def _run_worker(shard_id: str):
+    from .scan import scanner
+
+    member = ShardMember(shard_id, SHARD_NODES)
+    scanner.set_shard(member)
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            # SIGTERM（terminate / 容器停止）与 Ctrl-C 一样正常退出，保证 leave() 删掉心跳
+            loop.add_signal_handler(sig, stop.set)
+        except (NotImplementedError, RuntimeError):
+            pass
+    scanner.start()
+    try:
+        await stop.wait()
+    finally:
+        scanner.stop()
+        member.leave()
+
+
+def _interrupt(_signum, _frame):
+    raise KeyboardInterrupt
+
+
+def main(argv: Optional[List[str]] = None):
+    ap = argparse.ArgumentParser(prog="python -m app.shard")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    w = sub.add_parser("worker", help="run one headless scanner shard")
+    w.add_argument("--id", default=SHARD_ID or f"w{os.getpid()}")
+    loc = sub.add_parser("local", help="spawn N local worker processes")
+    loc.add_argument("--workers", type=int, default=2)
+    args = ap.parse_args(argv)
+
+    if args.cmd == "worker":
+        try:
+            asyncio.run(_run_worker(args.id))
+        except KeyboardInterrupt:
+            pass
+        return
+
+    # 父进程收到 SIGTERM 时同 Ctrl-C 一样转给子进程并等待
+    signal.signal(signal.SIGINT, signal.default_int_handler)
+    signal.signal(signal.SIGTERM, _interrupt)
+    procs = [subprocess.Popen([sys.executable, "-m", "app.shard", "worker", "--id", f"w{i}"],
+                              env={**os.environ, "SHARD_ID": f"w{i}"})
+             for i in range(args.workers)]
+    try:
+        for p in procs:
+            p.wait()
+    except KeyboardInterrupt:
+        # 子进程按 SIGINT 正常退出（删心跳），等它们结束；超时未退的再 terminate
+        for p in procs:
+            if p.poll() is None:
+                p.send_signal(signal.SIGINT)
+        for p in procs:
+            try:
+                p.wait(timeout=15)
+            except subprocess.TimeoutExpired:
+                p.terminate()
+                p.wait()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,28 +1,449 @@
+import bisect
 import os
+import re
 import csv
-from typing import Dict, List
-from .config import DATA_DIR
+import io
+import gzip
+import threading
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Optional, Tuple
+from .config import DATA_DIR, COMPRESSION
 
 os.makedirs(DATA_DIR, exist_ok=True)
 
+HEADER = ["ts", "open", "high", "low", "close", "vol", "volCcy", "volCcyQuote", "confirm"]
+
+# 文件布局：
+#   {inst}_{bar}.csv                         活跃段（扫描器追加写入）
+#   {inst}_{bar}.{first_ts}-{last_ts}.csv.zst  压缩后的不可变历史段（或 .csv.gz）
+_NAME_RE = re.compile(
+    r"^(?P<inst>.+)_(?P<bar>\d+[A-Za-z]+)(?:\.(?P<first>\d+)-(?P<last>\d+))?\.csv(?P<ext>\.gz|\.zst)?$"
+)
+
+try:
+    import fcntl
+except ImportError:  # 非 POSIX（本地 Windows 调试）只做进程内互斥
+    fcntl = None
+
+# 写入与压缩可能在不同线程（压缩走 to_thread），也可能在不同进程（分片扫描 worker）。
+# 按序列 (inst, bar) 分别串行化：进程内 RLock + 进程间 flock（同一线程重入时只在最外层加一次）。
+# 不同序列互不阻塞：整理 / 形态检索 / 寻优读全量历史时，扫描器写别的序列不用等
+_LOCK_DIR = os.path.join(DATA_DIR, ".locks")
+os.makedirs(_LOCK_DIR, exist_ok=True)
+_guard = threading.Lock()
+_series_locks: Dict[Tuple[str, str], threading.RLock] = {}
+_depth: Dict[Tuple[str, str], int] = {}
+
+
+@contextmanager
+def _locked(inst_id: str, bar: str):
+    key = (inst_id.replace("/", "-"), bar)
+    with _guard:
+        lock = _series_locks.setdefault(key, threading.RLock())
+    with lock:
+        fd = None
+        if _depth.get(key, 0) == 0 and fcntl is not None:
+            fd = os.open(os.path.join(_LOCK_DIR, f"{key[0]}_{bar}.lock"), os.O_CREAT | os.O_RDWR, 0o644)
+            fcntl.flock(fd, fcntl.LOCK_EX)
+        _depth[key] = _depth.get(key, 0) + 1
+        try:
+            yield
+        finally:
+            _depth[key] -= 1
+            if fd is not None:
+                fcntl.flock(fd, fcntl.LOCK_UN)
+                os.close(fd)
+
+
+# 变更回调（缺口索引等增量维护用）：
+#   写入后 fn(inst, bar, ts_list, sig_before, sig_after)；整理 / 删除后 fn(inst, bar, None, None, None) 表示失效
+_hooks: List[Callable] = []
+
+
+def on_change(fn: Callable) -> Callable:
+    _hooks.append(fn)
+    return fn
+
+
+def _notify(inst: str, bar: str, ts: Optional[List[int]], before=None, after=None):
+    for fn in _hooks:
+        try:
+            fn(inst, bar, ts, before, after)
+        except Exception:
+            # 回调失败不影响落盘
+            pass
+
 
 def _csv_path(inst_id: str, bar: str) -> str:
     safe_inst = inst_id.replace("/", "-")
     return os.path.join(DATA_DIR, f"{safe_inst}_{bar}.csv")
 
 
+def _segment_path(inst_id: str, bar: str, first_ts: str, last_ts: str, ext: str) -> str:
+    safe_inst = inst_id.replace("/", "-")
+    return os.path.join(DATA_DIR, f"{safe_inst}_{bar}.{first_ts}-{last_ts}.csv{ext}")
+
+
 def save_candles_csv(inst_id: str, bar: str, raw: Dict) -> str:
     # OKX格式 data: [[ts, o, h, l, c, vol, volCcy, volCcyQuote, confirm], ...]
     data = raw.get("data", [])
     path = _csv_path(inst_id, bar)
-    # 若不存在则写表头
-    need_header = not os.path.exists(path)
-    with open(path, "a", newline="", encoding="utf-8") as f:
-        writer = csv.writer(f)
-        if need_header:
-            writer.writerow(["ts", "open", "high", "low", "close", "vol", "volCcy", "volCcyQuote", "confirm"])
+    with _locked(inst_id, bar):
+        before = series_signature(inst_id, bar)
+        # 若不存在则写表头
+        need_header = not os.path.exists(path)
+        with open(path, "a", newline="", encoding="utf-8") as f:
+            writer = csv.writer(f)
+            if need_header:
+                writer.writerow(HEADER)
+            for row in data:
+                # 有些字段可能缺失，统一填充长度
+                row = list(row) + [None] * (9 - len(row))
+                writer.writerow(row[:9])
+        ts = []
         for row in data:
-            # 有些字段可能缺失，统一填充长度
-            row = list(row) + [None] * (9 - len(row))
-            writer.writerow(row[:9])
+            try:
+                ts.append(int(row[0]))
+            except (ValueError, TypeError, IndexError):
+                continue
+        _notify(inst_id.replace("/", "-"), bar, ts, before, series_signature(inst_id, bar))
     return path
+
+
+def series_signature(inst_id: str, bar: str) -> Optional[Tuple[int, int]]:
+    """活跃 CSV 的 (size, mtime_ns)；用来判断别的进程是否写过。"""
+    try:
+        st = os.stat(_csv_path(inst_id, bar))
+    except FileNotFoundError:
+        return None
+    return st.st_size, st.st_mtime_ns
+
+
+# =========================
+# 压缩：zstd 优先，未安装 zstandard 时回退 gzip
+# =========================
+def _zstd():
+    try:
+        import zstandard
+        return zstandard
+    except ImportError:
+        return None
+
+
+def segment_ext() -> str:
+    if COMPRESSION == "zstd" and _zstd() is not None:
+        return ".zst"
+    return ".gz"
+
+
+def _compress(data: bytes, ext: str) -> bytes:
+    if ext == ".zst":
+        return _zstd().ZstdCompressor(level=10).compress(data)
+    return gzip.compress(data, compresslevel=6)
+
+
+def read_bytes(path: str) -> bytes:
+    """读取文件内容，.gz/.zst 自动解压。"""
+    with open(path, "rb") as f:
+        data = f.read()
+    if path.endswith(".gz"):
+        return gzip.decompress(data)
+    if path.endswith(".zst"):
+        zstd = _zstd()
+        if zstd is None:
+            raise RuntimeError("zstandard not installed, cannot read " + os.path.basename(path))
+        return zstd.ZstdDecompressor().decompress(data, max_output_size=256 * 1024 * 1024)
+    return data
+
+
+def plain_name(path: str) -> str:
+    """下载时使用的文件名（去掉压缩后缀）。"""
+    name = os.path.basename(path)
+    for ext in (".gz", ".zst"):
+        if name.endswith(ext):
+            return name[: -len(ext)]
+    return name
+
+
+def _read_rows(path: str) -> List[List[str]]:
+    text = read_bytes(path).decode("utf-8")
+    rows = []
+    for row in csv.reader(io.StringIO(text)):
+        if not row or row[0] == "ts":
+            continue
+        rows.append(row)
+    return rows
+
+
+def _dedupe(rows: List[List[str]]) -> List[List[str]]:
+    # 同一 ts 以后写入者为准，但已确认（confirm=1）的 K 线不会被未确认的覆盖；结果按 ts 升序
+    by_ts: Dict[int, List[str]] = {}
+    for row in rows:
+        try:
+            ts = int(row[0])
+        except (ValueError, IndexError):
+            continue
+        old = by_ts.get(ts)
+        if old is not None and old[8:9] == ["1"] and row[8:9] != ["1"]:
+            continue
+        by_ts[ts] = row
+    return [by_ts[ts] for ts in sorted(by_ts)]
+
+
+# =========================
+# 目录清单
+# =========================
+def list_series() -> Dict[Tuple[str, str], Dict]:
+    """扫描 DATA_DIR，返回 {(inst, bar): {"active": path|None, "segments": [(first, last, path), ...]}}。"""
+    out: Dict[Tuple[str, str], Dict] = {}
+    for name in os.listdir(DATA_DIR):
+        m = _NAME_RE.match(name)
+        if not m:
+            continue
+        key = (m.group("inst"), m.group("bar"))
+        item = out.setdefault(key, {"active": None, "segments": []})
+        path = os.path.join(DATA_DIR, name)
+        if m.group("first") is None:
+            if not m.group("ext"):
+                item["active"] = path
+        else:
+            item["segments"].append((int(m.group("first")), int(m.group("last")), path))
+    for item in out.values():
+        item["segments"].sort()
+    return out
+
+
+def read_candles(inst_id: str, bar: str, limit: Optional[int] = None) -> List[List[str]]:
+    """
+    读取某 (inst, bar) 的全部历史：压缩段 + 活跃段，透明解压、去重、按 ts 升序。
+    limit 只取最近 limit 根；只需要尾部时从最新的段往前读，读够即停。
+    """
+    safe_inst = inst_id.replace("/", "-")
+    with _locked(safe_inst, bar):
+        item = list_series().get((safe_inst, bar))
+        if not item:
+            return []
+        chunks: List[List[List[str]]] = []
+        if item["active"]:
+            chunks.append(_read_rows(item["active"]))
+        have = len(chunks[0]) if chunks else 0
+        for _first, _last, path in reversed(item["segments"]):
+            if limit is not None and have >= limit:
+                break
+            rows = _read_rows(path)
+            chunks.append(rows)
+            have += len(rows)
+    rows = _dedupe([r for chunk in reversed(chunks) for r in chunk])
+    if limit is not None:
+        rows = rows[-limit:] if limit > 0 else []
+    return rows
+
+
+def read_timestamps(inst_id: str, bar: str) -> Tuple[Optional[Tuple[int, int]], List[int]]:
+    """(活跃段签名, 全部 ts 升序)，在同一把锁内读取，保证两者一致。"""
+    with _locked(inst_id, bar):
+        sig = series_signature(inst_id, bar)
+        rows = read_candles(inst_id, bar)
+    return sig, [int(r[0]) for r in rows]
+
+
+def read_segment(path: str) -> List[List[str]]:
+    """读取单个段（压缩段或活跃段），去重、按 ts 升序。"""
+    m = _NAME_RE.match(os.path.basename(path))
+    with _locked(m.group("inst"), m.group("bar")):
+        rows = _read_rows(path)
+    return _dedupe(rows)
+
+
+# =========================
+# 压缩整理 / 保留策略 / 磁盘预算
+# =========================
+def _write_atomic(path: str, data: bytes):
+    tmp = path + ".tmp"
+    with open(tmp, "wb") as f:
+        f.write(data)
+    os.replace(tmp, path)
+
+
+# 压缩段根数缓存：{path: (mtime_ns, rows)}。段被并入迟到行后会重写，根数不再固定为 segment_rows
+_seg_rows: Dict[str, Tuple[int, int]] = {}
+
+
+def _remember_rows(path: str, n: int):
+    _seg_rows[path] = (os.stat(path).st_mtime_ns, n)
+
+
+def _segment_rows(path: str) -> int:
+    mtime = os.stat(path).st_mtime_ns
+    hit = _seg_rows.get(path)
+    if hit is None or hit[0] != mtime:
+        hit = (mtime, len(_dedupe(_read_rows(path))))
+        _seg_rows[path] = hit
+    return hit[1]
+
+
+def _csv_bytes(rows: List[List[str]]) -> bytes:
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    writer.writerow(HEADER)
+    writer.writerows(rows)
+    return buf.getvalue().encode("utf-8")
+
+
+def _merge_into_segments(safe_inst: str, bar: str, segments: List[Tuple[int, int, str]],
+                         late: List[List[str]]) -> List[Tuple[int, int, str]]:
+    """
+    把 ts 不晚于最后一个段的行并入对应的段：每行归入第一个 last >= ts 的段（段之间的空档归后一段），
+    该段重写（去重），首尾 ts 变化时换文件名。返回更新后的段列表。调用方持有该序列的锁。
+    """
+    lasts = [last for _first, last, _path in segments]
+    groups: Dict[int, List[List[str]]] = {}
+    for r in late:
+        groups.setdefault(bisect.bisect_left(lasts, int(r[0])), []).append(r)
+    out = list(segments)
+    for i, extra in groups.items():
+        _first, _last, path = out[i]
+        existing = _read_rows(path)
+        merged = _dedupe(existing + extra)
+        if merged == _dedupe(existing):
+            continue      # 只是与段内重复的行（如扫描窗口与封存范围重叠），不必重写
+        ext = ".zst" if path.endswith(".zst") else (".gz" if path.endswith(".gz") else "")
+        new_path = _segment_path(safe_inst, bar, merged[0][0], merged[-1][0], ext)
+        _write_atomic(new_path, _compress(_csv_bytes(merged), ext) if ext else _csv_bytes(merged))
+        if new_path != path:
+            os.remove(path)
+            _seg_rows.pop(path, None)
+        _remember_rows(new_path, len(merged))
+        out[i] = (int(merged[0][0]), int(merged[-1][0]), new_path)
+    return out
+
+
+def compact_series(inst_id: str, bar: str, hot_rows: int, segment_rows: int,
+                   retain_rows: Optional[int] = None) -> Dict:
+    """
+    整理单个序列：
+    - 活跃段去重排序；ts 落在已封存范围内的行并回对应的压缩段
+    - 活跃段超过 hot_rows + segment_rows 时，把最旧的整段（segment_rows 根）滚动为压缩段
+    - retain_rows 限制该周期保留的总根数（按各段实际根数计），超出则删最旧的段
+    """
+    safe_inst = inst_id.replace("/", "-")
+    stats = {"inst_id": safe_inst, "bar": bar, "rows_in": 0, "rows_out": 0,
+             "segments_rolled": 0, "segments_deleted": 0, "rows_merged": 0}
+    with _locked(safe_inst, bar):
+        item = list_series().get((safe_inst, bar)) or {"active": None, "segments": []}
+        segments = list(item["segments"])
+        active = item["active"]
+        rows: List[List[str]] = []
+        if active:
+            raw_rows = _read_rows(active)
+            stats["rows_in"] = len(raw_rows)
+            rows = _dedupe(raw_rows)
+        if segments:
+            sealed_last = segments[-1][1]
+            late = [r for r in rows if int(r[0]) <= sealed_last]
+            rows = [r for r in rows if int(r[0]) > sealed_last]
+            if late:
+                # 落在已封存范围内的行（缺口修复补回的 / 迟到的）并回所属的段，而不是丢弃
+                segments = _merge_into_segments(safe_inst, bar, segments, late)
+                stats["rows_merged"] = len(late)
+
+        ext = segment_ext()
+        while segment_rows > 0 and len(rows) >= hot_rows + segment_rows:
+            chunk, rows = rows[:segment_rows], rows[segment_rows:]
+            path = _segment_path(safe_inst, bar, chunk[0][0], chunk[-1][0], ext)
+            _write_atomic(path, _compress(_csv_bytes(chunk), ext))
+            _remember_rows(path, len(chunk))
+            segments.append((int(chunk[0][0]), int(chunk[-1][0]), path))
+            stats["segments_rolled"] += 1
+
+        if retain_rows is not None:
+            if len(rows) > retain_rows:
+                rows = rows[-retain_rows:]
+            # 按各段实际根数（并入迟到行后不再是 segment_rows）删最旧的段，直到总数不超过 retain_rows
+            counts = [_segment_rows(path) for _first, _last, path in segments]
+            total = len(rows) + sum(counts)
+            while segments and total > retain_rows:
+                path = segments.pop(0)[2]
+                total -= counts.pop(0)
+                os.remove(path)
+                _seg_rows.pop(path, None)
+                stats["segments_deleted"] += 1
+
+        if active or rows:
+            _write_atomic(active or _csv_path(safe_inst, bar), _csv_bytes(rows))
+        stats["rows_out"] = len(rows)
+        stats["segments"] = len(segments)
+        _notify(safe_inst, bar, None)
+    return stats
+
+
+# 子目录里可淘汰的文件（盘口快照、寻优报告等）：各模块注册 fn() -> [(ts_ms, path), ...]，
+# 预算超出时与 K 线压缩段一起按时间从旧到新删除。其余文件（告警 / 分片心跳等状态）只计入占用
+_evictables: List[Callable] = []
+
+
+def register_evictable(fn: Callable) -> Callable:
+    _evictables.append(fn)
+    return fn
+
+
+def disk_usage() -> Dict:
+    """DATA_DIR 总占用（含子目录）；bytes_by_bar 只统计 K 线文件，bytes_by_dir 按一级子目录统计。"""
+    total = 0
+    files = 0
+    by_bar: Dict[str, int] = {}
+    by_dir: Dict[str, int] = {}
+    for root, _dirs, names in os.walk(DATA_DIR):
+        sub = os.path.relpath(root, DATA_DIR).split(os.sep)[0]
+        for name in names:
+            try:
+                size = os.path.getsize(os.path.join(root, name))
+            except FileNotFoundError:
+                continue
+            total += size
+            files += 1
+            if sub != ".":
+                by_dir[sub] = by_dir.get(sub, 0) + size
+                continue
+            m = _NAME_RE.match(name)
+            if m:
+                by_bar[m.group("bar")] = by_bar.get(m.group("bar"), 0) + size
+    return {"total_bytes": total, "files": files, "bytes_by_bar": by_bar, "bytes_by_dir": by_dir}
+
+
+def enforce_budget(max_bytes: int) -> List[str]:
+    """总占用超出预算时，按时间从旧到新删除压缩段与子目录里可淘汰的文件（活跃段不动）。返回被删除的文件。"""
+    deleted: List[str] = []
+    total = disk_usage()["total_bytes"]
+    if total <= max_bytes:
+        return deleted
+    candidates: List[Tuple[int, str, Optional[Tuple[str, str]]]] = []
+    for (inst, bar), item in list_series().items():
+        candidates.extend((last, path, (inst, bar)) for _first, last, path in item["segments"])
+    for fn in _evictables:
+        try:
+            candidates.extend((int(ts), path, None) for ts, path in fn())
+        except Exception:
+            continue
+    candidates.sort(key=lambda c: c[0])
+    for _ts, path, key in candidates:
+        if total <= max_bytes:
+            break
+        if key is None:
+            try:
+                size = os.path.getsize(path)
+                os.remove(path)
+            except FileNotFoundError:
+                continue
+        else:
+            # 只锁被删段所属的序列
+            with _locked(*key):
+                try:
+                    size = os.path.getsize(path)
+                    os.remove(path)
+                except FileNotFoundError:
+                    continue     # 已被整理 / 保留策略删掉
+                _notify(key[0], key[1], None)
+        total -= size
+        deleted.append(path)
+    return deleted
@@ -0,0 +1,87 @@
+import asyncio
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional
+
+from .cache import candle_cache
+from .features import FeatureCache
+from .strategy_panda import evaluate_panda, scan_top as scan_top_panda
+from .strategy_custom import evaluate_custom, scan_top as scan_top_custom
+
+
+@dataclass
+class Strategy:
+    """
+    一个策略插件：
+    - evaluate(inst_id, bar, base, trend, risk_percent, funds_total, funds_split, leverage, exclude_btc_in_screen)
+      base/trend 既可以是 OKX 原始 K 线，也可以是 features.Features
+    - base_features / trend_features 声明所需指标（如 "ema:20" / "atr:14" / "swings" / "candles"），
+      同一请求里多个策略共用一份 Features，每个指标只算一次
+    """
+    name: str
+    title: str
+    evaluate: Callable
+    scan_top: Callable
+    base_features: List[str] = field(default_factory=list)
+    trend_features: List[str] = field(default_factory=list)
+
+
+REGISTRY: Dict[str, Strategy] = {}
+
+
+def register(strategy: Strategy) -> Strategy:
+    REGISTRY[strategy.name] = strategy
+    return strategy
+
+
+def get_strategy(name: str) -> Optional[Strategy]:
+    return REGISTRY.get(name)
+
+
+# —— 熊猫系统（保留，便于回退/对比）——
+register(Strategy(
+    name="panda", title="熊猫系统（EMA20/50 · 12 金K）",
+    evaluate=evaluate_panda, scan_top=scan_top_panda,
+    base_features=["ema:20", "ema:50", "atr:14", "swings", "candles"],
+    trend_features=["ema:20", "ema:50"],
+))
+
+# —— 日内交易系统（EMA21/55/144 · 定势→找位→信号）——
+register(Strategy(
+    name="custom", title="日内交易系统（EMA21/55/144）",
+    evaluate=evaluate_custom, scan_top=scan_top_custom,
+    base_features=["ema:21", "ema:55", "ema:144", "atr:14", "swings", "candles"],
+    trend_features=["ema:21", "ema:55", "ema:144"],
+))
+
+
+def run_strategy(st: Strategy, feats: FeatureCache, inst_id: str, bar: str, trend_bar: str,
+                 raw_b: Dict, raw_t: Dict, risk_percent: float, funds_total: float, funds_split: int,
+                 leverage: float, exclude_btc_in_screen: bool) -> Dict:
+    fb = feats.get(inst_id, bar, raw_b)
+    ft = feats.get(inst_id, trend_bar, raw_t)
+    if fb.n and ft.n:
+        fb.warm(st.base_features)
+        ft.warm(st.trend_features)
+    return st.evaluate(inst_id, bar, fb, ft, risk_percent, funds_total, funds_split, leverage, exclude_btc_in_screen)
+
+
+async def compare(inst_id: str, bar: str, trend_bar: str, limit: int, risk_percent: float, funds_total: float,
+                  funds_split: int, leverage: float, exclude_btc_in_screen: bool,
+                  names: Optional[List[str]] = None) -> Dict:
+    """同一标的一次拉取、一次解析，所有（或指定的）策略共用指标缓存。"""
+    selected = [REGISTRY[n] for n in (names or list(REGISTRY)) if n in REGISTRY]
+    raw_b, raw_t = await asyncio.gather(candle_cache.fetch(inst_id, bar, limit),
+                                        candle_cache.fetch(inst_id, trend_bar, limit))
+    feats = FeatureCache()
+    results = {}
+    for st in selected:
+        results[st.name] = run_strategy(st, feats, inst_id, bar, trend_bar, raw_b, raw_t, risk_percent,
+                                        funds_total, funds_split, leverage, exclude_btc_in_screen)
+    sides = {name: r.get("side") for name, r in results.items()}
+    return {
+        "inst_id": inst_id, "bar": bar, "trend_bar": trend_bar,
+        "sides": sides,
+        "consensus": next(iter(set(sides.values()))) if len(set(sides.values())) == 1 else "mixed",
+        "results": results,
+        "features_computed": feats.computed(),
+    }
@@ -2,86 +2,21 @@
 from __future__ import annotations
 from typing import Dict, List, Tuple, Optional
 from .okx import OkxClient
+from .cache import candle_cache
+from .profiling import stage
 
-# ---------------- Utilities ----------------
+# ---------------- Utilities (shared implementations live in features.py) ----------------
 
-def _f(x):
-    try:
-        return float(x)
-    except Exception:
-        return 0.0
-
-def ema(arr: List[float], period: int) -> List[float]:
-    if not arr:
-        return []
-    k = 2/(period+1)
-    out = [arr[0]]
-    for i in range(1, len(arr)):
-        out.append(arr[i]*k + out[-1]*(1-k))
-    return out
-
-def atr(high: List[float], low: List[float], close: List[float], period: int = 14) -> List[float]:
-    trs = []
-    for i in range(len(close)):
-        if i == 0:
-            trs.append(high[i] - low[i])
-        else:
-            trs.append(max(high[i]-low[i], abs(high[i]-close[i-1]), abs(low[i]-close[i-1])))
-    out = []
-    s = 0.0
-    for i, t in enumerate(trs):
-        s += t
-        if i < period:
-            out.append(s/(i+1))
-        else:
-            s = out[-1]*(period-1)/period + t/period
-            out.append(s)
-    return out
-
-# pivots (swing points)
-def pivots(h: List[float], l: List[float], left: int = 2, right: int = 2) -> Tuple[List[bool], List[bool]]:
-    n = len(h)
-    ph = [False]*n
-    pl = [False]*n
-    for i in range(left, n-right):
-        ph[i] = all(h[i] > h[i-k-1] for k in range(left)) and all(h[i] >= h[i+k+1] for k in range(right))
-        pl[i] = all(l[i] < l[i-k-1] for k in range(left)) and all(l[i] <= l[i+k+1] for k in range(right))
-    return ph, pl
-
-def last_swing_levels(h: List[float], l: List[float]) -> Tuple[Optional[float], Optional[float]]:
-    ph, pl = pivots(h, l, 2, 2)
-    last_h = last_l = None
-    for i in range(len(h)-1, -1, -1):
-        if last_h is None and ph[i]:
-            last_h = h[i]
-        if last_l is None and pl[i]:
-            last_l = l[i]
-        if last_h is not None and last_l is not None:
-            break
-    return last_h, last_l
-
-# candle patterns (minimalistic set for confirmation)
-def bullish_engulf(o1, c1, o2, c2):
-    return (c1 < o1) and (c2 > o2) and (o2 <= c1) and (c2 >= o1)
-
-def bearish_engulf(o1, c1, o2, c2):
-    return (c1 > o1) and (c2 < o2) and (o2 >= c1) and (c2 <= o1)
-
-def bull_pin(o, h, l, c):
-    body = abs(c - o)
-    lower = (min(o, c) - l)
-    rng = max(h - l, 1e-9)
-    return (c > o) and (lower > 2*body) and (c > l + 0.6*rng)
-
-def bear_pin(o, h, l, c):
-    body = abs(c - o)
-    upper = (h - max(o, c))
-    rng = max(h - l, 1e-9)
-    return (c < o) and (upper > 2*body) and (c < h - 0.6*rng)
+from .features import (
+    _f, ema, atr, pivots, last_swing_levels, as_features,
+    is_bull_engulf as bullish_engulf, is_bear_engulf as bearish_engulf,
+    is_bull_pin as bull_pin, is_bear_pin as bear_pin,
+)
 
 # determine a key zone around last swing with ATR-based width
-def compute_key_zones(h: List[float], l: List[float], c: List[float], atr14: float) -> Dict[str, Tuple[float,float]]:
-    sh, sl = last_swing_levels(h, l)
+def compute_key_zones(h: List[float], l: List[float], c: List[float], atr14: float,
+                      swings: Optional[Tuple[Optional[float], Optional[float]]] = None) -> Dict[str, Tuple[float,float]]:
+    sh, sl = swings if swings is not None else last_swing_levels(h, l)
     zones = {}
     if sl is not None:
         width = max( (h[-1]-l[-1])*0.5, atr14*0.75 )
@@ -98,11 +33,7 @@ def in_zone(price: float, zone: Tuple[float,float], tol: float = 0.25) -> bool:
 # ---------------- Data access ----------------
 
 async def fetch_candles(inst_id: str, bar: str, limit: int = 150) -> Dict:
-    c = OkxClient()
-    try:
-        return await c.candles(inst_id, bar, limit)
-    finally:
-        await c.close()
+    return await candle_cache.fetch(inst_id, bar, limit)
 
 async def fetch_tickers(inst_type: str = "SPOT") -> Dict:
     c = OkxClient()
@@ -119,26 +50,26 @@ def evaluate_custom(inst_id: str, bar: str, raw_base: Dict, raw_trend: Dict,
     if exclude_btc_in_screen and inst_id.upper().startswith("BTC-"):
         return {"inst_id": inst_id, "bar": bar, "side": "flat", "reason": "excluded_by_policy (BTC)"}
 
-    rb = list(reversed(raw_base.get("data", [])))
-    rt = list(reversed(raw_trend.get("data", [])))
-    if len(rb) < 50 or len(rt) < 50:
+    fb = as_features(raw_base)
+    ft = as_features(raw_trend)
+    if fb.n < 50 or ft.n < 50:
         return {"inst_id": inst_id, "bar": bar, "side": "flat", "reason": "insufficient candles"}
 
     # base timeframe
-    ob = [_f(r[1]) for r in rb]; hb = [_f(r[2]) for r in rb]; lb = [_f(r[3]) for r in rb]; cb = [_f(r[4]) for r in rb]
+    hb = fb.h; lb = fb.l; cb = fb.c
     # trend timeframe
-    ot = [_f(r[1]) for r in rt]; ht = [_f(r[2]) for r in rt]; lt = [_f(r[3]) for r in rt]; ct = [_f(r[4]) for r in rt]
+    ct = ft.c
 
     # indicators
-    ema21_b = ema(cb, 21)[-1] if len(cb)>=21 else cb[-1]
-    ema55_b = ema(cb, 55)[-1] if len(cb)>=55 else cb[-1]
-    ema144_b = ema(cb,144)[-1] if len(cb)>=144 else cb[-1]
+    ema21_b = fb.ema(21)[-1] if len(cb)>=21 else cb[-1]
+    ema55_b = fb.ema(55)[-1] if len(cb)>=55 else cb[-1]
+    ema144_b = fb.ema(144)[-1] if len(cb)>=144 else cb[-1]
 
-    ema21_t = ema(ct, 21)[-1] if len(ct)>=21 else ct[-1]
-    ema55_t = ema(ct, 55)[-1] if len(ct)>=55 else ct[-1]
-    ema144_t= ema(ct,144)[-1] if len(ct)>=144 else ct[-1]
+    ema21_t = ft.ema(21)[-1] if len(ct)>=21 else ct[-1]
+    ema55_t = ft.ema(55)[-1] if len(ct)>=55 else ct[-1]
+    ema144_t= ft.ema(144)[-1] if len(ct)>=144 else ct[-1]
 
-    atr14_b = atr(hb, lb, cb, 14)[-1] if len(cb)>=14 else max(hb[-1]-lb[-1], 1e-9)
+    atr14_b = fb.atr(14)[-1] if len(cb)>=14 else max(hb[-1]-lb[-1], 1e-9)
     price   = cb[-1]
 
     # 定势（趋势过滤）
@@ -147,18 +78,17 @@ def evaluate_custom(inst_id: str, bar: str, raw_base: Dict, raw_trend: Dict,
     trend_flag = "up" if trend_up else ("down" if trend_down else "neutral")
 
     # 找位（关键区）
-    zones = compute_key_zones(hb, lb, cb, atr14_b)
+    zones = compute_key_zones(hb, lb, cb, atr14_b, fb.swing_levels())
     long_zone  = zones.get("long_zone")
     short_zone = zones.get("short_zone")
     near_long  = in_zone(price, long_zone) if long_zone else False
     near_short = in_zone(price, short_zone) if short_zone else False
 
     # 信号（形态确认）
+    flags = fb.candle_flags()
     if len(cb) >= 2:
-        o1,c1,h1,l1 = ob[-2], cb[-2], hb[-2], lb[-2]
-        o2,c2,h2,l2 = ob[-1], cb[-1], hb[-1], lb[-1]
-        long_sig  = bullish_engulf(o1,c1,o2,c2) or bull_pin(o2,h2,l2,c2)
-        short_sig = bearish_engulf(o1,c1,o2,c2) or bear_pin(o2,h2,l2,c2)
+        long_sig  = flags["bull_engulf"] or flags["bull_pin"]
+        short_sig = flags["bear_engulf"] or flags["bear_pin"]
     else:
         long_sig = short_sig = False
 
@@ -237,7 +167,8 @@ def evaluate_custom(inst_id: str, bar: str, raw_base: Dict, raw_trend: Dict,
 async def scan_top(inst_type: str = "SPOT", top: int = 5, bar: str = "15m", trend_bar: str = "1H", limit: int = 150,
                    exclude_btc_in_screen: bool = True, funds_total: float = 694.0, funds_split: int = 7,
                    leverage: float = 5.0, risk_percent: float = 2.0) -> Dict:
-    ticks = await fetch_tickers(inst_type)
+    with stage("fetch_tickers"):
+        ticks = await fetch_tickers(inst_type)
     rows = ticks.get("data", [])
     items = []
     for r in rows:
@@ -254,8 +185,10 @@ async def scan_top(inst_type: str = "SPOT", top: int = 5, bar: str = "15m", tren
 
     table = []
     for inst_id in selected:
-        raw_b = await fetch_candles(inst_id, bar, limit)
-        raw_t = await fetch_candles(inst_id, trend_bar, limit)
-        table.append(evaluate_custom(inst_id, bar, raw_b, raw_t, risk_percent, funds_total, funds_split, leverage, exclude_btc_in_screen))
+        with stage("fetch_candles"):
+            raw_b = await fetch_candles(inst_id, bar, limit)
+            raw_t = await fetch_candles(inst_id, trend_bar, limit)
+        with stage("evaluate"):
+            table.append(evaluate_custom(inst_id, bar, raw_b, raw_t, risk_percent, funds_total, funds_split, leverage, exclude_btc_in_screen))
 
     return {"selected": selected, "table": table}
@@ -0,0 +1,496 @@
+"""
+参数寻优：在落盘历史上对策略参数做网格 / 随机搜索，多进程并行回测，结果排名后持久化。
+
+- 候选组合：panda（EMA 快/慢、止损/止盈 ATR 倍数、摆动点左右根数）、
+  custom（EMA 三线、关键区宽度、止损/止盈 ATR 倍数、摆动点左右根数）
+- 父进程对每个交易对只算一次各组合共用的指标（每个 EMA 周期一次、每组摆动点参数一次、gold12 掩码一次），
+  放进一块只读共享内存（multiprocessing.shared_memory），子进程直接映射，不复制 K 线
+- 回测口径：信号出现的那根收盘价入场，之后 max_hold 根内先触及止损记 -1R、先触及止盈记 +TP/风险，
+  同一根同时触及按止损算；都没触及按到期收盘价平仓。结果以 R 倍数统计
+- 报告写入 DATA_DIR/sweeps/{id}.json
+"""
+import asyncio
+import itertools
+import json
+import multiprocessing
+import os
+import random
+import threading
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+from typing import Any, Dict, List, Optional
+
+from .config import DATA_DIR, SWEEP_WORKERS, SWEEP_MAX_CONFIGS, bar_ms
+from .features import _f, ema, atr
+from .history import _np
+from .patterns import PATTERNS, pattern_masks
+from .storage import read_candles, register_evictable
+
+SWEEPS_DIR = os.path.join(DATA_DIR, "sweeps")
+
+# 默认参数空间；BASELINES 为两个评估器当前写死的取值
+SPACES: Dict[str, Dict[str, List[float]]] = {
+    "panda": {
+        "ema_fast": [10, 20, 30], "ema_slow": [50, 100],
+        "stop_atr": [0.5, 1.0, 1.5], "tp_atr": [1.5, 2.0, 3.0],
+        "pivot_left": [2, 3], "pivot_right": [2, 3],
+    },
+    "custom": {
+        "ema_fast": [13, 21], "ema_mid": [34, 55], "ema_slow": [100, 144],
+        "zone_atr": [0.5, 0.75, 1.0], "stop_atr": [0.5, 1.0, 1.5], "tp_atr": [1.5, 2.0, 3.0],
+        "pivot_left": [2, 3], "pivot_right": [2, 3],
+    },
+}
+BASELINES: Dict[str, Dict[str, float]] = {
+    "panda": {"ema_fast": 20, "ema_slow": 50, "stop_atr": 1.0, "tp_atr": 2.0, "pivot_left": 2, "pivot_right": 2},
+    "custom": {"ema_fast": 21, "ema_mid": 55, "ema_slow": 144, "zone_atr": 0.75, "stop_atr": 1.0, "tp_atr": 2.0,
+               "pivot_left": 2, "pivot_right": 2},
+}
+METRICS = ("expectancy", "total_r", "win_rate", "profit_factor")
+_INT_PARAMS = {"ema_fast", "ema_mid", "ema_slow", "pivot_left", "pivot_right"}
+_EMA_PARAMS = ("ema_fast", "ema_mid", "ema_slow")
+_MIN_BARS = 50      # 与评估器一致：不足 50 根不出信号
+
+
+def _normalize(cfg: Dict[str, float]) -> Dict[str, float]:
+    return {k: int(v) if k in _INT_PARAMS else float(v) for k, v in sorted(cfg.items())}
+
+
+def _valid(cfg: Dict[str, float]) -> bool:
+    periods = [cfg[k] for k in _EMA_PARAMS if k in cfg]
+    return all(a < b for a, b in zip(periods, periods[1:])) and cfg.get("stop_atr", 1) > 0 and cfg.get("tp_atr", 1) > 0
+
+
+def expand_space(strategy: str, space: Optional[Dict[str, List[float]]] = None, mode: str = "grid",
+                 samples: int = 200, seed: int = 0) -> List[Dict[str, float]]:
+    """展开参数空间；基线组合总会包含在内，便于对比。"""
+    if strategy not in SPACES:
+        raise ValueError(f"unknown strategy for sweep: {strategy}; available: {sorted(SPACES)}")
+    full = {**SPACES[strategy], **(space or {})}
+    unknown = set(full) - set(SPACES[strategy])
+    if unknown:
+        raise ValueError(f"unknown parameters for {strategy}: {sorted(unknown)}")
+    keys = sorted(full)
+    if mode == "grid":
+        total = 1
+        for k in keys:
+            total *= len(full[k])
+        if total > SWEEP_MAX_CONFIGS:
+            raise ValueError(f"grid has {total} configs (> SWEEP_MAX_CONFIGS={SWEEP_MAX_CONFIGS}); use mode=random")
+        configs = [dict(zip(keys, vals)) for vals in itertools.product(*(full[k] for k in keys))]
+    elif mode == "random":
+        rng = random.Random(seed)
+        configs = [{k: rng.choice(full[k]) for k in keys} for _ in range(min(samples, SWEEP_MAX_CONFIGS))]
+    else:
+        raise ValueError("mode must be grid or random")
+    out: Dict[str, Dict[str, float]] = {}
+    for cfg in configs + [BASELINES[strategy]]:
+        cfg = _normalize(cfg)
+        if _valid(cfg):
+            out.setdefault(json.dumps(cfg, sort_keys=True), cfg)
+    return list(out.values())
+
+
+# =========================
+# 父进程：每个交易对的共用指标 -> 共享内存
+# =========================
+def _ohlc(rows: List[List[str]]):
+    np = _np()
+    try:
+        arr = np.array([r[:5] for r in rows], dtype=np.float64)
+    except ValueError:
+        arr = np.array([[_f(x) for x in r[:5]] for r in rows], dtype=np.float64)
+    return arr
+
+
+def _swing_levels(h, l, left: int, right: int):
+    """逐根的“最近已确认摆动高/低点”：第 k 根是摆动点需要其后 right 根，因此在 k+right 处才可见（与 pivots() 口径一致）。"""
+    np = _np()
+    n = len(h)
+    sh = np.full(n, np.nan)
+    sl = np.full(n, np.nan)
+    if n > left + right:
+        idx = np.arange(left, n - right)
+        ph = np.ones(len(idx), dtype=bool)
+        pl = np.ones(len(idx), dtype=bool)
+        for k in range(left):
+            ph &= h[idx] > h[idx - k - 1]
+            pl &= l[idx] < l[idx - k - 1]
+        for k in range(right):
+            ph &= h[idx] >= h[idx + k + 1]
+            pl &= l[idx] <= l[idx + k + 1]
+        sh[idx[ph] + right] = h[idx[ph]]
+        sl[idx[pl] + right] = l[idx[pl]]
+    for a in (sh, sl):
+        pos = np.where(np.isnan(a), -1, np.arange(n))
+        np.maximum.accumulate(pos, out=pos)
+        a[:] = np.where(pos >= 0, a[np.maximum(pos, 0)], np.nan)
+    return sh, sl
+
+
+def _prepare_series(inst_id: str, bar: str, trend_bar: Optional[str], configs: List[Dict[str, float]]):
+    """读盘并计算一个交易对的共用指标，写入共享内存。返回 (spec, shm)；历史不足时返回 None。"""
+    np = _np()
+    rows = read_candles(inst_id, bar)
+    if len(rows) < _MIN_BARS + 2:
+        return None
+    base = _ohlc(rows)
+    ts, o, h, l, c = base.T
+    periods = sorted({int(cfg[k]) for cfg in configs for k in _EMA_PARAMS if k in cfg})
+    pivots = sorted({(int(cfg["pivot_left"]), int(cfg["pivot_right"])) for cfg in configs})
+
+    block: Dict[str, Any] = {"ts": ts, "o": o, "h": h, "l": l, "c": c}
+    block["atr"] = np.array(atr(h.tolist(), l.tolist(), c.tolist(), 14))
+    block["lo5"] = np.lib.stride_tricks.sliding_window_view(np.concatenate([np.full(4, np.inf), l]), 5).min(axis=1)
+    block["hi5"] = np.lib.stride_tricks.sliding_window_view(np.concatenate([np.full(4, -np.inf), h]), 5).max(axis=1)
+    for p in periods:
+        block[f"ema:{p}"] = np.array(ema(c.tolist(), p))
+    for left, right in pivots:
+        block[f"sh:{left}:{right}"], block[f"sl:{left}:{right}"] = _swing_levels(h, l, left, right)
+    for name, mask in zip(PATTERNS, pattern_masks(o, h, l, c)):
+        block[f"m:{name}"] = mask.astype(np.float64)
+
+    # 趋势周期：用“收盘时间不晚于本根收盘”的最后一根趋势 K 线的 EMA；无数据时与信号周期共用同一行
+    alias: Dict[str, str] = {}
+    trend_rows = read_candles(inst_id, trend_bar) if trend_bar and trend_bar != bar else []
+    if len(trend_rows) >= _MIN_BARS:
+        tr = _ohlc(trend_rows)
+        pos = np.searchsorted(tr[:, 0] + bar_ms(trend_bar), ts + bar_ms(bar), side="right") - 1
+        for p in periods:
+            t_ema = np.array(ema(tr[:, 4].tolist(), p))
+            block[f"tema:{p}"] = np.where(pos >= 0, t_ema[np.maximum(pos, 0)], np.nan)
+    else:
+        alias = {f"tema:{p}": f"ema:{p}" for p in periods}
+
+    names = list(block)
+    shm = shared_memory.SharedMemory(create=True, size=len(names) * len(ts) * 8)
+    arr = np.ndarray((len(names), len(ts)), dtype=np.float64, buffer=shm.buf)
+    for i, name in enumerate(names):
+        arr[i] = block[name]
+    rowmap = {name: i for i, name in enumerate(names)}
+    rowmap.update({a: rowmap[b] for a, b in alias.items()})
+    del arr
+    spec = {"inst_id": inst_id, "name": shm.name, "shape": (len(names), len(ts)), "rows": rowmap,
+            "trend_aligned": not alias}
+    return spec, shm
+
+
+# =========================
+# 子进程：映射共享内存，逐组合向量化回测
+# =========================
+def _walk(idx, entry, stop, tp, c, win_l, win_h, hold: int, long: bool):
+    """向量化前向检查：返回 (R 倍数, 信号行号)，丢弃风险非正或尚未走完的信号。"""
+    np = _np()
+    n = len(c)
+    e, s, t = entry[idx], stop[idx], tp[idx]
+    if long:
+        risk = e - s
+        hs = win_l[idx] <= s[:, None]
+        ht = win_h[idx] >= t[:, None]
+    else:
+        risk = s - e
+        hs = win_h[idx] >= s[:, None]
+        ht = win_l[idx] <= t[:, None]
+    fs = np.where(hs.any(axis=1), hs.argmax(axis=1), hold)
+    ft = np.where(ht.any(axis=1), ht.argmax(axis=1), hold)
+    sign = 1.0 if long else -1.0
+    with np.errstate(invalid="ignore", divide="ignore"):
+        timeout = sign * (c[np.minimum(idx + hold, n - 1)] - e) / risk
+        r = np.where(fs <= ft, np.where(fs < hold, -1.0, timeout), sign * (t - e) / risk)
+    keep = (risk > 0) & ((fs < hold) | (ft < hold) | (idx + hold <= n - 1))
+    return r[keep], idx[keep]
+
+
+def _signals(strategy: str, cfg: Dict[str, float], g):
+    np = _np()
+    c, h, l, a = g("c"), g("h"), g("l"), g("atr")
+    m = lambda name: g(f"m:{name}") > 0.5
+    sh, sl = g(f"sh:{cfg['pivot_left']}:{cfg['pivot_right']}"), g(f"sl:{cfg['pivot_left']}:{cfg['pivot_right']}")
+    with np.errstate(invalid="ignore"):
+        if strategy == "panda":
+            tf, ts_ = g(f"tema:{cfg['ema_fast']}"), g(f"tema:{cfg['ema_slow']}")
+            up, down = tf > ts_, tf < ts_
+            bull = m("bull_engulf") | m("bull_pin") | m("piercing") | m("three_white_soldiers") | (c > sh)
+            bear = m("bear_engulf") | m("bear_pin") | m("dark_cloud") | m("three_black_crows") | (c < sl)
+            long, short = up & bull, down & bear
+            stop_long = np.minimum(g("lo5"), c - cfg["stop_atr"] * a)
+            stop_short = np.maximum(g("hi5"), c + cfg["stop_atr"] * a)
+        else:
+            tf, tm, tsl = (g(f"tema:{cfg[k]}") for k in _EMA_PARAMS)
+            ef = g(f"ema:{cfg['ema_fast']}")
+            up = (tf > tm) & (tm > tsl) & (c >= ef)
+            down = (tf < tm) & (tm < tsl) & (c <= ef)
+            half = np.maximum((h - l) * 0.5, a * cfg["zone_atr"]) * 0.5
+            near_long = (c >= sl - half) & (c <= sl + half)
+            near_short = (c >= sh - half) & (c <= sh + half)
+            long = up & near_long & (m("bull_engulf") | m("bull_pin"))
+            short = down & near_short & (m("bear_engulf") | m("bear_pin"))
+            stop_long = np.minimum(np.minimum(sl - half, g("lo5")), c - cfg["stop_atr"] * a)
+            stop_short = np.maximum(np.maximum(sh + half, g("hi5")), c + cfg["stop_atr"] * a)
+    tp_long = c + cfg["tp_atr"] * a
+    tp_short = c - cfg["tp_atr"] * a
+    return long, short, stop_long, tp_long, stop_short, tp_short
+
+
+def _stats(r, ts) -> Dict[str, Any]:
+    np = _np()
+    if not len(r):
+        return {"trades": 0, "win_rate": None, "expectancy": None, "total_r": 0.0, "profit_factor": None,
+                "max_drawdown_r": 0.0}
+    r = r[np.argsort(ts, kind="stable")]
+    pos, neg = r[r > 0].sum(), -r[r < 0].sum()
+    equity = np.cumsum(r)
+    return {
+        "trades": int(len(r)),
+        "win_rate": round(float((r > 0).mean()), 4),
+        "expectancy": round(float(r.mean()), 4),
+        "total_r": round(float(r.sum()), 3),
+        "profit_factor": round(float(pos / neg), 3) if neg > 0 else None,
+        "max_drawdown_r": round(float((np.maximum.accumulate(equity) - equity).max()), 3),
+    }
+
+
+def _score(strategy: str, cfg: Dict[str, float], series, hold: int) -> Dict[str, Any]:
+    np = _np()
+    warmup = max(_MIN_BARS, *(int(cfg[k]) for k in _EMA_PARAMS if k in cfg))
+    rs, tss = [], []
+    longs = shorts = 0
+    for spec, arr in series:
+        rows = spec["rows"]
+        g = lambda name: arr[rows[name]]
+        c, h, l = g("c"), g("h"), g("l")
+        pad = np.full(hold, np.nan)
+        win_l = np.lib.stride_tricks.sliding_window_view(np.concatenate([l[1:], pad]), hold)
+        win_h = np.lib.stride_tricks.sliding_window_view(np.concatenate([h[1:], pad]), hold)
+        long, short, stop_long, tp_long, stop_short, tp_short = _signals(strategy, cfg, g)
+        long[:warmup] = False
+        short[:warmup] = False
+        for mask, stop, tp, is_long in ((long, stop_long, tp_long, True), (short, stop_short, tp_short, False)):
+            r, idx = _walk(np.flatnonzero(mask), c, stop, tp, c, win_l, win_h, hold, is_long)
+            rs.append(r)
+            tss.append(g("ts")[idx])
+            if is_long:
+                longs += len(r)
+            else:
+                shorts += len(r)
+    st = _stats(np.concatenate(rs) if rs else np.zeros(0), np.concatenate(tss) if tss else np.zeros(0))
+    return {"params": cfg, **st, "longs": longs, "shorts": shorts}
+
+
+def _view(spec: Dict, shm: shared_memory.SharedMemory):
+    np = _np()
+    arr = np.ndarray(spec["shape"], dtype=np.float64, buffer=shm.buf)
+    arr.flags.writeable = False
+    return arr
+
+
+def _run_chunk(strategy: str, configs: List[Dict[str, float]], specs: List[Dict], hold: int) -> List[Dict]:
+    """子进程入口：映射全部交易对的共享内存（只读），逐个组合回测。"""
+    shms = [shared_memory.SharedMemory(name=spec["name"]) for spec in specs]
+    series = [(spec, _view(spec, shm)) for spec, shm in zip(specs, shms)]
+    try:
+        return [_score(strategy, cfg, series, hold) for cfg in configs]
+    finally:
+        series.clear()
+        for shm in shms:
+            shm.close()
+
+
+# =========================
+# 任务管理
+# =========================
+def _max_workers() -> int:
+    # 进程数上限：配置值与本机 CPU 数取小，调用方只能在此范围内调低
+    return max(1, min(SWEEP_WORKERS, os.cpu_count() or 1))
+
+
+def _prepare_all(req: Dict[str, Any], configs: List[Dict[str, float]], shms: List[shared_memory.SharedMemory],
+                 lock: threading.Lock, abort: threading.Event) -> List[Dict[str, Any]]:
+    """
+    逐个交易对准备共享内存（在线程里跑）。每块一创建就登记进 shms，后面的交易对出错时
+    前面的也能被回收；任务已被取消（abort）时不再新建，刚建好的当场回收。
+    """
+    specs = []
+    for inst_id in req["inst_ids"]:
+        if abort.is_set():
+            break
+        item = _prepare_series(inst_id, req.get("bar", "15m"), req.get("trend_bar"), configs)
+        if item is None:
+            continue
+        with lock:
+            if abort.is_set():
+                item[1].close()
+                item[1].unlink()
+                break
+            shms.append(item[1])
+        specs.append(item[0])
+    return specs
+
+
+def _rank(results: List[Dict], metric: str, min_trades: int) -> List[Dict]:
+    def key(r):
+        v = r.get(metric)
+        return (r["trades"] < min_trades, v is None, -(v or 0.0), -r["trades"])
+    ranked = sorted(results, key=key)
+    for i, r in enumerate(ranked, 1):
+        r["rank"] = i
+    return ranked
+
+
+def _report_path(sweep_id: str) -> str:
+    return os.path.join(SWEEPS_DIR, f"{sweep_id}.json")
+
+
+def _save(report: Dict):
+    os.makedirs(SWEEPS_DIR, exist_ok=True)
+    tmp = _report_path(report["id"]) + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False)
+    os.replace(tmp, _report_path(report["id"]))
+
+
+@register_evictable
+def _reports() -> List[tuple]:
+    # 磁盘预算超出时，旧报告与 K 线压缩段一起按时间淘汰
+    if not os.path.isdir(SWEEPS_DIR):
+        return []
+    return [(int(os.path.getmtime(os.path.join(SWEEPS_DIR, n)) * 1000), os.path.join(SWEEPS_DIR, n))
+            for n in os.listdir(SWEEPS_DIR) if n.endswith(".json")]
+
+
+class Sweeper:
+    """
+    参数寻优任务：start() 立即返回任务 id，回测在进程池里跑；
+    进行中的任务在内存里可查进度，完成后报告落盘，重启后仍可按 id 读取。
+    """
+    def __init__(self, keep: int = 20):
+        self.jobs: Dict[str, Dict[str, Any]] = {}
+        self.keep = keep
+        self._tasks: Dict[str, asyncio.Task] = {}
+
+    def start(self, req: Dict[str, Any]) -> Dict[str, Any]:
+        metric = req.get("metric", "expectancy")
+        if metric not in METRICS:
+            raise ValueError(f"metric must be one of {list(METRICS)}")
+        if not req.get("inst_ids"):
+            raise ValueError("inst_ids is required")
+        if req.get("max_hold", 48) < 1:
+            raise ValueError("max_hold must be >= 1")
+        configs = expand_space(req["strategy"], req.get("space"), req.get("mode", "grid"),
+                               req.get("samples", 200), req.get("seed", 0))
+        sweep_id = uuid.uuid4().hex[:12]
+        job = {"id": sweep_id, "status": "running", "request": req, "n_configs": len(configs), "done": 0,
+               "started_at": time.time(), "finished_at": None, "error": None}
+        self.jobs[sweep_id] = job
+        while len(self.jobs) > self.keep:
+            oldest = next(iter(self.jobs))
+            if self.jobs[oldest]["status"] == "running":
+                break
+            self.jobs.pop(oldest)
+        self._tasks[sweep_id] = asyncio.create_task(self._run(job, configs))
+        return {k: v for k, v in job.items() if k != "results"}
+
+    async def _run(self, job: Dict[str, Any], configs: List[Dict[str, float]]):
+        req = job["request"]
+        t0 = time.perf_counter()
+        shms: List[shared_memory.SharedMemory] = []
+        shm_lock, abort = threading.Lock(), threading.Event()
+        pool: Optional[ProcessPoolExecutor] = None
+        futures: List[asyncio.Future] = []
+        try:
+            specs = await asyncio.to_thread(_prepare_all, req, configs, shms, shm_lock, abort)
+            if not specs:
+                raise ValueError("no stored history for the requested inst_ids/bar")
+            job["series"] = [{"inst_id": s["inst_id"], "bars": s["shape"][1], "trend_aligned": s["trend_aligned"]}
+                             for s in specs]
+            job["shared"] = {"rows_per_series": [s["shape"][0] for s in specs],
+                             "bytes": sum(shm.size for shm in shms),
+                             "ema_periods": sorted({int(k.split(":")[1]) for k in specs[0]["rows"] if k.startswith("ema:")}),
+                             "swing_params": sorted(k[3:] for k in specs[0]["rows"] if k.startswith("sh:"))}
+            prep_sec = time.perf_counter() - t0
+
+            workers = max(1, min(req.get("workers") or _max_workers(), _max_workers(), len(configs)))
+            pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+            size = max(1, -(-len(configs) // (workers * 4)))
+            loop = asyncio.get_running_loop()
+            futures = [loop.run_in_executor(pool, _run_chunk, req["strategy"], configs[i:i + size], specs,
+                                            req.get("max_hold", 48))
+                       for i in range(0, len(configs), size)]
+            results: List[Dict] = []
+            try:
+                for fut in asyncio.as_completed(futures):
+                    chunk = await fut
+                    results.extend(chunk)
+                    job["done"] = len(results)
+            except Exception:
+                # 一块失败：取消其余的并收回结果，避免 “Future exception was never retrieved”
+                for f in futures:
+                    f.cancel()
+                await asyncio.gather(*futures, return_exceptions=True)
+                raise
+
+            ranked = _rank(results, req.get("metric", "expectancy"), req.get("min_trades", 20))
+            baseline = _normalize(BASELINES[req["strategy"]])
+            final = {
+                "status": "done",
+                "workers": workers,
+                "baseline": next((r for r in ranked if r["params"] == baseline), None),
+                "results": ranked,
+                "finished_at": time.time(),
+                "timing": {"prepare_sec": round(prep_sec, 3), "total_sec": round(time.perf_counter() - t0, 3)},
+            }
+        except Exception as e:
+            final = {"status": "failed", "error": str(e), "finished_at": time.time()}
+        finally:
+            # 不在这里 await：任务被取消时也要保证共享内存被回收
+            for f in futures:
+                if not f.done():
+                    f.cancel()
+                elif not f.cancelled():
+                    f.exception()     # 标记已取回
+            with shm_lock:
+                abort.set()
+                for shm in shms:
+                    shm.close()
+                    shm.unlink()
+                shms.clear()
+            if pool is not None:
+                pool.shutdown(wait=False, cancel_futures=True)
+            self._tasks.pop(job["id"], None)
+        # 先落盘再标记完成，轮询到 done 时报告文件已可读
+        await asyncio.to_thread(_save, {**job, **final})
+        job.update(final)
+
+    def get(self, sweep_id: str, top: Optional[int] = None) -> Optional[Dict[str, Any]]:
+        job = self.jobs.get(sweep_id)
+        if job is None:
+            path = _report_path(os.path.basename(sweep_id))
+            if not os.path.isfile(path):
+                return None
+            with open(path, "r", encoding="utf-8") as f:
+                job = json.load(f)
+        out = dict(job)
+        if top is not None and out.get("results"):
+            out["results"] = out["results"][:top]
+        return out
+
+    def list(self) -> List[Dict[str, Any]]:
+        seen: Dict[str, Dict[str, Any]] = {}
+        if os.path.isdir(SWEEPS_DIR):
+            for name in os.listdir(SWEEPS_DIR):
+                if name.endswith(".json"):
+                    sid = name[:-5]
+                    seen[sid] = {"id": sid, "saved_at": os.path.getmtime(os.path.join(SWEEPS_DIR, name))}
+        for sid, job in self.jobs.items():
+            seen[sid] = {"id": sid, "status": job["status"], "strategy": job["request"].get("strategy"),
+                         "n_configs": job["n_configs"], "done": job["done"], "started_at": job["started_at"]}
+        return sorted(seen.values(), key=lambda j: j.get("started_at") or j.get("saved_at") or 0, reverse=True)
+
+    def stop(self):
+        for task in list(self._tasks.values()):
+            task.cancel()
+
+
+sweeper = Sweeper()
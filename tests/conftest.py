@@ -0,0 +1,34 @@
+import os
+import sys
+import tempfile
+
+# app.config 在导入时读取 DATA_DIR：测试用临时目录，不碰真实数据
+os.environ.setdefault("DATA_DIR", tempfile.mkdtemp(prefix="okx-test-"))
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import random
+
+import pytest
+
+
+def okx_candles(n: int, seed: int = 0, bar_ms: int = 900_000, end_ts: int = 1_700_000_100_000,
+                start: float = 100.0, drift: float = 0.0, vol: float = 0.01):
+    """合成的 OKX K 线响应（最新在前）；最后一根未确认。"""
+    rnd = random.Random(seed)
+    rows, px = [], start
+    for i in range(n):
+        o = px
+        c = max(0.01, o * (1 + rnd.gauss(drift, vol)))
+        h = max(o, c) * (1 + abs(rnd.gauss(0, 0.004)))
+        l = min(o, c) * (1 - abs(rnd.gauss(0, 0.004)))
+        v = rnd.uniform(10, 1000)
+        ts = end_ts - (n - 1 - i) * bar_ms
+        rows.append([str(ts), f"{o:.4f}", f"{h:.4f}", f"{l:.4f}", f"{c:.4f}", f"{v:.2f}",
+                     f"{v * c:.2f}", f"{v * c:.2f}", "0" if i == n - 1 else "1"])
+        px = c
+    return {"code": "0", "msg": "", "data": rows[::-1]}
+
+
+@pytest.fixture
+def make_candles():
+    return okx_candles
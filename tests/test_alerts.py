@@ -0,0 +1,161 @@
+import asyncio
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from app import alerts
+from app.alerts import Alert, IntervalIndex, WatchEngine
+
+
+def test_interval_index_matches_brute_force():
+    rnd = random.Random(7)
+    idx = IntervalIndex()
+    live = {}
+    for step in range(3000):
+        op = rnd.random()
+        if op < 0.4 or not live:
+            key = f"k{step}"
+            lo, hi = sorted((rnd.uniform(0, 100), rnd.uniform(0, 100)))
+            idx.add(key, lo, hi)
+            live[key] = (lo, hi)
+        elif op < 0.7:
+            key = rnd.choice(sorted(live))
+            idx.remove(key)
+            del live[key]
+        else:
+            a, b = sorted((rnd.uniform(0, 100), rnd.uniform(0, 100)))
+            want = {k for k, (lo, hi) in live.items() if lo <= b and hi >= a}
+            assert set(idx.query(a, b)) == want
+    assert idx.rebuilds < 100
+
+
+def test_triggers_do_not_rebuild_every_tick(monkeypatch):
+    monkeypatch.setattr(WatchEngine, "_write", classmethod(lambda cls, items: None))
+
+    async def run():
+        w = WatchEngine()
+        w.add([Alert(inst_id="BTC-USDT", lo=float(i), hi=float(i)) for i in range(1000)])
+        w.on_tick("BTC-USDT", -1.0)
+        for i in range(500):
+            assert len(w.on_tick("BTC-USDT", i + 0.5)) == 1
+        await asyncio.gather(*list(w._tasks))
+        return w
+
+    w = asyncio.run(run())
+    assert w._index["BTC-USDT"].rebuilds <= 5
+
+
+def test_saves_are_batched_and_webhooks_tracked(monkeypatch, tmp_path):
+    writes = []
+    monkeypatch.setattr(alerts, "ALERTS_PATH", str(tmp_path / "alerts.json"))
+    monkeypatch.setattr(WatchEngine, "_write_file", staticmethod(lambda items: writes.append(items)))
+
+    async def run():
+        w = WatchEngine()
+        w.add([Alert(inst_id=f"X{i}-USDT", lo=1, hi=2, webhook="not a url") for i in range(20)])
+        for i in range(20):
+            w.on_tick(f"X{i}-USDT", 0.5)
+            w.on_tick(f"X{i}-USDT", 1.5)
+        assert w._tasks                  # webhook / 落盘任务保有引用
+        while w._tasks:
+            await asyncio.gather(*list(w._tasks))
+        return w
+
+    w = asyncio.run(run())
+    assert len(writes) <= 2               # 同一轮循环内的新增与 20 次触发合并写入
+    assert all(a["triggered_at"] for a in writes[-1])
+    assert w.webhook_failed == 20
+    json.dumps(writes[-1])
+
+
+class _Receiver(BaseHTTPRequestHandler):
+    delay = 0.4
+    received = []
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers["Content-Length"]))
+        time.sleep(self.delay)                         # 慢接收方
+        _Receiver.received.append((self.path, json.loads(body)))
+        self.send_response(204)
+        self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+
+def test_webhook_delivered_without_blocking_the_loop(monkeypatch, tmp_path):
+    monkeypatch.setattr(alerts, "ALERTS_PATH", str(tmp_path / "alerts.json"))
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _Receiver)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_address[1]}/hook"
+    _Receiver.received = []
+
+    async def run():
+        w = WatchEngine()
+        alert = Alert(inst_id="WH-USDT", lo=10, hi=11, label="stop_loss", webhook=url)
+        w.add([alert])
+        lags = []
+
+        async def ticker():
+            # 投递进行中事件循环照常运转：记录每次 10ms sleep 的实际间隔
+            while not w.webhook_ok:
+                t0 = time.perf_counter()
+                await asyncio.sleep(0.01)
+                lags.append(time.perf_counter() - t0)
+
+        w.on_tick("WH-USDT", 12.0)
+        t0 = time.perf_counter()
+        fired = w.on_tick("WH-USDT", 10.5)
+        tick_sec = time.perf_counter() - t0
+        await asyncio.wait_for(ticker(), 5)
+        while w._tasks:
+            await asyncio.gather(*list(w._tasks))
+        return w, alert, fired, tick_sec, lags
+
+    try:
+        w, alert, fired, tick_sec, lags = asyncio.run(run())
+    finally:
+        server.shutdown()
+        server.server_close()
+    assert [a.id for a in fired] == [alert.id] and tick_sec < 0.05
+    assert len(lags) >= 10 and max(lags) < 0.2          # 接收方 0.4s 才返回，循环没被卡住
+    assert w.webhook_ok == 1 and w.webhook_failed == 0
+    (path, event), = _Receiver.received
+    assert path == "/hook" and event["event"] == "alert_triggered" and event["price"] == 10.5
+    assert event["alert"]["id"] == alert.id and event["alert"]["label"] == "stop_loss"
+
+
+def test_alerts_from_evaluate_uses_request_risk_settings(monkeypatch, make_candles, tmp_path):
+    from fastapi.testclient import TestClient
+    from app import main
+    from app.cache import candle_cache
+    from app.config import API_KEY
+
+    monkeypatch.setattr(alerts, "ALERTS_PATH", str(tmp_path / "alerts.json"))
+    monkeypatch.setattr(main, "watch", WatchEngine())
+    feeds = {"15m": make_candles(150, seed=5024, drift=-0.002, vol=0.006),
+             "1H": make_candles(150, seed=6024, bar_ms=3_600_000, drift=-0.004, vol=0.012)}
+
+    async def fetch(inst_id, bar, limit):
+        return feeds[bar]
+    monkeypatch.setattr(candle_cache, "fetch", fetch)
+    seen = []
+    real = main.run_strategy
+    monkeypatch.setattr(main, "run_strategy", lambda *a: seen.append(a[7:]) or real(*a))
+    client = TestClient(main.app, headers={"x-api-key": API_KEY})
+
+    # 默认值与 evaluate 路由一致：BTC 默认被排除，不生成告警
+    r = client.post("/alerts/from_evaluate", json={"strategy": "panda", "inst_id": "BTC-USDT"}).json()
+    assert r["created"] == [] and r["side"] == "flat" and seen[-1] == (2.0, 694.0, 7, 5.0, True)
+
+    body = {"strategy": "panda", "inst_id": "BTC-USDT", "risk_percent": 1.0, "funds_total": 1500.0,
+            "funds_split": 3, "leverage": 10.0, "exclude_btc_in_screen": False}
+    r = client.post("/alerts/from_evaluate", json=body).json()
+    assert seen[-1] == (1.0, 1500.0, 3, 10.0, False)
+    ev = client.get("/strategy/panda/evaluate", params={k: v for k, v in body.items() if k != "strategy"}).json()
+    assert r["side"] == ev["side"] != "flat"
+    levels = {a["label"]: (a["lo"], a["hi"]) for a in r["alerts"]}
+    assert levels["stop_loss"] == (ev["stop_loss"], ev["stop_loss"])
+    assert levels["entry_zone"] == tuple(ev["entry_zone"])
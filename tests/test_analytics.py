@@ -0,0 +1,111 @@
+import asyncio
+import math
+import threading
+
+import numpy as np
+import pytest
+
+from app import analytics as analytics_mod
+from app.analytics import CrossAnalytics
+from app.history import HistoryStore
+
+BAR = "15m"
+STEP = 900_000
+T0 = 1_700_000_000_000 - 1_700_000_000_000 % STEP
+N = 30
+
+
+def _okx(closes, skip_last=False):
+    rows = [[str(T0 + i * STEP), str(c), str(c), str(c), str(c), "1", "0", "0", "1"]
+            for i, c in enumerate(closes)]
+    if skip_last:
+        rows = rows[:-1]
+    return list(reversed(rows))
+
+
+@pytest.fixture
+def panel(monkeypatch):
+    # BTC 每根对数收益 r_t > 0；ETH = BTC^2（对数收益 2r_t）；SOL = 1/BTC（-r_t）；DOGE 缺最后一根
+    r = np.array([0.01 + 0.005 * (t % 3) for t in range(N)])
+    r[0] = 0.0
+    log_btc = np.log(100.0) + np.cumsum(r)
+    closes = {
+        "BTC-USDT": np.exp(log_btc),
+        "ETH-USDT": np.exp(2 * log_btc - np.log(100.0)),
+        "SOL-USDT": np.exp(-log_btc + 2 * np.log(100.0)),
+        "DOGE-USDT": np.linspace(1.0, 2.0, N),
+    }
+    store = HistoryStore(capacity=N, max_series=10)
+    for inst, c in closes.items():
+        store.ingest(inst, BAR, _okx(c.tolist(), skip_last=inst == "DOGE-USDT"))
+    monkeypatch.setattr(analytics_mod, "history", store)
+    return r, closes
+
+
+def test_returns_rs_breadth_and_corr_match_hand_computed_panel(panel):
+    r, closes = panel
+    ca = CrossAnalytics(windows=[1, 4], benchmarks=["BTC-USDT"], corr_window=5)
+    res = ca.view(BAR, sort_by=None, top=None, with_corr=True)
+    rows = {row["inst_id"]: row for row in res["rows"]}
+    assert res["as_of"] == T0 + (N - 1) * STEP and res["symbols"] == 4
+
+    s1, s4 = r[-1], r[-4:].sum()
+    want = {
+        "BTC-USDT": (math.exp(s1) - 1, math.exp(s4) - 1, 0.0, 0.0),
+        "ETH-USDT": (math.exp(2 * s1) - 1, math.exp(2 * s4) - 1, math.exp(s1) - 1, math.exp(s4) - 1),
+        "SOL-USDT": (math.exp(-s1) - 1, math.exp(-s4) - 1, math.exp(-2 * s1) - 1, math.exp(-2 * s4) - 1),
+    }
+    for inst, (r1, r4, rs1, rs4) in want.items():
+        row = rows[inst]
+        assert row["ret_1"] == pytest.approx(r1, abs=1e-6)
+        assert row["ret_4"] == pytest.approx(r4, abs=1e-6)
+        assert row["rs_BTC-USDT_1"] == pytest.approx(rs1, abs=1e-6)
+        assert row["rs_BTC-USDT_4"] == pytest.approx(rs4, abs=1e-6)
+        assert row["lag_bars"] == 0
+
+    # DOGE 最后一根缺失：向前填充，1 根收益为 0，4 根收益按倒数第二根计
+    doge = closes["DOGE-USDT"]
+    assert rows["DOGE-USDT"]["lag_bars"] == 1
+    assert rows["DOGE-USDT"]["close"] == pytest.approx(doge[-2], abs=1e-6)
+    assert rows["DOGE-USDT"]["ret_1"] == 0.0
+    assert rows["DOGE-USDT"]["ret_4"] == pytest.approx(doge[-2] / doge[-5] - 1, abs=1e-6)
+
+    # 单调上涨的 EMA21 在 EMA55 之上，只有 SOL 在跌：宽度 3/4
+    assert {k: v["ema_trend_up"] for k, v in rows.items()} == {
+        "BTC-USDT": True, "ETH-USDT": True, "SOL-USDT": False, "DOGE-USDT": True}
+    assert res["breadth"] == {"ema21_gt_ema55": 0.75, "count": 4}
+
+    corr = res["correlation"]
+    idx = {s: i for i, s in enumerate(corr["symbols"])}
+    m = corr["matrix"]
+    assert m[idx["BTC-USDT"]][idx["ETH-USDT"]] == pytest.approx(1.0, abs=1e-6)
+    assert m[idx["BTC-USDT"]][idx["SOL-USDT"]] == pytest.approx(-1.0, abs=1e-6)
+    assert m[idx["ETH-USDT"]][idx["SOL-USDT"]] == pytest.approx(-1.0, abs=1e-6)
+
+
+def test_refresh_all_async_runs_off_loop_and_skips_when_busy(panel, monkeypatch):
+    ca = CrossAnalytics(windows=[1], benchmarks=["BTC-USDT"], corr_window=5)
+    seen = []
+    gate = threading.Event()
+    orig = ca.refresh_all
+
+    def slow_refresh_all():
+        seen.append(threading.get_ident())
+        gate.wait(5)
+        orig()
+
+    monkeypatch.setattr(ca, "refresh_all", slow_refresh_all)
+
+    async def run():
+        loop_thread = threading.get_ident()
+        first = asyncio.create_task(ca.refresh_all_async())
+        await asyncio.sleep(0.05)
+        # 上一次还在算：跳过，且不阻塞事件循环
+        await asyncio.wait_for(ca.refresh_all_async(), 1)
+        gate.set()
+        await first
+        return loop_thread
+
+    loop_thread = asyncio.run(run())
+    assert len(seen) == 1 and seen[0] != loop_thread
+    assert ca.status()["skipped"] == 1 and ca.recomputes == 1
@@ -0,0 +1,84 @@
+import asyncio
+import json
+
+import pytest
+from pydantic import ValidationError
+
+from app.batch import evaluate_batch_stream
+from app.cache import candle_cache
+from app.strategies import get_strategy
+from app.schemas import EvaluateBatchRequest, BATCH_MAX_ITEMS, BATCH_MAX_CONCURRENCY
+
+
+def test_batch_request_bounds():
+    items = [{"inst_id": "BTC-USDT"}]
+    assert EvaluateBatchRequest(items=items * BATCH_MAX_ITEMS, concurrency=BATCH_MAX_CONCURRENCY)
+    with pytest.raises(ValidationError):
+        EvaluateBatchRequest(items=items * (BATCH_MAX_ITEMS + 1))
+    with pytest.raises(ValidationError):
+        EvaluateBatchRequest(items=items, concurrency=BATCH_MAX_CONCURRENCY + 1)
+    with pytest.raises(ValidationError):
+        EvaluateBatchRequest(items=[])
+
+
+def _batch(items, **kw):
+    return EvaluateBatchRequest(items=[{"inst_id": i, "bar": "15m", "trend_bar": "1H"} for i in items], **kw)
+
+
+def _fake_fetch(monkeypatch, make_candles, calls, gate=None, fail=()):
+    async def fetch(inst_id, bar, limit):
+        calls.append((inst_id, bar))
+        if inst_id in fail:
+            raise RuntimeError(f"boom {inst_id}")
+        if gate is not None and inst_id == "SLOW-USDT":
+            await gate.wait()
+        return make_candles(limit, seed=len(inst_id) * 7 + len(bar),
+                            bar_ms=900_000 if bar == "15m" else 3_600_000)
+    monkeypatch.setattr(candle_cache, "fetch", fetch)
+
+
+def test_duplicate_items_fetch_each_series_once(monkeypatch, make_candles):
+    calls = []
+    _fake_fetch(monkeypatch, make_candles, calls)
+
+    async def run():
+        req = _batch(["ETH-USDT", "BTC-USDT", "ETH-USDT", "ETH-USDT"])
+        return [json.loads(line) async for line in evaluate_batch_stream(get_strategy("panda"), req)]
+
+    lines = asyncio.run(run())
+    assert sorted(calls) == sorted(set(calls)) and len(calls) == 4
+    assert sorted(line["index"] for line in lines[:-1]) == [0, 1, 2, 3]
+    assert lines[-1]["done"] and lines[-1]["upstream_fetches"] == 4 and lines[-1]["errors"] == 0
+
+
+def test_results_stream_before_the_batch_finishes(monkeypatch, make_candles):
+    calls = []
+
+    async def run():
+        gate = asyncio.Event()
+        _fake_fetch(monkeypatch, make_candles, calls, gate=gate)
+        stream = evaluate_batch_stream(get_strategy("panda"), _batch(["ETH-USDT", "SLOW-USDT"]))
+        first = json.loads(await asyncio.wait_for(stream.__anext__(), 5))   # SLOW 仍卡在拉取上
+        assert not gate.is_set()
+        gate.set()
+        rest = [json.loads(line) async for line in stream]
+        return first, rest
+
+    first, rest = asyncio.run(run())
+    assert first["inst_id"] == "ETH-USDT" and "result" in first
+    assert rest[0]["inst_id"] == "SLOW-USDT" and rest[-1]["done"]
+
+
+def test_failed_symbol_yields_error_line(monkeypatch, make_candles):
+    calls = []
+    _fake_fetch(monkeypatch, make_candles, calls, fail=("BAD-USDT",))
+
+    async def run():
+        req = _batch(["ETH-USDT", "BAD-USDT", "BTC-USDT"])
+        return [json.loads(line) async for line in evaluate_batch_stream(get_strategy("panda"), req)]
+
+    lines = asyncio.run(run())
+    by_inst = {line["inst_id"]: line for line in lines[:-1]}
+    assert by_inst["BAD-USDT"]["error"] == "server_exception" and "boom" in by_inst["BAD-USDT"]["detail"]
+    assert "result" in by_inst["ETH-USDT"] and "result" in by_inst["BTC-USDT"]
+    assert lines[-1] == {**lines[-1], "done": True, "count": 3, "errors": 1}
@@ -0,0 +1,217 @@
+import asyncio
+import json
+import os
+import random
+import zlib
+
+import pytest
+
+from app import books as B
+from app import storage
+from app.books import BookManager, OrderBook, SnapshotLog, read_snapshots, write_snapshots
+
+INST = "BTC-USDT"
+
+
+def _crc(s: str) -> int:
+    c = zlib.crc32(s.encode())
+    return c - (1 << 32) if c >= (1 << 31) else c
+
+
+def canned_stream(n_updates: int = 300, seed: int = 1):
+    """本地替身：生成一条 books 频道推送流（快照 + 增量），checksum / seqId 按 OKX 规则计算。"""
+    rnd = random.Random(seed)
+    bids, asks = {}, {}
+
+    def checksum():
+        b = sorted(bids.items(), key=lambda x: -float(x[0]))[:25]
+        a = sorted(asks.items(), key=lambda x: float(x[0]))[:25]
+        parts = []
+        for i in range(25):
+            if i < len(b):
+                parts += b[i]
+            if i < len(a):
+                parts += a[i]
+        return _crc(":".join(parts))
+
+    for i in range(100):
+        bids[f"{100 - i * 0.1:.1f}"] = str(rnd.randint(1, 50))
+        asks[f"{100.1 + i * 0.1:.1f}"] = str(rnd.randint(1, 50))
+    seq = 1000
+    msgs = [{"arg": {"channel": "books", "instId": INST}, "action": "snapshot",
+             "data": [{"bids": [[p, s, "0", "1"] for p, s in bids.items()],
+                       "asks": [[p, s, "0", "1"] for p, s in asks.items()],
+                       "ts": "1", "checksum": checksum(), "seqId": seq, "prevSeqId": -1}]}]
+    for k in range(n_updates):
+        ch = {"bids": [], "asks": []}
+        for name, side, base, d in (("bids", bids, 100.0, -1), ("asks", asks, 100.1, 1)):
+            for _ in range(4):
+                p = f"{base + d * rnd.randint(0, 120) * 0.1:.1f}"
+                s = "0" if rnd.random() < 0.3 else str(rnd.randint(1, 50))
+                if s == "0":
+                    side.pop(p, None)
+                else:
+                    side[p] = s
+                ch[name].append([p, s, "0", "1"])
+        msgs.append({"arg": {"channel": "books", "instId": INST}, "action": "update",
+                     "data": [{**ch, "ts": str(k + 2), "checksum": checksum(),
+                               "seqId": seq + k + 1, "prevSeqId": seq + k}]})
+    return msgs
+
+
+def _copy(msg):
+    return json.loads(json.dumps(msg))
+
+
+def test_checksum_matches_okx_example():
+    ob = OrderBook("X")
+    ob.bids.replace([["3366.1", "7", "0", "3"], ["3366", "6", "3", "4"]])
+    ob.asks.replace([["3366.8", "9", "10", "3"], ["3368", "8", "3", "4"]])
+    assert ob.checksum() == _crc("3366.1:7:3366.8:9:3366:6:3368:8")
+
+
+def test_incremental_updates_verify_and_resync_on_bad_checksum():
+    msgs = canned_stream()
+    m = BookManager()
+    for msg in msgs[:200]:
+        assert m.on_message(msg) == []
+    book = m.books[INST]
+    assert book.valid and book.updates == 199 and m.checksum_failures == 0
+
+    bad = _copy(msgs[200])
+    bad["data"][0]["checksum"] += 1
+    assert m.on_message(bad) == [INST]
+    assert not book.valid and m.checksum_failures == 1
+    assert m.on_message(msgs[201]) == []          # 等快照期间增量被跳过
+    assert book.updates == 200
+
+    assert m.on_message(msgs[0]) == [] and book.valid
+
+
+def test_seq_gap_requests_resync():
+    msgs = canned_stream(20)
+    m = BookManager()
+    for msg in msgs[:10]:
+        m.on_message(msg)
+    assert m.on_message(msgs[11]) == [INST]        # 跳过了 msgs[10]
+    assert m.seq_gaps == 1 and not m.books[INST].valid
+
+
+def test_slippage_walks_levels():
+    ob = OrderBook("Y")
+    ob.snapshot({"bids": [["99", "1"], ["98", "3"]], "asks": [["101", "1"], ["102", "2"], ["103", "5"]], "ts": "5"},
+                "rest")
+    r = ob.slippage(2, "buy")
+    assert r["vwap"] == pytest.approx(101.5) and r["levels_used"] == 2
+    assert r["slippage_bps"] == pytest.approx(0.5 / 101 * 1e4, abs=1e-3)
+    assert r["impact_bps"] == pytest.approx(1.5 / 100 * 1e4, abs=1e-3)
+    r = ob.slippage(10, "sell", ct_val=0.01)
+    assert r["filled"] == 4 and r["unfilled"] == 6 and r["worst_price"] == 98
+    assert r["slip_cost"] == pytest.approx((99 - 98.25) * 4 * 0.01)
+
+
+def test_snapshot_log_round_trip(monkeypatch, tmp_path):
+    monkeypatch.setattr(B, "BOOKS_DIR", str(tmp_path))
+    msgs = canned_stream(60)
+    m = BookManager()
+    log = SnapshotLog(INST, levels=10)
+    expected = []
+    for i, msg in enumerate(msgs):
+        m.on_message(msg)
+        if i % 10 == 0:
+            book = m.books[INST]
+            log.record(book)
+            expected.append((book.bids.top(10), book.asks.top(10)))
+    path, data = log.take()
+    write_snapshots(path, data)
+    snaps = read_snapshots(INST, limit=100)
+    assert [(s["bids"], s["asks"]) for s in snaps] == expected
+
+
+def test_ws_owned_book_never_mixes_rest(monkeypatch):
+    class NoRest:
+        def __init__(self):
+            raise AssertionError("REST must not be used for a WS-owned book")
+
+    monkeypatch.setattr(B, "OkxClient", NoRest)
+    msgs = canned_stream(5)
+    m = BookManager()
+    m.running, m.source, m.insts = True, "ws", [INST]
+    sent = []
+
+    class FakeConn:
+        async def send(self, raw):
+            sent.append(json.loads(raw)["op"])
+
+    async def run():
+        m._conn = FakeConn()
+        for msg in msgs[:3]:
+            m.on_message(msg)
+        m.books[INST].valid = False
+        waiter = asyncio.create_task(m.depth(INST, wait_sec=2))
+        await asyncio.sleep(0.05)
+        assert sent == ["unsubscribe", "subscribe"]
+        m.on_message(msgs[0])                      # 重新订阅后推来的快照
+        return await waiter
+
+    book = asyncio.run(run())
+    assert book is not None and book.valid and book.source == "ws"
+
+
+def test_ws_stand_in_resubscribes_after_bad_checksum(monkeypatch, tmp_path):
+    websockets = pytest.importorskip("websockets")
+    monkeypatch.setattr(B, "BOOKS_DIR", str(tmp_path))
+    msgs = canned_stream(60)
+    ops = []
+
+    async def handler(ws):
+        async for raw in ws:
+            if raw == "ping":
+                await ws.send("pong")
+                continue
+            req = json.loads(raw)
+            ops.append(req["op"])
+            if req["op"] != "subscribe":
+                continue
+            if ops.count("subscribe") == 1:
+                for msg in msgs[:30]:
+                    await ws.send(json.dumps(msg))
+                bad = _copy(msgs[30])
+                bad["data"][0]["checksum"] += 1
+                await ws.send(json.dumps(bad))
+            else:
+                for msg in [msgs[0]] + msgs[1:20]:
+                    await ws.send(json.dumps(msg))
+
+    async def run():
+        server = await websockets.serve(handler, "127.0.0.1", 0)
+        port = server.sockets[0].getsockname()[1]
+        m = BookManager()
+        m.ws_url = f"ws://127.0.0.1:{port}"
+        m.start([INST], "ws")
+        try:
+            for _ in range(100):
+                await asyncio.sleep(0.02)
+                if ops.count("subscribe") == 2 and m.books.get(INST) and m.books[INST].updates >= 19 + 29:
+                    break
+        finally:
+            m.stop()
+            server.close()
+            await server.wait_closed()
+        return m
+
+    m = asyncio.run(run())
+    assert ops[:3] == ["subscribe", "unsubscribe", "subscribe"]
+    assert m.checksum_failures == 1 and m.resyncs == 1 and m.books[INST].valid
+
+
+def test_disk_budget_counts_and_evicts_subdirectories(monkeypatch, tmp_path):
+    monkeypatch.setattr(B, "BOOKS_DIR", os.path.join(storage.DATA_DIR, "books-budget-test"))
+    folder = os.path.join(B.BOOKS_DIR, INST)
+    for i in range(3):
+        write_snapshots(os.path.join(folder, f"{INST}.{i}-{i}.jsonl"), b"x" * 10_000)
+    usage = storage.disk_usage()
+    assert usage["bytes_by_dir"]["books-budget-test"] == 30_000
+    deleted = storage.enforce_budget(usage["total_bytes"] - 15_000)
+    assert [os.path.basename(p) for p in deleted] == [f"{INST}.0-0.jsonl", f"{INST}.1-1.jsonl"]
+    assert os.listdir(folder) == [f"{INST}.2-2.jsonl"]
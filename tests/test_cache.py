@@ -0,0 +1,46 @@
+import asyncio
+import time
+
+from app import cache
+from app.cache import CandleCache, _merge_rows
+
+STEP = 15 * 60 * 1000
+
+
+def _rows(newest: int, n: int):
+    return [[str(newest - i * STEP), "1", "1", "1", "1", "1", "1", "1", "1"] for i in range(n)]
+
+
+def _contiguous(rows) -> bool:
+    ts = [int(r[0]) for r in rows]
+    return all(a - b == STEP for a, b in zip(ts, ts[1:]))
+
+
+def test_merge_drops_old_rows_behind_gap():
+    now = int(time.time() * 1000) // STEP * STEP
+    old = _rows(now - 2 * 86400 * 1000, 300)
+    new = _rows(now, 150)
+    merged = _merge_rows(old, new, 300, STEP)
+    assert len(merged) == 150 and _contiguous(merged)
+    # 接得上的旧数据保留
+    merged = _merge_rows(_rows(now - 150 * STEP, 300), new, 300, STEP)
+    assert len(merged) == 300 and _contiguous(merged)
+
+
+def test_stale_hydrate_then_fetch_has_no_hole(monkeypatch):
+    now = int(time.time() * 1000) // STEP * STEP
+    calls = []
+
+    async def fake(inst_id, bar, limit):
+        calls.append(limit)
+        return {"code": "0", "msg": "", "data": _rows(now, min(limit, 150) if len(calls) == 1 else limit)}
+
+    monkeypatch.setattr(cache, "_okx_candles", fake)
+    c = CandleCache(max_rows=300, ttl_sec=3)
+    # 预热：两天前的磁盘数据
+    c.merge("BTC-USDT", "15m", _rows(now - 2 * 86400 * 1000, 300), source="disk", updated=time.monotonic() - 86400)
+    res = asyncio.run(c.fetch("BTC-USDT", "15m", 300))
+    assert _contiguous(res["data"])
+    assert len(res["data"]) == 300
+    assert int(res["data"][0][0]) == now
+    assert calls[-1] == 300        # 接不上时退化为整窗拉取
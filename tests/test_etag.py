@@ -0,0 +1,50 @@
+import copy
+
+from fastapi.testclient import TestClient
+
+from app import main
+from app.cache import candle_cache
+from app.config import API_KEY
+
+URL = "/strategy/panda/evaluate?inst_id=ETH-USDT&bar=15m&trend_bar=1H&limit=150"
+
+
+def _serve(monkeypatch, feeds):
+    async def fetch(inst_id, bar, limit):
+        return feeds[bar]
+    monkeypatch.setattr(candle_cache, "fetch", fetch)
+    return TestClient(main.app, headers={"x-api-key": API_KEY})
+
+
+def test_repeat_request_returns_304_with_empty_body(monkeypatch, make_candles):
+    feeds = {"15m": make_candles(150, seed=1), "1H": make_candles(150, seed=2, bar_ms=3_600_000)}
+    client = _serve(monkeypatch, feeds)
+    first = client.get(URL)
+    etag = first.headers["etag"]
+    assert first.status_code == 200 and first.json()["inst_id"] == "ETH-USDT"
+
+    again = client.get(URL, headers={"If-None-Match": etag})
+    assert again.status_code == 304 and again.content == b""
+    assert again.headers["etag"] == etag
+
+    other = client.get(URL, headers={"If-None-Match": '"stale", ' + etag})
+    assert other.status_code == 304
+
+
+def test_new_candles_change_the_etag(monkeypatch, make_candles):
+    feeds = {"15m": make_candles(150, seed=1), "1H": make_candles(150, seed=2, bar_ms=3_600_000)}
+    client = _serve(monkeypatch, feeds)
+    etag = client.get(URL).headers["etag"]
+
+    # 新的一根信号周期 K 线（base[0] 的 ts 变了）
+    feeds["15m"] = make_candles(150, seed=1, end_ts=1_700_000_100_000 + 900_000)
+    r = client.get(URL, headers={"If-None-Match": etag})
+    assert r.status_code == 200 and r.headers["etag"] != etag
+    etag2 = r.headers["etag"]
+
+    # 趋势周期未确认 K 线的内容变了（trend[0] 同一 ts、收盘价不同）
+    trend = copy.deepcopy(feeds["1H"])
+    trend["data"][0][4] = str(float(trend["data"][0][4]) + 1)
+    feeds["1H"] = trend
+    r = client.get(URL, headers={"If-None-Match": etag2})
+    assert r.status_code == 200 and r.headers["etag"] not in (etag, etag2)
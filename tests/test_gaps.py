@@ -0,0 +1,58 @@
+import asyncio
+import time
+
+from app import storage
+from app.gaps import GapIndex
+
+STEP = 60_000
+
+
+class FakeOkx:
+    """按 after/before 分页返回 upstream 里的 K 线（倒序），与 /market/history-candles 一致。"""
+    def __init__(self, upstream):
+        self.upstream = sorted(upstream, reverse=True)
+        self.calls = 0
+
+    async def history_candles(self, inst_id, bar, after=None, before=None, limit=100):
+        self.calls += 1
+        hi = after if after is not None else float("inf")
+        lo = before if before is not None else -1
+        ts = [t for t in self.upstream if lo < t < hi][:limit]
+        return {"code": "0", "msg": "", "data": [[str(t), "1", "2", "0.5", "1.5", "1", "1", "1", "1"] for t in ts]}
+
+    async def close(self):
+        pass
+
+
+def _rows(ts):
+    return {"data": [[str(t), "1", "2", "0.5", "1.5", "1", "1", "1", "1"] for t in sorted(ts, reverse=True)]}
+
+
+def test_repair_inside_sealed_history_survives_compaction():
+    inst, bar = "GAP-USDT", "1m"
+    now = int(time.time() * 1000) // STEP * STEP
+    t0 = now - 3000 * STEP
+    upstream = [t0 + i * STEP for i in range(3000)]
+    hole = set(upstream[100:111])
+    storage.save_candles_csv(inst, bar, _rows([t for t in upstream if t not in hole]))
+    storage.compact_series(inst, bar, hot_rows=500, segment_rows=1000)
+    assert storage.list_series()[(inst, bar)]["segments"]      # 缺口已在封存段里
+
+    idx = GapIndex()
+    before = idx.coverage(inst, bar)[0]
+    assert before["bars_missing"] >= len(hole)
+
+    client = FakeOkx(upstream)
+    st = asyncio.run(idx.repair(inst, bar, max_requests=50, client=client))
+    assert st["rows_filled"] >= len(hole)
+
+    stats = storage.compact_series(inst, bar, hot_rows=500, segment_rows=1000)
+    assert stats["rows_merged"] >= len(hole)
+    after = idx.coverage(inst, bar)[0]
+    assert after["bars_missing"] == 0 and after["gaps"] == 0
+    ts = [int(r[0]) for r in storage.read_candles(inst, bar)]
+    assert hole <= set(ts) and len(ts) == len(set(ts))
+
+    client.calls = 0
+    st = asyncio.run(idx.repair(inst, bar, max_requests=50, client=client))
+    assert client.calls == 0 and st["gaps"] == 0
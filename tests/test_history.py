@@ -0,0 +1,65 @@
+import numpy as np
+
+from app.history import CandleRing, HistoryStore
+
+
+def _rows(ts_list, close=None):
+    return np.array([[t, 1, 2, 0.5, t if close is None else close, 10] for t in ts_list], dtype=np.float64)
+
+
+def _okx(ts_list):
+    # OKX 格式：字符串、按 ts 倒序
+    return [[str(t), "1", "2", "0.5", str(t), "10", "0", "0", "1"] for t in reversed(ts_list)]
+
+
+def test_ring_wraps_and_keeps_latest_window():
+    ring = CandleRing(capacity=5)
+    assert ring.append(_rows(range(1, 4))) == 3
+    assert ring.append(_rows(range(4, 13))) == 9
+    assert ring.size == 5 and ring.last_ts == 12
+    assert ring.view()[:, 0].tolist() == [8, 9, 10, 11, 12]
+    assert ring.view(2)[:, 0].tolist() == [11, 12]
+
+    v = ring.version
+    assert ring.append(_rows([10], close=99.0)) == 0          # 未收盘 K 线原地更新
+    assert ring.view()[2].tolist() == [10, 1, 2, 0.5, 99.0, 10] and ring.version == v + 1
+    assert ring.append(_rows([3])) == 0 and ring.version == v + 1   # 比窗口更旧的丢弃
+    assert ring.view()[:, 0].tolist() == [8, 9, 10, 11, 12]
+
+
+def test_view_is_zero_copy_and_contiguous_at_every_offset():
+    ring = CandleRing(capacity=7)
+    for t in range(1, 30):
+        ring.append(_rows([t]))
+        for n in (None, 1, 4):
+            v = ring.view(n)
+            assert v.flags.c_contiguous and not v.flags.writeable
+            assert np.shares_memory(v, ring._buf)
+            want = list(range(max(1, t - (ring.size if n is None else min(n, ring.size)) + 1), t + 1))
+            assert v[:, 0].tolist() == want
+
+
+def test_store_evicts_least_recently_written_series():
+    store = HistoryStore(capacity=4, max_series=3)
+    for inst in ("A", "B", "C"):
+        store.ingest(inst, "15m", _okx([1, 2]))
+    store.ingest("A", "15m", _okx([3]))                        # A 变为最近写入
+    store.ingest("D", "15m", _okx([1]))
+    assert store.keys() == [("C", "15m"), ("A", "15m"), ("D", "15m")]
+    assert store.evicted == 1 and store.get("B", "15m") is None
+    assert store.view("A", "15m")[:, 0].tolist() == [1, 2, 3]
+    assert store.status()["bytes_total"] == 3 * 2 * 4 * 6 * 8
+
+
+def test_malformed_rows_are_skipped_not_the_batch():
+    store = HistoryStore(capacity=10, max_series=2)
+    data = _okx([1, 2, 3, 4])
+    data[1] = ["bad", "1", "2"]                                # ts=3 这一行坏了
+    data[2] = [str(2), "1", None, "0.5", "2", "10"]            # 空值
+    assert store.ingest("X", "1m", data) == 2
+    assert store.view("X", "1m")[:, 0].tolist() == [1, 4] and store.rows_rejected == 2
+
+    store.ingest("Y", "1m", _okx([1]))
+    assert store.ingest("Z", "1m", [["oops"], [None, None, None, None, None, None]]) == 0
+    assert store.keys() == [("X", "1m"), ("Y", "1m")]          # 整批无效：不建环、不挤掉别的序列
+    assert store.evicted == 0 and store.status()["rows_rejected"] == 4
@@ -0,0 +1,98 @@
+import asyncio
+
+import httpx
+
+from app import okx
+from app.okx import OkxClient, breaker
+
+
+def _client(handler) -> OkxClient:
+    c = OkxClient()
+    c._client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    return c
+
+
+def test_cancelled_probe_releases_half_open(monkeypatch):
+    monkeypatch.setattr(okx, "BREAKER_COOLDOWN_SEC", 0)
+    slow = {"on": True}
+
+    async def handler(request):
+        if slow["on"]:
+            await asyncio.sleep(10)
+        return httpx.Response(200, json={"code": "0", "msg": "", "data": []})
+
+    async def run():
+        path = "/market/test-probe"
+        br = breaker(path)
+        br._open()
+        client = _client(handler)
+        try:
+            probe = asyncio.create_task(client._get(path, {}))
+            await asyncio.sleep(0.05)
+            assert br.state == "half_open"
+            probe.cancel()
+            await asyncio.gather(probe, return_exceptions=True)
+            slow["on"] = False
+            res = await client._get(path, {})
+        finally:
+            await client.close()
+        return br, res
+
+    br, res = asyncio.run(run())
+    assert res.get("error") != "circuit_open"
+    assert res["code"] == "0"
+    assert br.state == "closed"
+
+
+def test_deadline_during_hedge_wait_cancels_primary(monkeypatch):
+    state = {"started": 0, "cancelled": 0}
+
+    async def handler(request):
+        state["started"] += 1
+        try:
+            await asyncio.sleep(5)
+        except asyncio.CancelledError:
+            state["cancelled"] += 1
+            raise
+        return httpx.Response(200, json={"code": "0", "msg": "", "data": []})
+
+    async def run():
+        br = breaker("/market/test-hedge-cancel")
+        monkeypatch.setattr(br, "hedge_delay", lambda: 1.0)
+        client = _client(handler)
+        try:
+            with_deadline = asyncio.wait_for(
+                client._hedged(br, "http://okx.test/x", {}, br.generation, False), 0.1)
+            try:
+                await with_deadline
+            except asyncio.TimeoutError:
+                pass
+            await asyncio.sleep(0.05)
+            assert not [t for t in asyncio.all_tasks() if t is not asyncio.current_task()]
+        finally:
+            await client.close()
+        return br
+
+    br = asyncio.run(run())
+    assert state == {"started": 1, "cancelled": 1}
+    assert br.total == 0 and br.hedged == 0
+
+
+def test_only_the_probe_decides_half_open(monkeypatch):
+    monkeypatch.setattr(okx, "BREAKER_COOLDOWN_SEC", 0)
+    br = okx.CircuitBreaker("/market/test-generations")
+    old = br.generation                     # 熔断前发出的请求
+    br._open()
+    opened_at = br.opened_at
+    br.record(False, 0.01, old)            # 熔断期间才完成：不顺延冷却
+    assert br.state == "open" and br.opened_at == opened_at
+
+    assert br.allow() and br.state == "half_open"
+    probe = br.generation
+    br.record(True, 0.01, old)             # 旧请求成功也不能替探测做决定
+    br.record(True, 0.01, probe)           # 同一代但不是探测请求（对冲备份）
+    assert br.state == "half_open" and not br.allow()
+    br.record(True, 0.01, probe, probe=True)
+    assert br.state == "closed"
+    br.record(False, 0.01, probe)          # 探测那一代的迟到失败不进新窗口
+    assert br.status()["window"] == 0 and br.total == 5
@@ -0,0 +1,60 @@
+import numpy as np
+import pytest
+
+from app import storage
+from app.features import Features, ema
+from app.patterns import PATTERNS, TREND_FAST, TREND_SLOW, PatternSearch, pattern_masks
+
+BAR_MS = 60_000
+
+
+def _random_ohlc(seed, n):
+    # 价格取 0.5 的整数倍，等号边界（吞没、内包、外包）也能频繁出现
+    rng = np.random.default_rng(seed)
+    c = 100 + np.cumsum(rng.integers(-4, 5, n)) * 0.5
+    o = np.concatenate([[c[0]], c[:-1]]) + rng.integers(-2, 3, n) * 0.5
+    h = np.maximum(o, c) + rng.integers(0, 6, n) * 0.5
+    l = np.minimum(o, c) - rng.integers(0, 6, n) * 0.5
+    return o, h, l, c
+
+
+@pytest.mark.parametrize("seed", range(8))
+def test_pattern_masks_match_scalar_candle_flags(seed):
+    o, h, l, c = _random_ohlc(seed, 120)
+    masks = pattern_masks(o, h, l, c)
+    for i in range(len(c)):
+        k = i + 1
+        flags = Features(list(range(k)), o[:k].tolist(), h[:k].tolist(), l[:k].tolist(), c[:k].tolist()).candle_flags()
+        assert [flags[p] for p in PATTERNS] == masks[:, i].tolist(), (seed, i)
+
+
+def test_parity_cases_cover_every_pattern():
+    hits = sum(pattern_masks(*_random_ohlc(seed, 120)).sum(axis=1) for seed in range(8))
+    assert all(hits > 0), dict(zip(PATTERNS, hits.tolist()))
+
+
+def test_segment_chain_equals_single_pass_over_concatenated_series():
+    o, h, l, c = _random_ohlc(42, 250)
+    rows = [[str((1000 + i) * BAR_MS), str(o[i]), str(h[i]), str(l[i]), str(c[i]), "1", "1", "1", "1"]
+            for i in range(len(c))]
+    storage.save_candles_csv("PAT-USDT", "1m", {"data": rows})
+    storage.compact_series("PAT-USDT", "1m", hot_rows=50, segment_rows=60)
+    item = storage.list_series()[("PAT-USDT", "1m")]
+    assert len(item["segments"]) >= 3 and item["active"]
+
+    ps = PatternSearch()
+    entries = ps._entries(item)
+    assert ps.misses == len(item["segments"]) and ps.hits == 0
+    ts = np.concatenate([e["ts"] for e in entries])
+    assert ts.tolist() == [int(r[0]) for r in rows]
+
+    # 段首的两根/三根形态靠前一段的尾巴补齐，EMA 沿段链接续：与整体一次算完逐点相同
+    assert np.array_equal(np.hstack([e["masks"] for e in entries]), pattern_masks(o, h, l, c))
+    fast, slow = np.array(ema(c.tolist(), TREND_FAST)), np.array(ema(c.tolist(), TREND_SLOW))
+    assert np.array_equal(np.concatenate([e["up"] for e in entries]), fast > slow)
+    assert np.array_equal(np.concatenate([e["down"] for e in entries]), fast < slow)
+
+    # 第二次走段缓存，结果不变
+    again = ps._entries(item)
+    assert ps.hits == len(item["segments"])
+    assert np.array_equal(np.hstack([e["masks"] for e in again]), np.hstack([e["masks"] for e in entries]))
@@ -0,0 +1,64 @@
+import asyncio
+import time
+
+from fastapi.testclient import TestClient
+
+from app import main, profiling
+from app.cache import candle_cache
+from app.config import API_KEY
+
+
+def _client(monkeypatch, make_candles):
+    async def fetch(inst_id, bar, limit):
+        return make_candles(limit, seed=3, bar_ms=900_000 if bar == "15m" else 3_600_000)
+    monkeypatch.setattr(candle_cache, "fetch", fetch)
+    return TestClient(main.app, headers={"x-api-key": API_KEY})
+
+
+def _stages(header):
+    return [part.split(";")[0].strip() for part in header.split(",")]
+
+
+def test_stage_accumulates_into_server_timing():
+    async def run():
+        d = profiling.begin()
+        for _ in range(2):
+            with profiling.stage("work"):
+                time.sleep(0.01)
+        with profiling.stage("encode"):
+            pass
+        return d, profiling.current()
+
+    d, cur = asyncio.run(run())
+    assert d["work"] >= 20 and set(cur) == {"work", "encode"}
+    assert _stages(profiling.server_timing(d, 42.0)) == ["work", "encode", "total"]
+    with profiling.stage("outside"):      # 没有 begin() 的上下文里不计时
+        pass
+
+
+def test_server_timing_header_lists_route_stages(monkeypatch, make_candles):
+    client = _client(monkeypatch, make_candles)
+    r = client.get("/strategy/panda/evaluate?inst_id=TIMING-USDT&limit=150")
+    assert r.status_code == 200
+    assert _stages(r.headers["server-timing"]) == ["fetch_candles", "evaluate", "encode", "total"]
+    assert _stages(client.get("/health").headers["server-timing"]) == ["total"]
+
+
+def test_debug_profile_requires_admin_key(monkeypatch, make_candles):
+    client = _client(monkeypatch, make_candles)
+    for path in ("/debug/profile?seconds=0.1", "/debug/profiles", "/debug/profile/abc"):
+        assert client.get(path).status_code == 403
+        assert client.get(path, headers={"x-admin-key": ""}).status_code == 403   # 未配置 ADMIN_KEY 时一律拒绝
+
+    monkeypatch.setattr(main, "ADMIN_KEY", "s3cret")
+    for path in ("/debug/profile?seconds=0.1", "/debug/profiles"):
+        assert client.get(path, headers={"x-admin-key": "wrong"}).status_code == 403
+    url = "/strategy/panda/evaluate?inst_id=PROF-USDT&limit=150"
+    assert "x-profile-id" not in client.get(url, headers={"x-profile": "1"}).headers
+
+    admin = {"x-admin-key": "s3cret"}
+    assert client.get("/debug/profile?seconds=0.1", headers=admin).status_code == 200
+    pid = client.get(url, headers={"x-profile": "1", **admin}).headers["x-profile-id"]
+    listed = client.get("/debug/profiles", headers=admin).json()["profiles"]
+    assert pid in [p["id"] for p in listed]
+    assert client.get(f"/debug/profile/{pid}", headers=admin).status_code == 200
@@ -0,0 +1,125 @@
+import asyncio
+
+from app import scan
+from app.limiter import AimdLimiter
+from app.scan import Scanner
+
+
+def test_aimd_additive_increase_and_cap():
+    lim = AimdLimiter(initial=4, max_limit=5, target_latency=1.0)
+
+    async def run():
+        for _ in range(4):
+            await lim.acquire()
+            await lim.release(True, 0.1)
+
+    asyncio.run(run())
+    assert round(lim.limit, 2) == 4.92 and lim.increases == 4    # 4 → 4.25 → 4.49 → 4.71 → 4.92，约每轮 +1
+    asyncio.run(run())
+    assert lim.limit == 5 and lim.inflight == 0                  # 封顶 max_limit
+
+
+def test_aimd_multiplicative_decrease_once_per_rtt():
+    lim = AimdLimiter(initial=16, min_limit=2, target_latency=1.0)
+
+    async def run():
+        await lim.release(False, 0.5)                 # 出错：减半
+        assert lim.limit == 8 and lim.errors == 1
+        await lim.release(False, 0.5)                 # 同一个 RTT 内的失败不再重复降速
+        assert lim.limit == 8 and lim.decreases == 1
+        lim._last_decrease -= 10
+        await lim.release(True, 3.0)                  # 延迟超标：× 0.8
+        assert lim.limit == 6.4
+        lim._last_decrease -= 10
+        await lim.release(False, 0.5, rate_limited=True)
+        assert lim.limit == 3.2 and lim.rate_limited == 1 and lim.errors == 2
+        lim._last_decrease -= 10
+        await lim.release(False, 0.5, rate_limited=True)
+        assert lim.limit == 2                         # 不低于 min_limit
+
+    lim.inflight = 5
+    asyncio.run(run())
+
+
+def test_acquire_waits_for_a_free_slot():
+    lim = AimdLimiter(initial=2)
+
+    async def run():
+        await lim.acquire()
+        await lim.acquire()
+        waiter = asyncio.create_task(lim.acquire())
+        await asyncio.sleep(0.01)
+        assert not waiter.done()
+        await lim.release(True, 0.1)
+        await asyncio.wait_for(waiter, 1)
+        return lim.inflight
+
+    assert asyncio.run(run()) == 2
+
+
+class FakeOkx:
+    plan = {}        # inst -> [code, ...]，按调用次序；用完后返回成功
+    calls = []
+    gate = None
+
+    async def candles(self, inst, bar, limit):
+        FakeOkx.calls.append(inst)
+        if FakeOkx.gate is not None:
+            await FakeOkx.gate.wait()
+        codes = FakeOkx.plan.get(inst) or []
+        code = codes.pop(0) if codes else "0"
+        if code != "0":
+            return {"code": code, "error": "upstream_http_error"}
+        return {"code": "0", "data": [["1700000000000", "1", "1", "1", "1", "1", "1", "1", "0"]]}
+
+    async def close(self):
+        pass
+
+
+def _scanner(monkeypatch, symbols):
+    monkeypatch.setattr(scan, "OkxClient", FakeOkx)
+    monkeypatch.setattr(scan, "SCAN_MAX_RETRY", 3)
+    FakeOkx.calls, FakeOkx.gate = [], None
+    s = Scanner()
+    s.reconfig(symbols, {"15m": 5}, batch=len(symbols), interval_sec=30)
+    return s
+
+
+def test_failed_pairs_are_retried_first_then_dropped(monkeypatch):
+    s = _scanner(monkeypatch, ["RQA-USDT", "RQB-USDT"])
+    FakeOkx.plan = {"RQA-USDT": ["500"], "RQB-USDT": ["429", "429", "429"]}
+
+    asyncio.run(s._do_scan_once())
+    assert sorted(s._retry) == [("RQA-USDT", "15m", 1), ("RQB-USDT", "15m", 1)]
+    assert s.failed == 2 and s.limiter.rate_limited == 1
+
+    s.reconfig(["RQC-USDT"], {"15m": 5}, batch=1, interval_sec=30)
+    FakeOkx.calls = []
+    asyncio.run(s._do_scan_once())
+    assert FakeOkx.calls == ["RQA-USDT", "RQB-USDT", "RQC-USDT"]   # 重试的排在新一批前面
+    assert s.retried_ok == 1 and list(s._retry) == [("RQB-USDT", "15m", 2)]
+
+    s.batch = 0                                                     # 只跑重试队列
+    asyncio.run(s._do_scan_once())
+    assert s.dropped == 1 and not s._retry and s.failed == 4
+    assert s.last_cycle == {**s.last_cycle, "pairs": 1, "retries": 1, "ok": 0}
+
+
+def test_cancelled_fetch_gives_no_aimd_feedback(monkeypatch):
+    s = _scanner(monkeypatch, ["CX-USDT", "CY-USDT"])
+    FakeOkx.plan = {}
+
+    async def run():
+        FakeOkx.gate = asyncio.Event()
+        before = s.limiter.limit
+        task = asyncio.create_task(s._do_scan_once())
+        await asyncio.sleep(0.02)
+        assert s.limiter.inflight == 2
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+        return before
+
+    before = asyncio.run(run())
+    st = s.limiter.status()
+    assert st["inflight"] == 0 and st["errors"] == 0 and st["decreases"] == 0
+    assert s.limiter.limit == before and s.failed == 0 and not s._retry
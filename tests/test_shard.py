@@ -0,0 +1,142 @@
+import asyncio
+import json
+import os
+import signal
+import subprocess
+import sys
+import time
+
+import pytest
+
+from app import shard
+from app.scan import Scanner
+from app.shard import HashRing, ShardMember, ShardFollower
+
+KEYS = [f"S{i}-USDT" for i in range(3000)]
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.fixture
+def shards_dir(monkeypatch, tmp_path):
+    monkeypatch.setattr(shard, "SHARDS_DIR", str(tmp_path / "shards"))
+    return tmp_path / "shards"
+
+
+def test_ring_moves_about_one_nth_on_join_and_leave():
+    nodes = [f"w{i}" for i in range(5)]
+    ring = HashRing(nodes)
+    before = {k: ring.owner(k) for k in KEYS}
+
+    joined = HashRing(nodes + ["w5"])
+    moved = [k for k in KEYS if joined.owner(k) != before[k]]
+    assert all(joined.owner(k) == "w5" for k in moved)          # 只有移给新节点的
+    assert 0.5 / 6 < len(moved) / len(KEYS) < 1.6 / 6
+
+    left = HashRing([n for n in nodes if n != "w2"])
+    moved = [k for k in KEYS if left.owner(k) != before[k]]
+    assert {before[k] for k in moved} == {"w2"}                  # 只有离开节点的被接管
+    assert 0.5 / 5 < len(moved) / len(KEYS) < 1.6 / 5
+    assert sum(map(len, left.assign(KEYS).values())) == len(KEYS)
+
+
+def test_expired_heartbeat_is_taken_over(shards_dir):
+    universe = KEYS[:200]
+    a, b = ShardMember("wa"), ShardMember("wb")
+    a.heartbeat({})
+    b.heartbeat({})
+    mine = a.owned(universe)
+    assert 0 < len(mine) < len(universe) and set(b.owned(universe)) == set(universe) - set(mine)
+
+    # wb 停止写心跳：超过 TTL 后视为离开，wa 接管它的全部交易对
+    path = shards_dir / "wb.json"
+    hb = json.loads(path.read_text())
+    hb["updated_at"] -= shard.SHARD_HEARTBEAT_TTL_SEC + 1
+    path.write_text(json.dumps(hb))
+    assert a.owned(universe) == universe and a.moved == len(universe) - len(mine)
+    agg = shard.aggregate_status()
+    assert agg["shards_alive"] == ["wa"] and agg["shards_dead"] == ["wb"]
+
+
+def test_no_heartbeat_after_leave(shards_dir):
+    m = ShardMember("wz")
+    m.heartbeat({})
+    m.leave()
+    m.heartbeat({})                      # 停止过程中迟到的心跳
+    assert not os.listdir(shards_dir)
+
+
+def test_workers_see_each_other_before_the_first_scan(monkeypatch, shards_dir):
+    monkeypatch.setattr(shard, "SHARD_JOIN_GRACE_SEC", 0.1)
+    universe = KEYS[:100]
+    first_scan = {}
+
+    async def run():
+        scanners = []
+        for sid in ("wa", "wb"):
+            s = Scanner()
+            s.universe = list(universe)
+            s.interval_sec = 0
+            s.set_shard(ShardMember(sid))          # 此时还看不到同伴
+            scanners.append(s)
+
+        def record(s):
+            async def scan_once():
+                first_scan[s.shard.shard_id] = set(s.symbols)
+                s.running = False
+            return scan_once
+
+        for s in scanners:
+            monkeypatch.setattr(s, "_do_scan_once", record(s))
+            s.start()
+        await asyncio.gather(*(s._task for s in scanners))
+
+    asyncio.run(run())
+    assert not first_scan["wa"] & first_scan["wb"]
+    assert first_scan["wa"] | first_scan["wb"] == set(universe)
+
+
+def test_follower_reads_back_other_shards(monkeypatch, shards_dir):
+    from app import storage
+    from app.alerts import watch
+    from app.analytics import analytics
+    from app.cache import candle_cache
+    from app.history import history
+
+    refreshed = []
+    monkeypatch.setattr(analytics, "refresh_all", lambda: refreshed.append(1))
+    f = ShardFollower(tail=50)
+
+    async def run():
+        assert await f.run_once() == 0                       # 没有其他分片时不读盘
+        ShardMember("w9").heartbeat({})
+        storage.save_candles_csv("FOL-USDT", "15m", {"data": [
+            ["1700000900000", "2", "3", "1", "2.5", "10", "1", "1", "0"],
+            ["1700000000000", "1", "2", "0.5", "2", "10", "1", "1", "1"],
+        ]})
+        n = await f.run_once()
+        again = await f.run_once()                           # 签名没变，不重复读
+        return n, again
+
+    n, again = asyncio.run(run())
+    assert n >= 1 and again == 0 and f.following == ["w9"]
+    assert history.view("FOL-USDT", "15m")[:, 4].tolist() == [2.0, 2.5]
+    assert candle_cache.get("FOL-USDT", "15m")["source"] == "shard"
+    assert watch.last_price["FOL-USDT"] == 2.5 and refreshed
+
+
+def test_worker_removes_heartbeat_on_sigterm(tmp_path):
+    env = {**os.environ, "DATA_DIR": str(tmp_path), "SHARD_JOIN_GRACE_SEC": "0",
+           "OKX_BASE": "http://127.0.0.1:9", "SCAN_SYMBOLS": "ETH-USDT"}
+    p = subprocess.Popen([sys.executable, "-m", "app.shard", "worker", "--id", "wsig"], cwd=ROOT, env=env)
+    hb = tmp_path / "shards" / "wsig.json"
+    try:
+        deadline = time.time() + 20
+        while not hb.exists() and time.time() < deadline:
+            time.sleep(0.05)
+        assert hb.exists()
+        p.send_signal(signal.SIGTERM)
+        assert p.wait(timeout=20) == 0
+    finally:
+        if p.poll() is None:
+            p.kill()
+    assert not hb.exists()
@@ -0,0 +1,57 @@
+import os
+
+from app import storage
+
+BAR_MS = 60_000
+
+
+def _rows(start, n, close=1.0):
+    return [[str((start + i) * BAR_MS), "1", "2", "0.5", str(close + start + i), "3", "4", "5", "1"] for i in range(n)]
+
+
+def _save(inst, rows):
+    storage.save_candles_csv(inst, "1m", {"data": rows})
+
+
+def test_compact_rolls_segments_and_read_candles_round_trips():
+    rows = _rows(0, 250)
+    _save("RT-USDT", rows + rows[100:120])             # 扫描窗口重叠写入的重复行
+    st = storage.compact_series("RT-USDT", "1m", hot_rows=50, segment_rows=100)
+    assert st["segments_rolled"] == 2 and st["rows_out"] == 50
+    item = storage.list_series()[("RT-USDT", "1m")]
+    assert [os.path.basename(p).endswith(storage.segment_ext()) for _f, _l, p in item["segments"]] == [True, True]
+    assert [(f, l) for f, l, _p in item["segments"]] == [(0, 99 * BAR_MS), (100 * BAR_MS, 199 * BAR_MS)]
+    assert storage.read_candles("RT-USDT", "1m") == rows
+    assert storage.read_candles("RT-USDT", "1m", limit=120) == rows[-120:]
+
+
+def test_gzip_segments_round_trip(monkeypatch):
+    monkeypatch.setattr(storage, "COMPRESSION", "gzip")
+    rows = _rows(0, 120)
+    _save("GZ-USDT", rows)
+    storage.compact_series("GZ-USDT", "1m", hot_rows=10, segment_rows=100)
+    (_f, _l, path), = storage.list_series()[("GZ-USDT", "1m")]["segments"]
+    assert path.endswith(".csv.gz")
+    assert storage.read_candles("GZ-USDT", "1m") == rows
+
+
+def test_retention_counts_real_segment_rows():
+    _save("RET-USDT", _rows(100, 300))
+    storage.compact_series("RET-USDT", "1m", hot_rows=0, segment_rows=100)
+    # 修复补回的行并入第一段，使其超过 segment_rows 根
+    _save("RET-USDT", _rows(50, 50))
+    st = storage.compact_series("RET-USDT", "1m", hot_rows=0, segment_rows=100)
+    assert st["rows_merged"] == 50
+    assert len(storage.read_candles("RET-USDT", "1m")) == 350
+
+    # 保留 320 根：实际共 350 根（按 3 × segment_rows 估算只有 300），删掉最旧的 150 根段后剩 200 根
+    st = storage.compact_series("RET-USDT", "1m", hot_rows=0, segment_rows=100, retain_rows=320)
+    assert st["segments_deleted"] == 1
+    assert storage.read_candles("RET-USDT", "1m") == _rows(200, 200)
+
+
+def test_retention_trims_active_rows_when_no_segments():
+    _save("HOT-USDT", _rows(0, 80))
+    st = storage.compact_series("HOT-USDT", "1m", hot_rows=500, segment_rows=100, retain_rows=30)
+    assert st["rows_out"] == 30 and st["segments_deleted"] == 0
+    assert storage.read_candles("HOT-USDT", "1m") == _rows(50, 30)
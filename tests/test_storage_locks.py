@@ -0,0 +1,37 @@
+import threading
+import time
+
+from app import storage
+
+
+def _raw(ts):
+    return {"data": [[str(ts), "1", "1", "1", "1", "1", "1", "1", "1"]]}
+
+
+def test_series_locks_are_independent():
+    storage.save_candles_csv("AAA-USDT", "1m", _raw(60000))
+    held = threading.Event()
+    release = threading.Event()
+
+    def hold_a():
+        with storage._locked("AAA-USDT", "1m"):
+            held.set()
+            release.wait(5)
+
+    t = threading.Thread(target=hold_a)
+    t.start()
+    try:
+        held.wait(5)
+        t0 = time.perf_counter()
+        storage.save_candles_csv("BBB-USDT", "1m", _raw(60000))   # 另一个序列不等 A 的锁
+        assert time.perf_counter() - t0 < 1
+    finally:
+        release.set()
+        t.join()
+
+
+def test_same_series_lock_is_reentrant():
+    with storage._locked("CCC-USDT", "1m"):
+        storage.save_candles_csv("CCC-USDT", "1m", _raw(60000))
+        sig, ts = storage.read_timestamps("CCC-USDT", "1m")
+    assert ts == [60000] and sig is not None
@@ -0,0 +1,47 @@
+import json
+import os
+
+import pytest
+
+from app.features import FeatureCache
+from app.strategies import REGISTRY, run_strategy
+from conftest import okx_candles
+
+# 金标准：由重构前的 evaluate_panda / evaluate_custom（逐根列表实现）在同样的合成 K 线上算出。
+# 输入按 seed / drift / vol 重新生成，fixture 里只存参数与当时的输出
+with open(os.path.join(os.path.dirname(__file__), "fixtures", "strategy_golden.json"), encoding="utf-8") as f:
+    CASES = json.load(f)["cases"]
+
+
+def _inputs(case):
+    base = okx_candles(case["n"], seed=case["seed"], drift=case["drift"], vol=case["vol"])
+    trend = okx_candles(case["n"], seed=case["seed"] + 1000, bar_ms=3_600_000,
+                        drift=case["drift"] * 2, vol=case["vol"] * 2)
+    args = (case["risk_percent"], case["funds_total"], case["funds_split"], case["leverage"],
+            case["exclude_btc_in_screen"])
+    return base, trend, args
+
+
+def _plain(obj):
+    return json.loads(json.dumps(obj, ensure_ascii=False))
+
+
+@pytest.mark.parametrize("name", ["panda", "custom"])
+def test_run_strategy_matches_pre_refactor_outputs(name):
+    sides = set()
+    for case in CASES:
+        base, trend, args = _inputs(case)
+        got = run_strategy(REGISTRY[name], FeatureCache(), case["inst_id"], "15m", "1H", base, trend, *args)
+        assert _plain(got) == case[name], (name, case["seed"])
+        sides.add(got["side"])
+    assert sides == {"long", "short", "flat"}
+
+
+def test_shared_feature_cache_does_not_change_outputs():
+    # /strategy/compare 与批量评估里两个策略共用一份 FeatureCache
+    for case in CASES[::4]:
+        base, trend, args = _inputs(case)
+        feats = FeatureCache()
+        for name in ("custom", "panda"):
+            got = run_strategy(REGISTRY[name], feats, case["inst_id"], "15m", "1H", base, trend, *args)
+            assert _plain(got) == case[name]
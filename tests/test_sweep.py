@@ -0,0 +1,142 @@
+import asyncio
+import os
+from multiprocessing import shared_memory
+
+import numpy as np
+import pytest
+
+from app import storage, sweep
+from app.sweep import Sweeper
+
+
+def test_prepare_failure_releases_shared_memory(monkeypatch, tmp_path):
+    monkeypatch.setattr(sweep, "SWEEPS_DIR", str(tmp_path))
+    created = []
+
+    def fake_prepare(inst_id, bar, trend_bar, configs):
+        if created:
+            raise RuntimeError("boom")
+        shm = shared_memory.SharedMemory(create=True, size=64)
+        created.append(shm.name)
+        return {"inst_id": inst_id}, shm
+
+    monkeypatch.setattr(sweep, "_prepare_series", fake_prepare)
+    s = Sweeper()
+
+    async def run():
+        job = s.start({"strategy": "panda", "inst_ids": ["A-USDT", "B-USDT"], "mode": "random", "samples": 3})
+        await s._tasks[job["id"]]
+        return s.jobs[job["id"]]
+
+    job = asyncio.run(run())
+    assert job["status"] == "failed" and "boom" in job["error"]
+    with pytest.raises(FileNotFoundError):
+        shared_memory.SharedMemory(name=created[0])
+
+
+def test_workers_clamped_to_cpu_count(monkeypatch):
+    monkeypatch.setattr(sweep, "SWEEP_WORKERS", 5000)
+    assert sweep._max_workers() <= (os.cpu_count() or 1)
+
+
+# 手算用例：50 根平盘之后 8 根，入场价 10，多头止损 9 / 止盈 12（1R = 1），持有 3 根
+_FLAT = 50
+
+
+def _series():
+    n = _FLAT + 8
+    c, h, l = np.full(n, 10.0), np.full(n, 10.0), np.full(n, 10.0)
+    h[_FLAT + 1], l[_FLAT + 1] = 10.5, 9.5
+    h[_FLAT + 2], l[_FLAT + 2] = 12.5, 9.5      # 触及止盈
+    l[_FLAT + 3] = 8.5                          # 触及止损
+    h[_FLAT + 4], l[_FLAT + 4] = 12.5, 8.5      # 同一根两者都触及：按止损
+    c[_FLAT + 7] = h[_FLAT + 7] = 10.5          # 到期平仓 +0.5R
+    return c, h, l
+
+
+def _windows(h, l, hold):
+    pad = np.full(hold, np.nan)
+    win_l = np.lib.stride_tricks.sliding_window_view(np.concatenate([l[1:], pad]), hold)
+    win_h = np.lib.stride_tricks.sliding_window_view(np.concatenate([h[1:], pad]), hold)
+    return win_l, win_h
+
+
+def test_walk_matches_hand_computed_outcomes():
+    c, h, l = _series()
+    win_l, win_h = _windows(h, l, 3)
+    n = len(c)
+    idx = _FLAT + np.arange(6)
+    r, kept = sweep._walk(idx, c, np.full(n, 9.0), np.full(n, 12.0), c, win_l, win_h, 3, True)
+    # 第 0、1 根先到止盈 +2R；第 2 根先到止损；第 3 根同根双触按止损；第 4 根到期 +0.5R；第 5 根未走完丢弃
+    assert kept.tolist() == (_FLAT + np.arange(5)).tolist()
+    assert r.tolist() == [2.0, 2.0, -1.0, -1.0, 0.5]
+
+    r, kept = sweep._walk(idx[:2], c, np.full(n, 11.0), np.full(n, 8.0), c, win_l, win_h, 3, False)
+    assert r.tolist() == [-1.0, -1.0] and kept.tolist() == [_FLAT, _FLAT + 1]
+
+    # 风险非正（止损不在入场价错误的一侧）的信号丢弃
+    r, kept = sweep._walk(idx[:1], c, np.full(n, 10.0), np.full(n, 12.0), c, win_l, win_h, 3, True)
+    assert len(r) == 0 and len(kept) == 0
+
+
+def test_score_on_deterministic_series(monkeypatch):
+    c, h, l = _series()
+    n = len(c)
+    arr = np.vstack([np.arange(n) * 60_000.0, c, h, l])
+    spec = {"rows": {"ts": 0, "c": 1, "h": 2, "l": 3}}
+
+    def fake_signals(strategy, cfg, g):
+        long, short = np.zeros(n, dtype=bool), np.zeros(n, dtype=bool)
+        long[_FLAT:_FLAT + 6] = True
+        long[10] = True                         # 预热期内的信号不计
+        short[_FLAT] = True
+        return long, short, np.full(n, 9.0), np.full(n, 12.0), np.full(n, 11.0), np.full(n, 8.0)
+
+    monkeypatch.setattr(sweep, "_signals", fake_signals)
+    cfg = sweep._normalize(sweep.BASELINES["panda"])
+    res = sweep._score("panda", cfg, [(spec, arr)], 3)
+    # 按时间排序：+2 -1 +2 -1 -1 +0.5 -> 权益 2 1 3 2 1 1.5，最大回撤 2R
+    assert res == {"params": cfg, "trades": 6, "win_rate": 0.5, "expectancy": 0.25, "total_r": 1.5,
+                   "profit_factor": 1.5, "max_drawdown_r": 2.0, "longs": 5, "shorts": 1}
+
+
+def test_shared_indicators_computed_once_per_series_not_per_config(monkeypatch):
+    rng = np.random.default_rng(7)
+    c = 100 + np.cumsum(rng.normal(0, 0.5, 200))
+    rows = [[str(i * 60_000), str(c[i] - 0.1), str(c[i] + 0.6), str(c[i] - 0.6), str(c[i]), "1", "1", "1", "1"]
+            for i in range(len(c))]
+    storage.save_candles_csv("SWP-USDT", "1m", {"data": rows})
+
+    calls = {"ema": [], "atr": 0, "masks": 0, "swings": []}
+
+    def counting(name, fn):
+        def wrapped(*args):
+            if isinstance(calls[name], list):
+                calls[name].append(args[1] if name == "ema" else args[2:])
+            else:
+                calls[name] += 1
+            return fn(*args)
+        return wrapped
+
+    monkeypatch.setattr(sweep, "ema", counting("ema", sweep.ema))
+    monkeypatch.setattr(sweep, "atr", counting("atr", sweep.atr))
+    monkeypatch.setattr(sweep, "pattern_masks", counting("masks", sweep.pattern_masks))
+    monkeypatch.setattr(sweep, "_swing_levels", counting("swings", sweep._swing_levels))
+
+    configs = sweep.expand_space("panda")
+    assert len(configs) > 100
+    spec, shm = sweep._prepare_series("SWP-USDT", "1m", None, configs)
+    try:
+        assert sorted(calls["ema"]) == [10, 20, 30, 50, 100]
+        assert sorted(calls["swings"]) == [(2, 2), (2, 3), (3, 2), (3, 3)]
+        assert calls["atr"] == 1 and calls["masks"] == 1
+
+        # 子进程入口逐组合回测只读共享内存，不再算任何指标
+        spec = {**spec, "shape": tuple(spec["shape"])}
+        results = sweep._run_chunk("panda", configs, [spec], 24)
+        assert len(results) == len(configs)
+        assert len(calls["ema"]) == 5 and len(calls["swings"]) == 4
+        assert calls["atr"] == 1 and calls["masks"] == 1
+    finally:
+        shm.close()
+        shm.unlink()